@@ -1,15 +1,26 @@
 import os
 import logging
 import time
-from datetime import datetime
-from azure.cognitiveservices.speech import SpeechConfig, SpeechSynthesizer, AudioConfig, ResultReason
-from config import AZURE_SPEECH_API_KEY, AZURE_SPEECH_REGION
+import config
+from turn_context import TurnCancelled, wait_future
+from tts_service import (
+    get_tts_service, concat_audio, negotiate_audio_format, get_mimetype, DEFAULT_AUDIO_FORMAT
+)
+from audio_store import audio_store
+from streaming_stt import StreamingTranscriber, STT_STREAMING_ENABLED
+
+# TTS 調用至少保留的時間（秒），保證超時後的備用回應仍有語音
+TTS_MIN_BUDGET = getattr(config, "TTS_MIN_BUDGET", 5)
+TTS_TIMEOUT = getattr(config, "TTS_TIMEOUT", 15)
 
 # 全局变量，从主应用共享
 global current_output_mode, stt_selector
 current_output_mode = "pc_speaker"    # 默认使用PC喇叭
 stt_selector = None  # 将在初始化时设置
 
+# 各客戶端（瀏覽器或機器人）協商得到的 TTS 音頻格式
+client_audio_formats = {}
+
 def set_stt_selector(selector):
     """设置 STT 选择器实例"""
     global stt_selector
@@ -21,84 +32,172 @@ def set_output_mode(mode):
     current_output_mode = mode
     logging.info(f"音頻輸出模式設置為: {mode}")
 
-def generate_tts(text, for_web_player=True):
-    """生成 TTS 音頻，每次生成不同文件名避免緩存問題
+def set_client_audio_formats(client_id, supported_formats):
+    """記錄客戶端聲明可解碼的格式，返回協商得到的格式"""
+    audio_format = negotiate_audio_format(supported_formats)
+    client_audio_formats[client_id] = audio_format
+    logging.info(f"客戶端 {client_id} 支持 {supported_formats}，使用 {audio_format} 格式")
+    return audio_format
+
+def get_client_audio_format(client_id):
+    """返回客戶端協商的格式，未聲明時使用 WAV"""
+    return client_audio_formats.get(client_id, DEFAULT_AUDIO_FORMAT)
+
+def remove_client_audio_format(client_id):
+    """客戶端斷開時移除其格式記錄"""
+    client_audio_formats.pop(client_id, None)
+
+def generate_tts(text, for_web_player=True, turn=None, on_chunk=None, audio_format=DEFAULT_AUDIO_FORMAT):
+    """生成 TTS 音頻並返回音頻地址
     
     Args:
         text: 要轉換為語音的文本
-        for_web_player: 是否返回網頁播放器所需的文件路徑。
+        for_web_player: 是否返回網頁播放器所需的音頻地址。
                        如果是robot_speaker模式且for_web_player=False，
-                       則不返回網頁播放器所需的文件路徑
+                       則不返回網頁播放器所需的音頻地址
+        turn: 本輪對話的 TurnContext，合成時間受本輪剩餘預算限制
+        on_chunk: 分句音頻的回調，參數為包含 stream_id、seq、total、text 和 audio_file 的字典
+        audio_format: 網頁播放器使用的音頻格式，見 tts_service.AUDIO_FORMATS
+    """
+    clip = synthesize_response(text, turn=turn, on_chunk=on_chunk, audio_format=audio_format)
+    if clip is None:
+        return None
+
+    # 如果不需要為網頁播放器返回地址，則返回None
+    if current_output_mode == 'robot_speaker' and not for_web_player:
+        return None
+    return clip.url
+
+def synthesize_response(text, turn=None, on_chunk=None, audio_format=DEFAULT_AUDIO_FORMAT):
+    """合成 TTS 音頻到內存，返回包含地址、數據和時長的 AudioClip，失敗時返回 None
+
+    較長的回應會分句並行合成，每句完成後按順序通過 on_chunk 回調交付，
+    客戶端可在後面的句子仍在合成時先播放第一句；完整音頻同樣保存在內存音頻存儲中，
+    由 /api/audio/<audio_id> 提供，不寫入磁盤。
     """
-    # 生成帶時間戳的唯一文件名
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    output_file = f"static/response_{timestamp}.wav"
+    if turn is not None and turn.cancelled:
+        logging.info("對話輪次已取消，跳過 TTS 合成")
+        return None
+
+    # 預先分配完整音頻的 ID，分句音頻以它作為 stream_id
+    audio_id = audio_store.new_id()
     
     try:
-        speech_config = SpeechConfig(
-            subscription=AZURE_SPEECH_API_KEY, region=AZURE_SPEECH_REGION)
-        speech_config.speech_synthesis_voice_name = "zh-HK-WanLungNeural"
-        audio_config = AudioConfig(filename=output_file)
-        synthesizer = SpeechSynthesizer(
-            speech_config=speech_config, audio_config=audio_config)
-
-        result = synthesizer.speak_text_async(text).get()
-
-        if result.reason == ResultReason.SynthesizingAudioCompleted:
-            logging.info(f"TTS 文件生成成功: {output_file}")
-            
-            # 如果是機器人喇叭模式，將音頻發送到機器人
-            if current_output_mode == 'robot_speaker':
-                try:
-                    # 直接調用發送函數，避免循環導入
-                    logging.info(f"檢測到 robot_speaker 模式，準備發送音頻到機器人: {output_file}")
-                    
-                    # 讀取音頻文件數據
-                    with open(output_file, 'rb') as f:
-                        audio_data = f.read()
-                    
-                    # 從主模塊獲取必要的變數和函數
-                    from app_main import socketio, connected_robots
-                    
-                    # 確認有連接的機器人
-                    if connected_robots:
-                        for robot_id in connected_robots:
-                            logging.info(f"發送音頻到機器人 {robot_id}, 數據大小: {len(audio_data)} 字節")
-                            socketio.emit('play_audio', {
-                                'audio_data': audio_data
-                            }, room=robot_id)
-                    else:
-                        logging.warning("沒有連接的機器人，無法發送音頻")
-                    
-                    # 如果不需要為網頁播放器返回路徑，則返回None
-                    if not for_web_player:
-                        return None
-                
-                except Exception as e:
-                    logging.error(f"發送音頻到機器人時出錯: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-            
-            return f"/{output_file}"
+        # 分句後在 TTS 服務中並行合成，synthesizer 從連接池借用
+        chunks = get_tts_service().synthesize_chunks(text, turn=turn, audio_format=audio_format)
+        robots = _get_robot_targets()
+
+        audio_chunks = []
+        for seq, (sentence, future) in enumerate(chunks):
+            try:
+                chunk = wait_future(future, turn, cap=TTS_TIMEOUT, floor=TTS_MIN_BUDGET)
+            except TurnCancelled:
+                raise
+            except Exception as e:
+                logging.error(f"第 {seq + 1}/{len(chunks)} 句 TTS 合成失敗: {e}")
+                chunk = None
+
+            if not chunk:
+                # 後面的句子不再交付，避免播放時跳句
+                for _, pending in chunks[seq + 1:]:
+                    pending.cancel()
+                break
+            audio_chunks.append(chunk)
+
+            if len(chunks) > 1 and on_chunk is not None:
+                chunk_clip = audio_store.put(chunk, get_mimetype(audio_format))
+                on_chunk({
+                    'stream_id': f"/api/audio/{audio_id}",
+                    'seq': seq,
+                    'total': len(chunks),
+                    'text': sentence,
+                    'audio_file': chunk_clip.url,
+                    'duration': chunk_clip.duration
+                })
+
+            # 如果是機器人喇叭模式，逐句將音頻發送到機器人
+            send_audio_to_robots(robots, sentence, chunk, audio_format, seq)
+
+        if audio_chunks:
+            audio_data = concat_audio(audio_chunks, audio_format) if len(audio_chunks) > 1 else audio_chunks[0]
+            clip = audio_store.put(audio_data, get_mimetype(audio_format), audio_id=audio_id)
+            logging.info(f"TTS 音頻生成成功: {clip.url} ({len(audio_chunks)}/{len(chunks)} 句, "
+                         f"{clip.duration or 0:.1f}秒)")
+            return clip
         else:
-            logging.error(f"TTS 生成失敗: {result.reason}")
+            logging.error("TTS 生成失敗")
             return None
+    except TurnCancelled:
+        logging.info("對話輪次已取消，停止 TTS 合成")
+        return None
     except Exception as e:
         logging.error(f"生成 TTS 時出錯: {e}")
         return None
 
-def transcribe_audio(audio_file):
-    """將音頻轉文字，支持本地和Azure Whisper"""
+def _get_robot_targets():
+    """robot_speaker 模式下返回已連接的機器人列表，其他模式返回 None"""
+    if current_output_mode != 'robot_speaker':
+        return None
+    try:
+        # 從主模塊獲取已連接的機器人，避免循環導入
+        from app_main import connected_robots
+        if not connected_robots:
+            logging.warning("沒有連接的機器人，無法發送音頻")
+        return list(connected_robots)
+    except Exception as e:
+        logging.error(f"獲取已連接機器人時出錯: {str(e)}")
+        return []
+
+def send_audio_to_robots(robots, text, audio_data, audio_format=DEFAULT_AUDIO_FORMAT, seq=0):
+    """將一段音頻按各機器人協商的格式發送到機器人播放
+
+    機器人格式與已合成的格式不同時，按該格式重新合成（結果會進入 TTS 緩存）。
+    """
+    if not robots:
+        return
+    try:
+        from app_main import socketio
+        rendered = {audio_format: audio_data}
+        for robot_id in robots:
+            robot_format = get_client_audio_format(robot_id)
+            if robot_format not in rendered:
+                rendered[robot_format] = get_tts_service().synthesize(text, audio_format=robot_format)
+            robot_audio = rendered[robot_format]
+            if not robot_audio:
+                logging.warning(f"無法生成機器人 {robot_id} 所需的 {robot_format} 音頻")
+                continue
+
+            logging.info(f"發送音頻到機器人 {robot_id}, 第 {seq + 1} 段, "
+                         f"格式: {robot_format}, 數據大小: {len(robot_audio)} 字節")
+            socketio.emit('play_audio', {
+                'audio_data': robot_audio,
+                'format': robot_format,
+                'mimetype': get_mimetype(robot_format),
+                'seq': seq
+            }, room=robot_id)
+    except Exception as e:
+        logging.error(f"發送音頻到機器人時出錯: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+def _get_stt_selector():
+    """返回 STT 選擇器，未設置時從主模塊獲取"""
+    global stt_selector
+    if stt_selector is None:
+        from app_main import stt_selector as main_stt_selector
+        stt_selector = main_stt_selector
+    return stt_selector
+
+def transcribe_audio(audio_file, sample_rate=16000, context=None):
+    """將音頻轉文字，支持本地和Azure Whisper
+
+    audio_file 可以是文件路徑，也可以是內存中的 numpy 數組或音頻字節（不經過磁盤）。
+    context 為對話上下文（command 或 dictation），用於自動選擇解碼配置。
+    """
     print("[INFO] 開始語音轉文字...")
     try:
-        # 確保 stt_selector 已設置
-        global stt_selector
-        if stt_selector is None:
-            from app_main import stt_selector as main_stt_selector
-            stt_selector = main_stt_selector
-            
         # 使用選擇器進行轉錄
-        result = stt_selector.transcribe(audio_file)
+        result = _get_stt_selector().transcribe(audio_file, sample_rate=sample_rate, context=context)
         return result
     except Exception as e:
         print(f"[ERROR] 語音轉文字失敗: {e}")
@@ -106,13 +205,39 @@ def transcribe_audio(audio_file):
         traceback.print_exc()
         return ""
 
+def create_streaming_transcriber(source, sample_rate=16000, context=None):
+    """創建錄音過程中使用的流式轉錄器，局部結果以 partial_transcript 事件廣播
+
+    未啟用 STT_STREAMING_ENABLED 時不啟動後台局部轉錄，finish() 時按 transcribe_audio
+    相同的方式一次性轉錄全部音頻。context 為對話上下文（command 或 dictation）。
+    """
+    from whisper_selector import resolve_decoding_profile
+    selector = _get_stt_selector()
+
+    def emit_partial(result):
+        from app_main import socketio
+        socketio.emit('partial_transcript', dict(result, source=source))
+
+    def transcribe_segments(audio, utterance_seconds):
+        # 按目前整段語音的時長選擇解碼配置，而不是按未確認尾部的長度
+        profile = resolve_decoding_profile(selector.decoding_profile, utterance_seconds, context)
+        return selector.transcribe(audio, with_segments=True, profile=profile)
+
+    transcriber = StreamingTranscriber(
+        transcribe_segments, on_partial=emit_partial, sample_rate=sample_rate,
+        transcribe_text=lambda audio: selector.transcribe(audio, context=context))
+    if STT_STREAMING_ENABLED:
+        transcriber.start()
+    return transcriber
+
 def convert_audio_format(input_file, output_file, sample_rate=16000, channels=1):
-    """转换音频格式为16kHz单声道WAV"""
+    """转换音频格式为16kHz单声道WAV（WAV 輸入在進程內多相重採樣，不調用 ffmpeg）"""
     try:
-        from pydub import AudioSegment
-        audio = AudioSegment.from_file(input_file)
-        audio = audio.set_frame_rate(sample_rate).set_channels(channels)
-        audio.export(output_file, format="wav")
+        from whisper_selector import load_pcm, pcm_to_wav_bytes
+        from audio_preprocess import resample
+        samples = resample(load_pcm(input_file), 16000, sample_rate)
+        with open(output_file, "wb") as f:
+            f.write(pcm_to_wav_bytes(samples, sample_rate))
         logging.info(f"音频格式转换成功: {input_file} -> {output_file}")
         return output_file
     except Exception as e:
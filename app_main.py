@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, send_file
 from flask_socketio import SocketIO, emit
 import logging
 import os
@@ -17,10 +17,10 @@ from scipy.io import wavfile as wav
 from datetime import datetime
 import pygame
 import threading
-from app_audio import generate_tts, transcribe_audio
+from app_audio import generate_tts, synthesize_response, transcribe_audio
 from app_socket_handlers import register_socket_handlers
-from app_vision import analyze_current_frame, analyze_image_with_vision
-from app_robot_control import RobotStatus, execute_singledigit_action, execute_doubledigit_action
+from app_vision import analyze_current_frame, analyze_image_with_vision, VISION_TIMEOUT
+from app_robot_control import RobotStatus, execute_singledigit_action, execute_doubledigit_action, dispatch_action_async
 from app_phone_mode import PhoneMode
 from app_utils import initialize_chat_history, save_chat_message, is_history_outdated
 from audio_manager import AudioManager
@@ -33,6 +33,10 @@ from azure.ai.vision.imageanalysis.models import VisualFeatures
 from azure.core.credentials import AzureKeyCredential
 import base64
 from pc_recorder import PCRecorder
+from turn_context import TurnContext, run_with_deadline
+from tts_service import get_tts_service
+from audio_store import audio_store
+from artifact_store import artifact_store
 
 
 # 配置日志
@@ -64,8 +68,8 @@ chat_history = {"messages": []}
 
 # 初始化模块
 chatbot = ChatBot()
-audio_manager = AudioManager()
 stt_selector = SpeechToTextSelector(WHISPER_CONFIG)
+audio_manager = AudioManager(stt_selector=stt_selector)
 
 # 全局变量
 connected_robots = {}  # 存储已连接的机器人信息
@@ -109,6 +113,37 @@ def index():
     return render_template('index.html')
 
 
+def run_test_wave_action(action_id='9', repeat_count='1'):
+    """測試上傳圖片識別到人物時執行的揮手動作"""
+    result = subprocess.run([
+        "curl",
+        "-X", "POST", "http://192.168.149.1:9030/",
+        "-H", "deviceid: your_device_id",
+        "-H", "X-JSON-RPC: RunAction",
+        "-H", "er: false",
+        "-H", "dr: false",
+        "-H", "Content-Type: text/x-markdown; charset=utf-8",
+        "-H", "Content-Length: 76",
+        "-H", "Connection: Keep-Alive",
+        "-H", "Accept-Encoding: gzip",
+        "-H", "User-Agent: okhttp/4.9.1",
+        "-d", f'{{"id":1732853986186,"jsonrpc":"2.0","method":"RunAction","params":["{action_id}","{repeat_count}"]}}'
+    ], capture_output=True, text=True)
+    print(f"[DEBUG] 揮手動作執行結果: {result.stdout}")
+    return result
+
+
+def save_wave_message(result):
+    """揮手動作完成後，添加機器人動作訊息到聊天記錄"""
+    action_message = {
+        "type": "received",
+        "text": "🤖 執行動作: 揮手 已完成",
+        "timestamp": datetime.now().isoformat(),
+        "audioSrc": None
+    }
+    save_chat_message(action_message)
+
+
 @app.route('/api/test/upload-image', methods=['POST'])
 def test_upload_image():
     try:
@@ -135,23 +170,23 @@ def test_upload_image():
                 'message': '只支持JPG和PNG格式的圖片'
             }), 400
 
-        # 確保上傳目錄存在
-        upload_dir = os.path.join('static', 'uploads', 'test')
-        os.makedirs(upload_dir, exist_ok=True)
-
-        # 保存文件
-        filename = f"test_image_{int(time.time())}.jpg"
-        filepath = os.path.join(upload_dir, filename)
-        image_file.save(filepath)
+        # 保存文件到產物存儲（唯一 ID，由後台清理線程按預算淘汰）
+        artifact = artifact_store.save_upload(image_file, "test_image", "jpg")
+        filepath = artifact.path
 
         # 使用Azure Vision分析圖片
         with open(filepath, 'rb') as f:
             image_data = f.read()
 
         print("[DEBUG] 開始處理測試上傳圖片")
+        turn = TurnContext()
 
         # 分析圖片
-        result = vision_client.analyze(
+        result = run_with_deadline(
+            vision_client.analyze,
+            turn,
+            cap=VISION_TIMEOUT,
+            read_timeout=VISION_TIMEOUT,
             image_data=image_data,
             visual_features=[
                 VisualFeatures.CAPTION,
@@ -196,16 +231,18 @@ def test_upload_image():
                 detected_person = True
                 break
 
-        # 準備廣東話描述的提示詞
-        prompt = """用廣東話描述這張圖片，以「我見到」開頭，語氣要自然活潑一點。描述要詳細，但不要太長。"""
+        # 如果檢測到人物，揮手動作在後台執行，與 GPT 和 TTS 同時進行
+        if detected_person:
+            print("[DEBUG] 檢測到人物，執行揮手動作")
+            dispatch_action_async(run_test_wave_action, '9', '1', on_complete=save_wave_message)
 
-        # 使用 chatbot 獲取 GPT 回應
-        print("[DEBUG] 將直接通過 chatbot 獲取回應")
+        # 使用 chatbot 的場景描述接口獲取 GPT 回應
+        print("[DEBUG] 將直接通過 chatbot 生成場景描述")
 
         try:
-            # 使用現有的 chatbot 對象而不是創建新的
-            gpt_response = chatbot.get_response(
-                prompt + f"\n\n圖片描述: {caption}\n可見物件: {', '.join(objects)}\n標籤: {', '.join(tags)}")
+            gpt_response = chatbot.describe_scene(caption, objects, tags, turn=turn)
+            if not gpt_response:
+                raise Exception("場景描述為空")
 
             print(f"[DEBUG] GPT回應: {gpt_response}")
 
@@ -216,7 +253,7 @@ def test_upload_image():
 
             # 使用現有的 generate_tts 函數
             print(f"[DEBUG] 生成TTS，使用文本: {gpt_response}")
-            tts_file = generate_tts(gpt_response)
+            tts_file = generate_tts(gpt_response, turn=turn)
 
             if tts_file:
                 print(f"[DEBUG] TTS生成成功: {tts_file}")
@@ -230,44 +267,10 @@ def test_upload_image():
                 }
                 save_chat_message(ai_message)
 
-                # 如果檢測到人物，嘗試執行揮手動作 (使用全局函數)
-                if detected_person:
-                    print("[DEBUG] 檢測到人物，執行揮手動作")
-                    try:
-                        # 直接調用，不用任何導入
-                        result = subprocess.run([
-                            "curl",
-                            "-X", "POST", "http://192.168.149.1:9030/",
-                            "-H", "deviceid: your_device_id",
-                            "-H", "X-JSON-RPC: RunAction",
-                            "-H", "er: false",
-                            "-H", "dr: false",
-                            "-H", "Content-Type: text/x-markdown; charset=utf-8",
-                            "-H", "Content-Length: 76",
-                            "-H", "Connection: Keep-Alive",
-                            "-H", "Accept-Encoding: gzip",
-                            "-H", "User-Agent: okhttp/4.9.1",
-                            "-d", '{"id":1732853986186,"jsonrpc":"2.0","method":"RunAction","params":["9","1"]}'
-                        ], capture_output=True, text=True)
-
-                        print(f"[DEBUG] 揮手動作執行結果: {result.stdout}")
-
-                        # 添加機器人動作訊息到聊天記錄
-                        action_message = {
-                            "type": "received",
-                            "text": "🤖 執行動作: 揮手 已完成",
-                            "timestamp": datetime.now().isoformat(),
-                            "audioSrc": None
-                        }
-                        save_chat_message(action_message)
-
-                    except Exception as action_error:
-                        print(f"[ERROR] 執行動作失敗: {action_error}")
-
                 # 返回成功結果
                 return jsonify({
                     'success': True,
-                    'image_url': f"/static/uploads/test/{filename}",
+                    'image_url': artifact.url,
                     'caption': caption,
                     'tags': tags,
                     'objects': objects,
@@ -297,7 +300,7 @@ def test_upload_image():
             print(f"[DEBUG] 使用備用回應: {backup_response}")
 
             # 生成備用TTS
-            backup_tts_file = generate_tts(backup_response)
+            backup_tts_file = generate_tts(backup_response, turn=turn)
 
             # 記錄基本回應到聊天歷史
             basic_message = {
@@ -308,41 +311,10 @@ def test_upload_image():
             }
             save_chat_message(basic_message)
 
-            # 如果檢測到人物，執行揮手動作
-            if detected_person:
-                try:
-                    # 直接執行命令，不依賴外部函數
-                    result = subprocess.run([
-                        "curl",
-                        "-X", "POST", "http://192.168.149.1:9030/",
-                        "-H", "deviceid: your_device_id",
-                        "-H", "X-JSON-RPC: RunAction",
-                        "-H", "er: false",
-                        "-H", "dr: false",
-                        "-H", "Content-Type: text/x-markdown; charset=utf-8",
-                        "-H", "Content-Length: 76",
-                        "-H", "Connection: Keep-Alive",
-                        "-H", "Accept-Encoding: gzip",
-                        "-H", "User-Agent: okhttp/4.9.1",
-                        "-d", '{"id":1732853986186,"jsonrpc":"2.0","method":"RunAction","params":["9","1"]}'
-                    ], capture_output=True, text=True)
-
-                    # 添加機器人動作訊息到聊天記錄
-                    action_message = {
-                        "type": "received",
-                        "text": "🤖 執行動作: 揮手 已完成",
-                        "timestamp": datetime.now().isoformat(),
-                        "audioSrc": None
-                    }
-                    save_chat_message(action_message)
-
-                except Exception as action_error:
-                    print(f"[ERROR] 執行動作失敗: {action_error}")
-
             # 返回備用回應
             return jsonify({
                 'success': True,
-                'image_url': f"/static/uploads/test/{filename}",
+                'image_url': artifact.url,
                 'caption': caption,
                 'tags': tags,
                 'objects': objects,
@@ -388,17 +360,13 @@ def test_upload_audio():
                 'message': '只支持WAV格式的音頻文件'
             }), 400
 
-        # 確保上傳目錄存在
-        upload_dir = os.path.join('static', 'uploads', 'test')
-        os.makedirs(upload_dir, exist_ok=True)
+        # 保存文件到產物存儲（唯一 ID，由後台清理線程按預算淘汰）
+        artifact = artifact_store.save_upload(audio_file, "test_audio", "wav")
+        filepath = artifact.path
 
-        # 保存文件
-        filename = f"test_audio_{int(time.time())}.wav"
-        filepath = os.path.join(upload_dir, filename)
-        audio_file.save(filepath)
-
-        # 轉錄音頻
-        transcribed_text = transcribe_audio(filepath)
+        # 轉錄音頻（上傳的錄音通常是完整的長句，按聽寫配置解碼）
+        transcribed_text = transcribe_audio(filepath, context="dictation")
+        turn = TurnContext()
 
         # 獲取AI回應
         ai_response = None
@@ -406,11 +374,11 @@ def test_upload_audio():
 
         if transcribed_text:
             # 使用chatbot處理文本
-            ai_response = chatbot.get_response(transcribed_text)
+            ai_response = chatbot.get_response(transcribed_text, turn=turn)
 
             # 生成TTS
             if ai_response:
-                tts_file = generate_tts(ai_response)
+                tts_file = generate_tts(ai_response, turn=turn)
                 if tts_file:
                     response_audio_url = tts_file
 
@@ -419,7 +387,7 @@ def test_upload_audio():
             'success': True,
             'text': transcribed_text,
             'response': ai_response,
-            'audio_url': f"/static/uploads/test/{filename}",
+            'audio_url': artifact.url,
             'response_audio': response_audio_url
         })
 
@@ -436,10 +404,11 @@ def test_upload_audio():
 def update_whisper_settings():
     try:
         data = request.json
-        mode = data.get('mode')
+        mode = data.get('mode') or stt_selector.mode
         config = {
             'local_whisper_model': data.get('local_model'),
-            'azure_whisper_model': data.get('azure_model')
+            'azure_whisper_model': data.get('azure_model'),
+            'decoding_profile': data.get('decoding_profile')
         }
 
         # 使用選擇器切換模式
@@ -477,6 +446,42 @@ def get_whisper_settings():
         }), 500
 
 
+@app.route('/api/tts/cache', methods=['GET'])
+def get_tts_cache_status():
+    """返回 TTS 緩存、預先合成、後端路由和音頻存儲的統計"""
+    tts_service = get_tts_service()
+    return jsonify({
+        'success': True,
+        'cache': tts_service.cache.stats(),
+        'prerender': tts_service.prerender_status,
+        'routing': tts_service.router.stats(),
+        'service': tts_service.stats(),
+        'audio_store': audio_store.stats(),
+        'artifacts': artifact_store.stats()
+    })
+
+
+@app.route('/api/audio/<audio_id>', methods=['GET'])
+def get_audio(audio_id):
+    """從內存音頻存儲返回 TTS 音頻，支持 Range 請求和 ETag"""
+    clip = audio_store.get(audio_id)
+    if clip is None:
+        # 聊天歷史引用的音頻已保存到產物存儲，從內存淘汰後仍可播放
+        artifact = artifact_store.get(audio_id)
+        if artifact is not None and os.path.exists(artifact.path):
+            return send_file(artifact.path, conditional=True, max_age=3600)
+        return jsonify({'success': False, 'error': '音頻不存在或已過期'}), 404
+
+    # 音頻內容按 ID 不可變，可以長時間緩存
+    return send_file(
+        io.BytesIO(clip.data),
+        mimetype=clip.mimetype,
+        conditional=True,
+        etag=clip.etag,
+        max_age=3600
+    )
+
+
 @app.route('/api/test/whisper-status', methods=['GET'])
 def test_whisper_status():
     """測試Whisper狀態，返回詳細資訊"""
@@ -610,16 +615,19 @@ def execute_doubledigit_action_route():
         return jsonify({"error": str(e)}), 500
 
 
-def record_audio(output_file="recorded_audio.wav"):
-    """使用 sounddevice 錄音"""
+def record_audio(output_file=None):
+    """使用 sounddevice 錄音，返回 int16 numpy 數組；指定 output_file 時另存為 WAV"""
     print("[INFO] 開始錄音...")
     audio_data = sd.rec(int(SAMPLE_RATE * DURATION),
                         samplerate=SAMPLE_RATE, channels=CHANNELS, dtype=np.int16)
     sd.wait()  # 等待錄音完成
-    wav.write(output_file, SAMPLE_RATE, audio_data)  # 儲存音檔
-    print(f"[INFO] 錄音完成，儲存至 {output_file}")
+    if output_file:
+        wav.write(output_file, SAMPLE_RATE, audio_data)  # 儲存音檔
+        print(f"[INFO] 錄音完成，儲存至 {output_file}")
+    else:
+        print("[INFO] 錄音完成")
 
-    return output_file
+    return audio_data
 
 
 def send_audio_to_robot(audio_file):
@@ -639,6 +647,16 @@ def send_audio_to_robot(audio_file):
         logging.error(f"發送音頻到機器人失敗: {e}")
 
 
+def warm_up_tts():
+    """預熱 TTS 連接池，並預先合成知識庫回答、動作確認和備用回應"""
+    tts_service = get_tts_service()
+    tts_service.warm_up()
+    try:
+        tts_service.prerender(chatbot.get_predictable_phrases())
+    except Exception as e:
+        logging.error(f"預先合成 TTS 失敗: {e}")
+
+
 def main():
     # 初始化 PhoneMode 實例
     global phone_mode_manager
@@ -646,15 +664,21 @@ def main():
         socketio=socketio,
         chatbot=chatbot,
         transcribe_func=transcribe_audio,
-        tts_func=generate_tts,
+        tts_func=synthesize_response,
         save_message_func=save_chat_message,
         should_trigger_vision_func=should_trigger_vision,
         analyze_frame_func=analyze_current_frame
     )
 
-    # 初始化聊天歷史
+    # 初始化聊天歷史（同時固定歷史中引用的產物）
     initialize_chat_history()
 
+    # 後台按大小和時間預算清理 TTS 和上傳產物
+    artifact_store.start_sweeper()
+
+    # 在後台預熱 TTS 連接池並預先合成常用語句
+    threading.Thread(target=warm_up_tts, daemon=True).start()
+
     # 注册所有套接字处理程序
     register_socket_handlers(
         socketio, stt_selector, chatbot, current_input_mode,
@@ -670,10 +694,11 @@ def main():
         status = stt_selector.get_status()
         logging.info(f"Whisper 當前狀態: {status}")
 
-        # 初始化 Azure 客戶端
-        logging.info("強制初始化 Azure 客戶端...")
-        stt_selector._initialize_azure_client()
-        logging.info("Azure 客戶端初始化成功")
+        # 在後台預加載 Azure 客戶端，就緒狀態可在 /api/settings/whisper 查看
+        logging.info("在後台預加載語音轉文字後端...")
+        stt_selector.preload()
+        # 短指令解碼時以機器人動作詞彙作提示
+        stt_selector.set_command_vocabulary(chatbot.get_command_vocabulary())
     except Exception as e:
         logging.error(f"強制設置 Azure 模式失敗: {e}")
         traceback.print_exc()
@@ -8,6 +8,8 @@ import numpy as np
 import sounddevice as sd
 from datetime import datetime
 from scipy.io import wavfile
+from turn_context import turn_registry
+from streaming_stt import STT_STREAMING_ENABLED
 
 class PhoneMode:
     def __init__(self, socketio, chatbot, transcribe_func, tts_func, save_message_func, 
@@ -22,9 +24,9 @@ class PhoneMode:
         self.active = False
         self.is_recording = False
         self.recording_thread = None
-        self.audio_file = "uploads/phone_mode_audio.wav"
         self.start_beep = "static/start_beep.wav"
         self.stop_beep = "static/stop_beep.wav"
+        self.session_id = "phone_mode"  # 與機器人 VAD 語音共用的會話 ID
     
     def start(self):
         """啟動電話模式"""
@@ -37,6 +39,7 @@ class PhoneMode:
     def stop(self):
         """停止電話模式"""
         self.active = False
+        turn_registry.cancel(self.session_id)
         self._ensure_beep_files()
         self._play_beep(self.stop_beep)  # 播放結束提示音
         return True
@@ -87,10 +90,6 @@ class PhoneMode:
         import numpy as np
         import wave
         import webrtcvad
-        from scipy.io import wavfile
-        
-        # 創建保存目錄
-        os.makedirs("uploads", exist_ok=True)
         
         # 設置錄音參數
         duration = 60  # 最長錄音時間（秒）
@@ -110,6 +109,7 @@ class PhoneMode:
         logging.info("開始電話模式錄音...")
         
         frames = []
+        streamer = None  # 啟用流式轉錄時，檢測到語音後邊錄音邊轉錄
         silent_chunks = 0
         speech_detected = False
         max_silent_chunks = int(5 / chunk_duration)   # 5秒靜音後結束 (已檢測到語音)
@@ -145,10 +145,15 @@ class PhoneMode:
                         silent_chunks = 0
                         speech_detected = True
                         frames.append(current_chunk.copy())
+                        if streamer is None and STT_STREAMING_ENABLED:
+                            from app_audio import create_streaming_transcriber
+                            streamer = create_streaming_transcriber(self.session_id, fs)
                     else:
                         silent_chunks += 1
                         if speech_detected:  # 如果之前檢測到過語音，也保存靜音片段
                             frames.append(current_chunk.copy())
+                    if streamer is not None and speech_detected:
+                        streamer.feed(current_chunk)
                     
                     # 如果檢測到語音後有足夠長的靜音，結束錄音
                     if speech_detected and silent_chunks >= max_silent_chunks:
@@ -169,6 +174,8 @@ class PhoneMode:
             # 如果沒有檢測到語音或幀數太少，視為無效錄音
             if not speech_detected or len(frames) < 10:
                 logging.info("未檢測到有效語音，重新開始錄音循環")
+                if streamer is not None:
+                    streamer.cancel()
                 self.is_recording = False
                 
                 # 如果電話模式仍然活躍，開始新的錄音循環
@@ -177,14 +184,11 @@ class PhoneMode:
                     self._start_recording_cycle()
                 return
             
-            # 保存錄音
+            # 處理錄音（直接在內存中轉錄，不寫入共用的錄音文件）
             if frames:
                 combined_frames = np.vstack(frames) if len(frames) > 1 else frames[0]
-                wavfile.write(self.audio_file, fs, combined_frames)
-                logging.info(f"已保存錄音: {self.audio_file}")
-                
-                # 處理錄音
-                self._process_recording()
+                logging.info(f"錄音完成: {len(combined_frames) / fs:.1f} 秒")
+                self._process_recording(combined_frames, fs, streamer)
             
         except Exception as e:
             logging.error(f"錄音過程中出錯: {e}")
@@ -193,19 +197,21 @@ class PhoneMode:
         finally:
             self.is_recording = False
 
-    def _process_recording(self):
-        """處理錄音文件"""
+    def _process_recording(self, audio_data, sample_rate=16000, streamer=None):
+        """處理錄音（int16 numpy 數組），有流式轉錄器時只需轉錄其未確認的尾部"""
+        turn = None
         try:
-            # 檢查文件是否存在
-            if not os.path.exists(self.audio_file):
-                logging.error(f"錄音文件不存在: {self.audio_file}")
-                return
-                    
             # 通知前端檢測到語音
             self.socketio.emit('phone_mode_speech_detected')
+
+            # 本輪對話從錄音結束開始計時，並取消仍在進行的上一輪
+            turn = turn_registry.begin(self.session_id)
                 
             # 轉錄語音
-            transcribed_text = self.transcribe_func(self.audio_file)
+            if streamer is not None:
+                transcribed_text = streamer.finish()
+            else:
+                transcribed_text = self.transcribe_func(audio_data, sample_rate=sample_rate)
                 
             if not transcribed_text:
                 logging.warning("無法識別語音內容")
@@ -230,7 +236,7 @@ class PhoneMode:
                 logging.info("觸發 AI Vision 分析")
                 if self.analyze_frame:
                     # 傳遞 socketio 實例
-                    self.analyze_frame(self.socketio)
+                    self.analyze_frame(self.socketio, turn=turn)
                 
                 # 等待一段時間後再開始新的錄音循環
                 time.sleep(5)  # 等待 5 秒
@@ -239,10 +245,21 @@ class PhoneMode:
                 return
             
             # 獲取AI回應
-            ai_response = self.chatbot.get_response(transcribed_text)
+            ai_response = self.chatbot.get_response(transcribed_text, turn=turn)
+            if turn.cancelled:
+                logging.info("電話模式本輪已被取代，丟棄回應")
+                if self.active:
+                    self._start_recording_cycle()
+                return
             
-            # 生成語音
-            tts_file = self.tts_func(ai_response)
+            # 生成語音（保存在內存音頻存儲中，同時返回時長）
+            tts_clip = self.tts_func(ai_response, turn=turn)
+            if turn.cancelled:
+                logging.info("電話模式本輪已被取代，丟棄回應")
+                if self.active:
+                    self._start_recording_cycle()
+                return
+            tts_file = tts_clip.url if tts_clip else None
             
             # 保存AI回應
             ai_message = {
@@ -259,38 +276,17 @@ class PhoneMode:
                 "audio_file": tts_file
             })
             
-            # 計算TTS文件長度並增加額外等待時間
+            # 按TTS時長增加額外等待時間
             extra_wait_time = 5  # 播放完TTS後的額外等待時間（秒）
             
-            if tts_file:
-                # 移除开头的斜杠以避免路径重复
-                file_path = tts_file.lstrip('/')
-                
-                if os.path.exists(file_path):
-                    # 使用wave模块读取音频文件时长
-                    try:
-                        with wave.open(file_path, 'rb') as wf:
-                            # 计算音频长度（秒）
-                            tts_duration = wf.getnframes() / wf.getframerate()
-                            total_wait = tts_duration + extra_wait_time
-                            logging.info(f"TTS時長: {tts_duration:.2f}秒，總等待時間: {total_wait:.2f}秒")
-                            time.sleep(total_wait)
-                    except Exception as e:
-                        # 如果读取文件时出错，记录错误并使用预设等待时间
-                        logging.error(f"讀取TTS文件時出錯: {e}")
-                        default_wait = 10
-                        logging.info(f"使用預設等待時間: {default_wait}秒")
-                        time.sleep(default_wait)
-                else:
-                    # 如果文件不存在，记录错误并使用预设等待时间
-                    logging.warning(f"TTS文件不存在: {file_path}")
-                    default_wait = 10
-                    logging.info(f"使用預設等待時間: {default_wait}秒")
-                    time.sleep(default_wait)
+            if tts_clip and tts_clip.duration:
+                total_wait = tts_clip.duration + extra_wait_time
+                logging.info(f"TTS時長: {tts_clip.duration:.2f}秒，總等待時間: {total_wait:.2f}秒")
+                time.sleep(total_wait)
             else:
-                # 如果没有TTS文件路径，使用预设等待时间
+                # 如果没有TTS音頻或無法獲取時長，使用预设等待时间
                 default_wait = 10
-                logging.info(f"無TTS文件路徑，使用預設等待時間: {default_wait}秒")
+                logging.info(f"無TTS音頻時長，使用預設等待時間: {default_wait}秒")
                 time.sleep(default_wait)
             
             # 如果電話模式仍然活躍，開始新的錄音循環
@@ -305,4 +301,7 @@ class PhoneMode:
             # 如果電話模式仍然活躍，嘗試開始新的錄音循環
             if self.active:
                 time.sleep(2)  # 等待2秒
-                self._start_recording_cycle()
\ No newline at end of file
+                self._start_recording_cycle()
+        finally:
+            if turn is not None:
+                turn_registry.finish(turn)
\ No newline at end of file
@@ -1,6 +1,7 @@
 import subprocess
 import logging
 import json
+import threading
 
 
 class RobotStatus:
@@ -11,6 +12,30 @@ class RobotStatus:
         self.temperature = 25
 
 
+def dispatch_action_async(action_func, action_id, repeat_count='1', on_complete=None):
+    """在後台線程執行動作，不阻塞回應生成和 TTS
+
+    Args:
+        action_func: execute_singledigit_action 或 execute_doubledigit_action 等動作函數
+        on_complete: 動作完成後以動作結果調用的回調
+    """
+    def run():
+        try:
+            result = action_func(action_id, repeat_count)
+        except Exception as e:
+            logging.error(f"執行動作 {action_id} 時出錯: {e}")
+            return
+        if on_complete is not None:
+            try:
+                on_complete(result)
+            except Exception as e:
+                logging.error(f"動作完成回調出錯: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
 def execute_singledigit_action(action_id, repeat_count='1'):
     """執行單位數動作(0-9)"""
     try:
@@ -4,7 +4,9 @@ import time
 from datetime import datetime
 from flask import request
 from flask_socketio import emit
-from app_audio import generate_tts
+import app_audio
+from app_audio import generate_tts, synthesize_response
+from turn_context import TurnContext, turn_registry
 
 # 全局變量，用於存儲最新一幀
 global latest_frame, last_camera_log_time, camera_frame_count
@@ -22,6 +24,17 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
                              should_trigger_vision, analyze_current_frame, save_chat_message,
                              generate_tts, record_audio, pc_recorder, connected_robots):
     """注册所有Socket.IO事件处理程序"""
+
+    # 各機器人正在發送的語音片段對應的流式轉錄器
+    robot_audio_streams = {}
+    # 啟動電話模式的前端，電話模式回應按它協商的音頻格式合成
+    phone_mode_client = None
+
+    def make_chunk_emitter(client_id):
+        """返回把分句 TTS 音頻推送給指定客戶端的回調，client_id 為 None 時廣播給所有客戶端"""
+        def emit_chunk(chunk):
+            socketio.emit('response_audio_chunk', chunk, room=client_id)
+        return emit_chunk
     
     @socketio.on('connect')
     def handle_connect():
@@ -40,9 +53,18 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
             'id': robot_id,
             'status': RobotStatus()
         }
+        # 機器人可在連接時聲明可解碼的音頻格式，未聲明時使用 WAV
+        if data and data.get('audio_formats'):
+            app_audio.set_client_audio_formats(robot_id, data['audio_formats'])
         logging.info(f"机器人 {robot_id} 已连接")
         broadcast_robot_status(robot_id)
 
+    @socketio.on('audio_capabilities')
+    def handle_audio_capabilities(data):
+        """記錄客戶端可解碼的音頻格式，並回覆協商結果"""
+        audio_format = app_audio.set_client_audio_formats(request.sid, (data or {}).get('formats'))
+        emit('audio_format_selected', {'format': audio_format})
+
     @socketio.on('heartbeat')
     def handle_heartbeat(data):
         """处理心跳包"""
@@ -69,10 +91,11 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
     def handle_switch_whisper_mode(data):
         """处理Whisper模式切换"""
         try:
-            mode = data.get('mode')
+            mode = data.get('mode') or stt_selector.mode
             config = {
                 'local_whisper_model': data.get('local_model'),
-                'azure_whisper_model': data.get('azure_model')
+                'azure_whisper_model': data.get('azure_model'),
+                'decoding_profile': data.get('decoding_profile')
             }
             
             result = stt_selector.switch_mode(mode, config)
@@ -92,7 +115,7 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
     @socketio.on('start_phone_mode')
     def handle_start_phone_mode():
         """啟動電話模式"""
-        nonlocal phone_mode_active
+        nonlocal phone_mode_active, phone_mode_client
         
         try:
             if phone_mode_active:
@@ -104,6 +127,7 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
             
             if success:
                 phone_mode_active = True
+                phone_mode_client = request.sid
                 emit('phone_mode_started')
                 logging.info("電話模式已啟動")
             else:
@@ -116,13 +140,14 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
     @socketio.on('stop_phone_mode')
     def handle_stop_phone_mode():
         """停止電話模式"""
-        nonlocal phone_mode_active
+        nonlocal phone_mode_active, phone_mode_client
         
         try:
             success = phone_mode_manager.stop()
             
             if success:
                 phone_mode_active = False
+                phone_mode_client = None
                 emit('phone_mode_stopped')
                 logging.info("電話模式已停止")
             else:
@@ -132,12 +157,55 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
             logging.error(f"停止電話模式時出錯: {e}")
             emit('error', {'message': f'停止電話模式時出錯: {str(e)}'})
 
+    def respond_to_phone_speech(transcribed_text, turn):
+        """電話模式下回應機器人收到的一句語音：記錄歷史、生成回應並發送到前端和機器人"""
+        # 記錄用戶語音輸入到聊天歷史
+        user_message = {
+            "type": "sent",
+            "text": f"📞 {transcribed_text}",
+            "timestamp": datetime.now().isoformat(),
+            "audioSrc": None
+        }
+        save_chat_message(user_message)
+        
+        # 使用 chatbot 處理語音指令
+        ai_response = chatbot.get_response(transcribed_text, turn=turn)
+        if turn.cancelled:
+            return
+        # 電話模式的回應廣播給所有前端，分句音頻也一樣
+        audio_format = app_audio.get_client_audio_format(phone_mode_client)
+        tts_clip = synthesize_response(ai_response, turn=turn, on_chunk=make_chunk_emitter(None),
+                                       audio_format=audio_format)
+        if turn.cancelled:
+            return
+        tts_file = tts_clip.url if tts_clip else None
+        
+        # 記錄 AI 回應到聊天歷史
+        ai_message = {
+            "type": "received",
+            "text": f"📞 {ai_response}",
+            "timestamp": datetime.now().isoformat(),
+            "audioSrc": tts_file
+        }
+        save_chat_message(ai_message)
+        
+        # 發送回應到前端
+        emit('phone_mode_response', {
+            "text": ai_response,
+            "audio_file": tts_file
+        }, broadcast=True)
+        
+        # 將TTS按各機器人協商的格式發送播放（robot_speaker 模式下合成時已逐句發送）
+        if tts_clip and app_audio.current_output_mode != 'robot_speaker':
+            app_audio.send_audio_to_robots(list(connected_robots), ai_response, tts_clip.data, audio_format)
+
     @socketio.on('robot_vad_audio')
     def handle_robot_vad_audio(data):
         """處理機器人VAD檢測到的語音"""
         if not phone_mode_active:
             return
         
+        turn = None
         try:
             # 從機器人接收到音頻數據
             audio_data = data.get('audio_data')
@@ -147,63 +215,66 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
             # 通知前端檢測到語音
             emit('phone_mode_speech_detected', broadcast=True)
             
-            # 保存音頻到臨時文件
-            temp_file = "uploads/phone_mode_audio.wav"
-            os.makedirs("uploads", exist_ok=True)
-            
-            with open(temp_file, 'wb') as f:
-                f.write(audio_data)
-            
+            # 本輪對話從收到語音開始計時，並取消電話模式中仍在進行的上一輪
+            turn = turn_registry.begin(phone_mode_manager.session_id)
+
             # 轉錄語音
             from app_audio import transcribe_audio
-            transcribed_text = transcribe_audio(temp_file)
+            transcribed_text = transcribe_audio(audio_data)
             
             if not transcribed_text:
                 logging.warning("電話模式無法識別語音內容")
                 return
             
-            # 記錄用戶語音輸入到聊天歷史
-            user_message = {
-                "type": "sent",
-                "text": f"📞 {transcribed_text}",
-                "timestamp": datetime.now().isoformat(),
-                "audioSrc": None
-            }
-            save_chat_message(user_message)
-            
-            # 使用 chatbot 處理語音指令
-            ai_response = chatbot.get_response(transcribed_text)
-            tts_file = generate_tts(ai_response)
-            
-            # 記錄 AI 回應到聊天歷史
-            ai_message = {
-                "type": "received",
-                "text": f"📞 {ai_response}",
-                "timestamp": datetime.now().isoformat(),
-                "audioSrc": tts_file
-            }
-            save_chat_message(ai_message)
-            
-            # 發送回應到前端
-            emit('phone_mode_response', {
-                "text": ai_response,
-                "audio_file": tts_file
-            }, broadcast=True)
-            
-            # 將TTS發送給機器人播放
-            if tts_file:
-                with open(f"static{tts_file}", 'rb') as f:
-                    tts_data = f.read()
-                
-                for robot_id in connected_robots:
-                    emit('play_audio', {
-                        'audio_data': tts_data
-                    }, room=robot_id)
+            respond_to_phone_speech(transcribed_text, turn)
         
         except Exception as e:
             logging.error(f"處理電話模式語音時出錯: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            if turn is not None:
+                turn_registry.finish(turn)
+
+    @socketio.on('robot_audio_chunk')
+    def handle_robot_audio_chunk(data):
+        """處理機器人邊說邊發送的語音片段（16 位 PCM），錄音期間增量轉錄，final 時回應"""
+        if not phone_mode_active:
+            return
+
+        robot_id = request.sid
+        turn = None
+        try:
+            streamer = robot_audio_streams.get(robot_id)
+            if streamer is None:
+                streamer = app_audio.create_streaming_transcriber(robot_id, data.get('sample_rate', 16000))
+                robot_audio_streams[robot_id] = streamer
+                # 通知前端檢測到語音
+                emit('phone_mode_speech_detected', broadcast=True)
+
+            if data.get('audio_data'):
+                streamer.feed(data['audio_data'])
+            if not data.get('final'):
+                return
+
+            robot_audio_streams.pop(robot_id, None)
+            # 本輪對話從語音結束開始計時，並取消電話模式中仍在進行的上一輪
+            turn = turn_registry.begin(phone_mode_manager.session_id)
+            transcribed_text = streamer.finish()
+            if not transcribed_text:
+                logging.warning("電話模式無法識別語音內容")
+                return
+
+            respond_to_phone_speech(transcribed_text, turn)
+
+        except Exception as e:
+            robot_audio_streams.pop(robot_id, None)
+            logging.error(f"處理機器人語音片段時出錯: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            if turn is not None:
+                turn_registry.finish(turn)
 
     @socketio.on('set_input_mode')
     def handle_set_input_mode(data):
@@ -258,6 +329,9 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
             emit('response', {"text": "輸入為空，請重新輸入", "status": "error"})
             return
 
+        # 同一客戶端的新輸入會取消上一輪仍在生成的回應
+        turn = turn_registry.begin(request.sid)
+
         try:
             # 記錄用戶輸入到聊天歷史
             user_message = {
@@ -271,14 +345,20 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
             # 檢查是否是要求分析畫面的命令
             if should_trigger_vision(text):
                 # 觸發 AI Vision 分析
-                analyze_current_frame()
+                analyze_current_frame(turn=turn)
                 return
 
             # 使用 chatbot 取得 AI 回應
-            ai_response = chatbot.get_response(text)
+            ai_response = chatbot.get_response(text, turn=turn)
+            if turn.cancelled:
+                return
 
-            # 生成語音回應
-            tts_file = generate_tts(ai_response)
+            # 生成語音回應，分句音頻完成後立即推送給客戶端
+            tts_file = generate_tts(ai_response, turn=turn,
+                                    on_chunk=make_chunk_emitter(request.sid),
+                                    audio_format=app_audio.get_client_audio_format(request.sid))
+            if turn.cancelled:
+                return
             
             # 記錄 AI 回應到聊天歷史
             ai_message = {
@@ -305,11 +385,18 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
                 "text": "處理請求時出錯，請稍後重試",
                 "status": "error"
             })
+        finally:
+            turn_registry.finish(turn)
 
     @socketio.on('start_recording')
     def handle_start_recording():
         """當前端發送錄音指令時，執行電腦錄音，轉錄並發送給 AI"""
+        session_id = request.sid
+        turn = None
         try:
+            # 用戶開始新的發言，取消上一輪仍在生成的回應
+            turn_registry.cancel(session_id)
+
             # 檢查提示音文件
             if not os.path.exists("static/start_beep.wav") or not os.path.exists("static/stop_beep.wav"):
                 emit('error', {'message': "找不到提示音檔案"})
@@ -317,14 +404,26 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
                 
             # 通知前端開始錄音
             emit('start_recording_confirmed')
-            
-            audio_file = record_audio()
+
+            streamer = None
+            if app_audio.STT_STREAMING_ENABLED:
+                # 邊錄音邊轉錄：PC 錄音器按 VAD 檢測到語音結束後停止，錄到的每幀交給流式轉錄器
+                streamer = app_audio.create_streaming_transcriber(session_id, pc_recorder.rate)
+                pc_recorder.start_recording(on_audio=streamer.feed)
+                pc_recorder.recording_thread.join()
+            else:
+                audio_data = record_audio()
             
             # 通知前端結束錄音
             emit('stop_recording_confirmed')
+
+            # 本輪對話從錄音結束開始計時
+            turn = turn_registry.begin(session_id)
             
-            from app_audio import transcribe_audio
-            transcribed_text = transcribe_audio(audio_file)
+            if streamer is not None:
+                transcribed_text = streamer.finish()
+            else:
+                transcribed_text = app_audio.transcribe_audio(audio_data)
 
             if not transcribed_text:
                 emit('response', {"text": "無法識別語音內容。", "status": "error"})
@@ -344,12 +443,18 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
             # 使用 should_trigger_vision 函數檢查是否需要觸發 AI Vision 分析
             if should_trigger_vision(transcribed_text):
                 print("[DEBUG] 偵測到語音詢問畫面內容，開始影像分析")
-                analyze_current_frame()
+                analyze_current_frame(turn=turn)
                 return  # 直接返回，避免 chatbot 處理這句話
 
             # 取得 AI 回應
-            ai_response = chatbot.get_response(transcribed_text)
-            tts_file = generate_tts(ai_response)
+            ai_response = chatbot.get_response(transcribed_text, turn=turn)
+            if turn.cancelled:
+                return
+            tts_file = generate_tts(ai_response, turn=turn,
+                                    on_chunk=make_chunk_emitter(session_id),
+                                    audio_format=app_audio.get_client_audio_format(session_id))
+            if turn.cancelled:
+                return
             
             # 記錄 AI 回應到聊天歷史
             ai_message = {
@@ -369,26 +474,24 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
         except Exception as e:
             print(f"[ERROR] 錄音或轉錄失敗: {e}")
             emit('error', {'message': f"錄音或轉錄失敗: {str(e)}"})
+        finally:
+            if turn is not None:
+                turn_registry.finish(turn)
 
     @socketio.on('audio_uploaded')
     def handle_audio_upload(data):
         """處理音頻上傳"""
+        turn = None
         try:
-            filename = "user_audio.wav"
             content = data.get('content')
 
             if not content:
                 raise ValueError("接收到空的音頻數據")
 
-            filepath = os.path.join("uploads", filename)
-            os.makedirs("uploads", exist_ok=True)
+            turn = turn_registry.begin(request.sid)
 
-            # 保存音頻文件
-            with open(filepath, 'wb') as f:
-                f.write(content)
-
-            # 轉錄音頻
-            text = audio_manager.speech_to_text(filepath)
+            # 轉錄音頻（直接從內存解碼，不寫入共用的 user_audio.wav）
+            text = audio_manager.speech_to_text(content)
             if not text:
                 raise ValueError("音頻轉錄失敗")
                 
@@ -402,34 +505,39 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
             save_chat_message(user_message)
 
             # 獲取 ChatBot 回應
-            response = chatbot.get_response(text)
+            response = chatbot.get_response(text, turn=turn)
+            if turn.cancelled:
+                return
 
-            # 生成語音回應
-            tts_audio = audio_manager.text_to_speech(response)
+            # 生成語音回應（保存在內存音頻存儲中，不再寫入共用的 output.wav）
+            tts_clip = synthesize_response(response, turn=turn, on_chunk=make_chunk_emitter(request.sid),
+                                           audio_format=app_audio.get_client_audio_format(request.sid))
+            if turn.cancelled:
+                return
+            tts_file = tts_clip.url if tts_clip else None
             
             # 記錄 AI 回應到聊天歷史
             ai_message = {
                 "type": "received",
                 "text": response,
                 "timestamp": datetime.now().isoformat(),
-                "audioSrc": "/output.wav"
+                "audioSrc": tts_file
             }
             save_chat_message(ai_message)
 
-            # 讀取音頻文件的二進制數據
-            with open("output.wav", 'rb') as f:
-                audio_data = f.read()
-
             # 發送回應
             emit('response', {
                 "text": response,
-                "audio_file": "output.wav",
-                "audio_data": audio_data
+                "audio_file": tts_file,
+                "audio_data": tts_clip.data if tts_clip else None
             })
 
         except Exception as e:
             logging.error(f"處理音頻時出錯: {str(e)}")
             emit('error', {'message': f"處理音頻時出錯: {str(e)}"})
+        finally:
+            if turn is not None:
+                turn_registry.finish(turn)
 
     @socketio.on('control_action')
     def handle_control_action(data):
@@ -554,7 +662,7 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
                 return
                 
             print(f"[DEBUG] 開始分析攝像頭畫面，數據長度: {len(latest_frame) if latest_frame else 0}")
-            analyze_current_frame(socketio)
+            analyze_current_frame(socketio, turn=TurnContext())
 
         except Exception as e:
             print(f"[ERROR] 分析圖片時出錯: {str(e)}")
@@ -567,6 +675,11 @@ def register_socket_handlers(socketio, stt_selector, chatbot, current_input_mode
     def handle_disconnect():
         """处理断开连接"""
         client_id = request.sid
+        turn_registry.cancel(client_id)
+        app_audio.remove_client_audio_format(client_id)
+        streamer = robot_audio_streams.pop(client_id, None)
+        if streamer is not None:
+            streamer.cancel()
         if client_id in connected_robots:
             del connected_robots[client_id]
             logging.info(f"机器人 {client_id} 断开连接")
@@ -1,8 +1,6 @@
 import sys
 import logging
 import traceback
-import glob
-import os
 from app_main import app, socketio, main
 from app_utils import ensure_directories, clean_old_files
 
@@ -122,33 +120,8 @@ def startup(force=True):
         # 確保必要目錄存在
         ensure_directories()
         
-        # 清理舊文件
+        # 清理 uploads/ 下的舊錄音；TTS 和測試上傳的產物由 artifact_store 的後台清理線程管理
         clean_old_files("uploads", 24)
-        clean_old_files("static/uploads", 24)
-
-        # 清理 static/ 下的 response*.wav
-        for f in glob.glob("static/response*.wav"):
-            try:
-                os.remove(f)
-                logging.info(f"已刪除舊 TTS 音檔：{f}")
-            except Exception as e:
-                logging.warning(f"無法刪除 {f}: {e}")
-
-        # 清理 static/uploads/test/ 下的 .wav
-        for f in glob.glob("static/uploads/test/*.wav"):
-            try:
-                os.remove(f)
-                logging.info(f"已刪除測試上傳音檔：{f}")
-            except Exception as e:
-                logging.warning(f"無法刪除 {f}: {e}")
-
-        # 清理 static/uploads/test/ 下的 .jpg
-        for f in glob.glob("static/uploads/test/*.jpg"):
-            try:
-                os.remove(f)
-                logging.info(f"已刪除測試圖片：{f}")
-            except Exception as e:
-                logging.warning(f"無法刪除 {f}: {e}")
         
         try:
             # 初始化主應用
@@ -2,6 +2,7 @@ import os
 import time
 import json
 import logging
+import threading
 from datetime import datetime
 
 # 聊天歷史文件路徑 (從主應用共享)
@@ -10,6 +11,44 @@ MAX_HISTORY_ENTRIES = 15
 
 # 全局变量
 chat_history = {"messages": []}
+# 請求線程和後台動作線程都會寫入聊天歷史，修改內存記錄和寫文件需要串行進行
+_chat_history_lock = threading.Lock()
+
+def referenced_artifact_ids(messages):
+    """返回聊天歷史中引用的 TTS 音頻和產物 ID"""
+    artifact_ids = set()
+    for message in messages:
+        for key in ("audioSrc", "imageSrc"):
+            src = message.get(key)
+            if isinstance(src, str) and (src.startswith("/api/audio/")
+                                         or src.startswith("/static/artifacts/")):
+                filename = src.split("?")[0].rsplit("/", 1)[-1]
+                artifact_ids.add(os.path.splitext(filename)[0])
+    return artifact_ids
+
+def sync_artifact_pins():
+    """固定聊天歷史仍在引用的產物，避免後台清理使其失效"""
+    from artifact_store import artifact_store
+    artifact_store.set_pinned(referenced_artifact_ids(chat_history["messages"]))
+
+def persist_audio_reference(audio_src):
+    """把聊天歷史引用的內存 TTS 音頻保存到產物存儲，重啟或從內存淘汰後仍可播放"""
+    if not isinstance(audio_src, str) or not audio_src.startswith("/api/audio/"):
+        return
+    from audio_store import audio_store
+    from artifact_store import artifact_store
+
+    audio_id = audio_src.split("?")[0].rsplit("/", 1)[-1]
+    if artifact_store.get(audio_id) is not None:
+        return
+    clip = audio_store.get(audio_id)
+    if clip is None:
+        return
+    ext = {"audio/ogg": "ogg", "audio/mpeg": "mp3"}.get(clip.mimetype, "wav")
+    try:
+        artifact_store.save(clip.data, "tts", ext, artifact_id=audio_id)
+    except Exception as e:
+        logging.error(f"保存 TTS 音頻到產物存儲時出錯: {e}")
 
 def initialize_chat_history():
     """初始化聊天歷史紀錄"""
@@ -34,6 +73,8 @@ def initialize_chat_history():
     else:
         chat_history = {"messages": []}
 
+    sync_artifact_pins()
+
 def is_history_outdated():
     """檢查聊天歷史是否過期 (24小時)"""
     if not os.path.exists(CHAT_HISTORY_FILE):
@@ -50,18 +91,21 @@ def save_chat_message(message_entry):
     global chat_history
     
     # 添加新消息
-    chat_history["messages"].append(message_entry)
-    
-    # 如果超過最大條目數，移除最早的消息
-    if len(chat_history["messages"]) > MAX_HISTORY_ENTRIES:
-        chat_history["messages"] = chat_history["messages"][-MAX_HISTORY_ENTRIES:]
-    
-    # 保存到文件
-    try:
-        with open(CHAT_HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(chat_history, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"保存聊天歷史紀錄時發生錯誤: {e}")
+    persist_audio_reference(message_entry.get("audioSrc"))
+    with _chat_history_lock:
+        chat_history["messages"].append(message_entry)
+
+        # 如果超過最大條目數，移除最早的消息
+        if len(chat_history["messages"]) > MAX_HISTORY_ENTRIES:
+            chat_history["messages"] = chat_history["messages"][-MAX_HISTORY_ENTRIES:]
+        sync_artifact_pins()
+
+        # 保存到文件
+        try:
+            with open(CHAT_HISTORY_FILE, 'w', encoding='utf-8') as f:
+                json.dump(chat_history, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logging.error(f"保存聊天歷史紀錄時發生錯誤: {e}")
 
 def save_audio_file(filename, content):
     """保存音频文件"""
@@ -82,7 +126,7 @@ def format_timestamp(timestamp):
 
 def ensure_directories():
     """确保必要的目录存在"""
-    directories = ["uploads", "static/uploads", "static/uploads/test"]
+    directories = ["uploads"]
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
     
@@ -150,4 +194,44 @@ def create_backup(file_path):
         return True
     except Exception as e:
         logging.error(f"创建备份文件时出错: {e}")
-        return False
\ No newline at end of file
+        return False
+
+class TTLCache:
+    """線程安全的簡單 TTL 緩存，超時或超出容量的條目會被移除"""
+
+    def __init__(self, ttl_seconds=600, max_entries=128):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """獲取未過期的緩存值，不存在或已過期則返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        """寫入緩存值"""
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                # 優先移除已過期的條目，否則移除最早過期的條目
+                now = time.time()
+                expired = [k for k, (expires_at, _) in self._entries.items() if expires_at < now]
+                for k in expired:
+                    del self._entries[k]
+                if len(self._entries) >= self.max_entries:
+                    oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                    del self._entries[oldest]
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+
+    def clear(self):
+        """清空緩存"""
+        with self._lock:
+            self._entries.clear()
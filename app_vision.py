@@ -7,6 +7,10 @@ from azure.ai.vision.imageanalysis import ImageAnalysisClient
 from azure.ai.vision.imageanalysis.models import VisualFeatures
 from config import AZURE_VISION_ENDPOINT, AZURE_VISION_KEY
 from azure.core.credentials import AzureKeyCredential
+from turn_context import run_with_deadline, TurnDeadlineExceeded, TurnCancelled
+
+# 視覺分析單次調用的最長時間（秒）
+VISION_TIMEOUT = 10
 
 # 全局变量，会在app_main.py中设置
 vision_client = None
@@ -103,8 +107,13 @@ def is_person_detected(caption, objects, tags):
             
     return False
 
-def analyze_current_frame(socketio_instance=None):
-    """分析當前攝像頭畫面"""
+def analyze_current_frame(socketio_instance=None, turn=None):
+    """分析當前攝像頭畫面
+
+    Args:
+        socketio_instance: 用於發送回應的 SocketIO 實例
+        turn: 本輪對話的 TurnContext，視覺、GPT 和 TTS 調用受其時間預算限制
+    """
     # 注意：不要使用global語句，直接從主模塊獲取最新的frame數據
     try:
         # 如果没有设置socketio实例，从主模块导入
@@ -137,7 +146,11 @@ def analyze_current_frame(socketio_instance=None):
         # 分析圖片
         from app_main import vision_client, chatbot, save_chat_message
         
-        result = vision_client.analyze(
+        result = run_with_deadline(
+            vision_client.analyze,
+            turn,
+            cap=VISION_TIMEOUT,
+            read_timeout=VISION_TIMEOUT,  # 超時放棄後連接也會在此時間內結束，釋放工作線程
             image_data=image_data,
             visual_features=[
                 VisualFeatures.CAPTION,
@@ -171,21 +184,19 @@ def analyze_current_frame(socketio_instance=None):
         # 检查是否识别到人物相关的内容
         detected_person = is_person_detected(caption, objects, tags)
 
-        # 準備給 GPT 的提示
-        prompt = f"""作為一個友善的助手，請用自然的廣東話描述以下場景：
-
-場景描述：{caption}
-可見的物件：{', '.join(objects) if objects else '無'}
-場景特徵：{', '.join(tags) if tags else '無'}
-
-請用簡單、生活化的方式描述，一定要以「我見到」開始句子。"""
+        # 如果检测到人物，挥手动作与场景描述和 TTS 同时进行
+        if detected_person:
+            logging.info("[VISION] 检测到人物，执行挥手动作")
+            # 使用单位数动作9（挥手）
+            from app_robot_control import dispatch_action_async, execute_singledigit_action
+            dispatch_action_async(execute_singledigit_action, '9', '1')
 
         response_text = ""
         tts_file = None
 
         try:
-            # 使用 chatbot 獲取 GPT 回應
-            gpt_response = chatbot.get_response(prompt)
+            # 直接生成場景描述，不經過聊天意圖路由
+            gpt_response = chatbot.describe_scene(caption, objects, tags, turn=turn)
             logging.info(f"[VISION] GPT 生成回應: {gpt_response}")
             
             if gpt_response:
@@ -203,7 +214,12 @@ def analyze_current_frame(socketio_instance=None):
             response_text = f"我見到{caption}"
         
         # 只在這一個地方生成 TTS
-        tts_file = generate_tts(response_text)
+        tts_file = generate_tts(response_text, turn=turn)
+
+        # 本輪已被新的輸入取代時不再發送回應
+        if turn is not None and turn.cancelled:
+            logging.info("[VISION] 對話輪次已取消，丟棄分析結果")
+            return
         
         # 記錄 AI 回應到聊天歷史
         ai_message = {
@@ -220,14 +236,15 @@ def analyze_current_frame(socketio_instance=None):
             "audio_file": tts_file,
             "status": "success"
         })
-        
-        # 如果检测到人物相关内容，执行一次挥手动作
-        if detected_person:
-            logging.info("[VISION] 检测到人物，执行挥手动作")
-            # 使用单位数动作9（挥手）
-            from app_robot_control import execute_singledigit_action
-            execute_singledigit_action('9', '1')
 
+    except TurnCancelled:
+        logging.info("[VISION] 對話輪次已取消，停止分析畫面")
+    except TurnDeadlineExceeded as e:
+        logging.warning(f"[VISION] 分析畫面超出時間預算: {e}")
+        socketio_instance.emit('response', {
+            "text": "抱歉，分析畫面用咗太耐時間，請再試一次。",
+            "status": "error"
+        })
     except Exception as e:
         logging.error(f"[VISION] 分析圖片時出錯: {str(e)}")
         traceback.print_exc()
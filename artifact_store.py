@@ -0,0 +1,166 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+import config
+
+# 產物目錄（位於 static 下，由 Flask 靜態路由直接提供，支持 Range 和條件請求）
+ARTIFACT_DIR = os.path.join("static", "artifacts")
+
+# 產物總大小和保留時間預算，以及後台清理間隔
+ARTIFACT_MAX_BYTES = getattr(config, "ARTIFACT_MAX_BYTES", 500 * 1024 * 1024)
+ARTIFACT_MAX_AGE_HOURS = getattr(config, "ARTIFACT_MAX_AGE_HOURS", 24)
+ARTIFACT_SWEEP_INTERVAL = getattr(config, "ARTIFACT_SWEEP_INTERVAL", 600)
+
+
+class Artifact:
+    """一個保存在磁盤上的產物（TTS 音頻、測試上傳的圖片或音頻）"""
+
+    def __init__(self, artifact_id, filename, size, created_at, directory=ARTIFACT_DIR):
+        self.artifact_id = artifact_id
+        self.filename = filename
+        self.size = size
+        self.created_at = created_at
+        self.directory = directory
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, self.filename)
+
+    @property
+    def url(self):
+        return f"/static/artifacts/{self.filename}"
+
+
+class ArtifactStore:
+    """有大小和時間預算的產物存儲
+
+    每個產物有唯一 ID，後台線程定期淘汰超出保留時間或總大小預算的產物；
+    聊天歷史仍在引用的產物會被固定，直到對應的歷史條目被移除。
+    """
+
+    def __init__(self, directory=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_BYTES,
+                 max_age_hours=ARTIFACT_MAX_AGE_HOURS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_hours * 3600
+        self._artifacts = {}   # artifact_id -> Artifact
+        self._pinned = set()
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.evictions = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """掃描產物目錄，恢復重啟前的產物索引"""
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                artifact_id = os.path.splitext(entry.name)[0]
+                self._artifacts[artifact_id] = Artifact(
+                    artifact_id, entry.name, stat.st_size, stat.st_mtime, self.directory)
+        logging.info(f"產物存儲已加載: {len(self._artifacts)} 個文件")
+
+    @staticmethod
+    def new_id(kind):
+        """生成唯一 ID，包含類型和時間方便排查，隨機後綴避免同一秒內衝突"""
+        return f"{kind}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def _register(self, artifact_id, filename, size):
+        artifact = Artifact(artifact_id, filename, size, time.time(), self.directory)
+        with self._lock:
+            self._artifacts[artifact_id] = artifact
+        return artifact
+
+    def save(self, data, kind, ext, artifact_id=None):
+        """保存數據並返回 Artifact，先寫臨時文件再原子替換"""
+        artifact_id = artifact_id or self.new_id(kind)
+        filename = f"{artifact_id}.{ext}"
+        path = os.path.join(self.directory, filename)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return self._register(artifact_id, filename, len(data))
+
+    def save_upload(self, file_storage, kind, ext):
+        """保存 Flask 上傳的文件並返回 Artifact"""
+        artifact_id = self.new_id(kind)
+        filename = f"{artifact_id}.{ext}"
+        path = os.path.join(self.directory, filename)
+        temp_path = f"{path}.tmp"
+        file_storage.save(temp_path)
+        os.replace(temp_path, path)
+        return self._register(artifact_id, filename, os.path.getsize(path))
+
+    def get(self, artifact_id):
+        """按 ID 獲取產物，不存在或已被淘汰時返回 None"""
+        with self._lock:
+            return self._artifacts.get(artifact_id)
+
+    def set_pinned(self, artifact_ids):
+        """設置仍被聊天歷史引用、不可淘汰的產物"""
+        with self._lock:
+            self._pinned = set(artifact_ids)
+
+    def sweep(self):
+        """淘汰超出保留時間的產物，再按從舊到新淘汰直到總大小回到預算內"""
+        now = time.time()
+        with self._lock:
+            candidates = sorted(
+                (a for a in self._artifacts.values() if a.artifact_id not in self._pinned),
+                key=lambda a: a.created_at)
+            total_bytes = sum(a.size for a in self._artifacts.values())
+
+            expired = []
+            for artifact in candidates:
+                if now - artifact.created_at > self.max_age_seconds or total_bytes > self.max_bytes:
+                    expired.append(artifact)
+                    total_bytes -= artifact.size
+                    del self._artifacts[artifact.artifact_id]
+
+        for artifact in expired:
+            try:
+                os.remove(artifact.path)
+            except OSError as e:
+                logging.warning(f"刪除產物失敗 {artifact.filename}: {e}")
+        self.evictions += len(expired)
+        if expired:
+            logging.info(f"已清理 {len(expired)} 個產物，剩餘 {total_bytes} 字節")
+        return len(expired)
+
+    def start_sweeper(self, interval=ARTIFACT_SWEEP_INTERVAL):
+        """啟動後台清理線程"""
+        if self._sweeper is not None:
+            return
+
+        def sweep_loop():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logging.error(f"清理產物時出錯: {e}")
+                time.sleep(interval)
+
+        self._sweeper = threading.Thread(target=sweep_loop, daemon=True, name="artifact_sweeper")
+        self._sweeper.start()
+
+    def stats(self):
+        """返回存儲統計"""
+        with self._lock:
+            return {
+                "entries": len(self._artifacts),
+                "bytes": sum(a.size for a in self._artifacts.values()),
+                "pinned": len(self._pinned),
+                "max_bytes": self.max_bytes,
+                "max_age_seconds": self.max_age_seconds,
+                "evictions": self.evictions
+            }
+
+
+# 全局產物存儲
+artifact_store = ArtifactStore()
@@ -1,37 +1,60 @@
-import whisper
-import pyttsx3
+import io
 import pyaudio
 import wave
 import os
 import webrtcvad
 from pydub import AudioSegment
 from pydub.playback import play
+import config
+from tts_service import get_tts_service
+from model_registry import model_registry
+from whisper_selector import load_pcm, pcm_to_wav_bytes
+from audio_preprocess import STT_TRIM_SILENCE
+
+# 上傳音頻轉錄使用的 Whisper 模型大小；None 時跟隨 STT 選擇器當前的本地模型，不另外加載一個模型
+AUDIO_MANAGER_WHISPER_MODEL = getattr(config, "AUDIO_MANAGER_WHISPER_MODEL", None)
+# 沒有 STT 選擇器可跟隨時使用的模型大小（與選擇器的默認值相同）
+DEFAULT_WHISPER_MODEL = "medium"
 
 class AudioManager:
-    def __init__(self):
-        self.stt_model = whisper.load_model("small")  # Whisper 語音轉文字模型
-        self.tts_engine = pyttsx3.init()  # 使用 pyttsx3 進行文字轉語音
+    def __init__(self, model_size=AUDIO_MANAGER_WHISPER_MODEL, stt_selector=None):
+        # Whisper 模型在首次轉錄時才從共享註冊表借用，閒置時由註冊表卸載
+        self.model_size = model_size
+        self.stt_selector = stt_selector
         self.is_recording = False  # 初始化錄音狀態
+
+    def _whisper_model(self):
+        """返回轉錄使用的 (模型大小, 是否量化)，未指定大小時與 STT 選擇器共用同一個模型"""
+        if self.model_size:
+            return self.model_size, False
+        if self.stt_selector is not None:
+            return self.stt_selector.local_model_size, self.stt_selector.mode == "local_quantized"
+        return DEFAULT_WHISPER_MODEL, False
     
     def convert_audio_to_16k_mono(self, input_path, output_path="converted_audio.wav"):
-        """將音訊轉換為 16kHz 單聲道"""
-        audio = AudioSegment.from_file(input_path)
-        audio = audio.set_frame_rate(16000).set_channels(1)
-        audio.export(output_path, format="wav")
+        """將音訊轉換為 16kHz 單聲道（WAV 輸入在進程內重採樣，不調用 ffmpeg）"""
+        with open(output_path, "wb") as f:
+            f.write(pcm_to_wav_bytes(load_pcm(input_path)))
         return output_path
     
-    def speech_to_text(self, audio_path):
-        """語音轉文字"""
-        processed_audio_path = self.convert_audio_to_16k_mono(audio_path)
-        result = self.stt_model.transcribe(processed_audio_path, language="zh")
+    def speech_to_text(self, audio):
+        """語音轉文字
+
+        audio 可以是文件路徑或內存中的音頻字節，在內存中轉為 16kHz 單聲道後直接交給 Whisper，
+        不再寫出 converted_audio.wav。
+        """
+        samples = load_pcm(audio, trim=STT_TRIM_SILENCE)
+        model_size, quantized = self._whisper_model()
+        with model_registry.use(model_size, quantized=quantized) as model:
+            result = model.transcribe(samples, language="zh")
         return result.get("text")
 
     def text_to_speech(self, text):
-        """文字轉語音"""
-        self.tts_engine.save_to_file(text, "output.wav")
-        self.tts_engine.runAndWait()
-        with open("output.wav", "rb") as f:
-            return f.read()
+        """文字轉語音，返回 WAV 音頻數據
+
+        使用共用的 TTS 服務（緩存、相同請求合併，Azure 不可用時改用本地 pyttsx3 引擎）。
+        """
+        return get_tts_service().synthesize(text)
     
     def play_sound(self, file_path):
         """播放提示音"""
@@ -134,17 +157,13 @@ class AudioManager:
     def speak_response(self, response):
         """播放機器人回應"""
         try:
-            audio_file = self.text_to_speech(response)
-            if not audio_file:
-                print("[ERROR] 無法生成音頻文件")
+            audio_data = self.text_to_speech(response)
+            if not audio_data:
+                print("[ERROR] 無法生成音頻")
                 return
             
-            audio = AudioSegment.from_file("output.wav", format="wav")
+            audio = AudioSegment.from_file(io.BytesIO(audio_data), format="wav")
             play(audio)
             print("[INFO] 播放機器人回應")
-            
-            if os.path.exists("output.wav"):
-                os.remove("output.wav")
-                print("[INFO] 已刪除回應音頻文件")
         except Exception as e:
             print(f"語音播放失敗：{e}")
@@ -0,0 +1,88 @@
+import logging
+from math import gcd
+import numpy as np
+import config
+
+# STT 前是否裁剪首尾靜音，以及裁剪後在語音兩端保留的填充（毫秒）
+STT_TRIM_SILENCE = getattr(config, "STT_TRIM_SILENCE", True)
+STT_TRIM_PADDING_MS = getattr(config, "STT_TRIM_PADDING_MS", 200)
+# webrtcvad 的敏感度（0-3，越大越容易判為非語音）
+STT_VAD_AGGRESSIVENESS = getattr(config, "STT_VAD_AGGRESSIVENESS", 2)
+
+TARGET_SAMPLE_RATE = 16000
+VAD_FRAME_MS = 30
+
+
+def mixdown(samples):
+    """多聲道（樣本數, 聲道數）混合為單聲道"""
+    samples = np.asarray(samples)
+    if samples.ndim > 1:
+        return samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    return samples
+
+
+def to_float32(samples):
+    """整數 PCM 轉為 [-1, 1] 範圍的 float32"""
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    if samples.dtype == np.int32:
+        return samples.astype(np.float32) / 2147483648.0
+    return samples.astype(np.float32, copy=False)
+
+
+def resample(samples, orig_rate, target_rate=TARGET_SAMPLE_RATE):
+    """多相濾波重採樣（scipy.signal.resample_poly），在進程內完成，不調用 ffmpeg"""
+    if orig_rate == target_rate or not len(samples):
+        return samples
+    from scipy.signal import resample_poly
+    divisor = gcd(int(orig_rate), int(target_rate))
+    return resample_poly(samples, target_rate // divisor, orig_rate // divisor).astype(np.float32)
+
+
+def _vad_speech_frames(samples, sample_rate, frame_size):
+    """逐幀判斷是否為語音，優先使用 webrtcvad，未安裝時按能量判斷"""
+    frame_count = len(samples) // frame_size
+    frames = samples[:frame_count * frame_size].reshape(frame_count, frame_size)
+    try:
+        import webrtcvad
+        vad = webrtcvad.Vad(STT_VAD_AGGRESSIVENESS)
+        pcm = (np.clip(frames, -1.0, 1.0) * 32767).astype(np.int16)
+        return np.array([vad.is_speech(frame.tobytes(), sample_rate) for frame in pcm])
+    except ImportError:
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        # 以最安靜的一成幀作為底噪估計
+        threshold = max(0.01, np.percentile(rms, 10) * 4)
+        return rms > threshold
+
+
+def speech_bounds(samples, sample_rate=TARGET_SAMPLE_RATE):
+    """返回第一段和最後一段語音的樣本範圍 (start, end)，沒有檢測到語音時返回 None"""
+    frame_size = int(sample_rate * VAD_FRAME_MS / 1000)
+    if len(samples) < frame_size:
+        return None
+    speech = np.flatnonzero(_vad_speech_frames(samples, sample_rate, frame_size))
+    if not len(speech):
+        return None
+    return speech[0] * frame_size, (speech[-1] + 1) * frame_size
+
+
+def trim_silence(samples, sample_rate=TARGET_SAMPLE_RATE, padding_ms=STT_TRIM_PADDING_MS):
+    """裁剪首尾靜音並在語音兩端保留少量填充；沒有檢測到語音時原樣返回，交由 STT 判斷"""
+    bounds = speech_bounds(samples, sample_rate)
+    if bounds is None:
+        return samples
+    padding = int(sample_rate * padding_ms / 1000)
+    start, end = max(0, bounds[0] - padding), min(len(samples), bounds[1] + padding)
+    return samples[start:end]
+
+
+def preprocess(samples, sample_rate, trim=STT_TRIM_SILENCE):
+    """STT 前處理：混合為單聲道、轉為 float32、重採樣到 16kHz，並可選裁剪首尾靜音"""
+    samples = resample(mixdown(to_float32(np.asarray(samples))), sample_rate)
+    if trim:
+        original_seconds = len(samples) / TARGET_SAMPLE_RATE
+        samples = trim_silence(samples)
+        trimmed_seconds = original_seconds - len(samples) / TARGET_SAMPLE_RATE
+        if trimmed_seconds > 0:
+            logging.info(f"已裁剪靜音 {trimmed_seconds:.1f} 秒，剩餘 {len(samples) / TARGET_SAMPLE_RATE:.1f} 秒")
+    return samples
@@ -0,0 +1,249 @@
+import io
+import struct
+import time
+import uuid
+import wave
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import config
+
+# 內存音頻存儲的字節預算和最大條目數
+AUDIO_STORE_MAX_BYTES = getattr(config, "AUDIO_STORE_MAX_BYTES", 64 * 1024 * 1024)
+AUDIO_STORE_MAX_ENTRIES = getattr(config, "AUDIO_STORE_MAX_ENTRIES", 500)
+
+
+def wav_duration(data):
+    """從 WAV 數據的文件頭計算時長（秒），無法解析時返回 None"""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as reader:
+            return reader.getnframes() / reader.getframerate()
+    except Exception:
+        return None
+
+
+# Ogg 頁頭標誌
+OGG_CONTINUED = 0x01
+OGG_BOS = 0x02
+OGG_EOS = 0x04
+
+
+def _ogg_crc_table():
+    table = []
+    for index in range(256):
+        crc = index << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else (crc << 1)
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_OGG_CRC_TABLE = _ogg_crc_table()
+
+
+def _ogg_crc(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC_TABLE[((crc >> 24) & 0xFF) ^ byte]
+    return crc
+
+
+def ogg_pages(data):
+    """逐頁解析 Ogg 數據，產生 (頁頭標誌, granule position, serial, [(分段數據, 是否為包結尾)])"""
+    offset = 0
+    while offset + 27 <= len(data):
+        if data[offset:offset + 4] != b"OggS":
+            raise ValueError(f"位置 {offset} 不是 Ogg 頁")
+        header_type, granule, serial = struct.unpack_from("<BqI", data, offset + 5)
+        segment_count = data[offset + 26]
+        lacing = data[offset + 27:offset + 27 + segment_count]
+        position = offset + 27 + segment_count
+        segments = []
+        for size in lacing:
+            segments.append((data[position:position + size], size < 255))
+            position += size
+        yield header_type, granule, serial, segments
+        offset = position
+
+
+def ogg_links(data):
+    """把（可能是鏈式的）Ogg 數據拆分為邏輯流，每段為 {"packets": [...], "granule": 最後的 granule}"""
+    links = []
+    packet = b""
+    for header_type, granule, _, segments in ogg_pages(data):
+        if header_type & OGG_BOS:
+            links.append({"packets": [], "granule": 0})
+            packet = b""
+        if not links:
+            raise ValueError("Ogg 數據缺少起始頁")
+        for segment, complete in segments:
+            packet += segment
+            if complete:
+                links[-1]["packets"].append(packet)
+                packet = b""
+        if granule >= 0:
+            links[-1]["granule"] = granule
+    return links
+
+
+def opus_pre_skip(head_packet):
+    """從 OpusHead 包讀取 pre-skip（48kHz 樣本數）"""
+    if not head_packet.startswith(b"OpusHead"):
+        raise ValueError("不是 Ogg Opus 數據")
+    return struct.unpack_from("<H", head_packet, 10)[0]
+
+
+def opus_packet_samples(packet):
+    """按 TOC 字節計算 Opus 包解碼後的樣本數（48kHz，RFC 6716 3.1 節）"""
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        frame_samples = (480, 960, 1920, 2880)[config % 4]
+    elif config < 16:
+        frame_samples = (480, 960)[config % 2]
+    else:
+        frame_samples = (120, 240, 480, 960)[config % 4]
+    frame_count = (1, 2, 2, packet[1] & 0x3F if len(packet) > 1 else 0)[toc & 0x03]
+    return frame_samples * frame_count
+
+
+def _ogg_page(header_type, granule, serial, sequence, packets):
+    """生成只包含完整包的一個 Ogg 頁"""
+    lacing = bytearray()
+    for packet in packets:
+        lacing.extend(b"\xff" * (len(packet) // 255))
+        lacing.append(len(packet) % 255)
+    header = struct.pack("<4sBBqIIIB", b"OggS", 0, header_type, granule, serial, sequence, 0, len(lacing))
+    page = bytearray(header + bytes(lacing) + b"".join(packets))
+    struct.pack_into("<I", page, 22, _ogg_crc(page))
+    return bytes(page)
+
+
+def concat_ogg_opus(chunks, max_page_bytes=4096):
+    """把多段 Ogg Opus 音頻重新封裝為單一邏輯流
+
+    直接拼接會得到鏈式 Ogg 流，不少瀏覽器解碼器只播放第一段。這裡沿用第一段的
+    OpusHead 和 OpusTags，依次寫入各段的音頻包並重新計算 granule position，
+    不需要解碼和重新編碼；後續各段的 pre-skip 樣本（約 6.5 毫秒）會照常播放。
+    """
+    links = [link for chunk in chunks for link in ogg_links(chunk)]
+    head, tags = links[0]["packets"][:2]
+    pre_skip = opus_pre_skip(head)
+
+    audio_packets = []
+    for link in links:
+        audio_packets.extend(link["packets"][2:])
+    # 最後一段結尾的填充樣本仍按原來的 granule 裁掉
+    last = links[-1]
+    last_samples = sum(opus_packet_samples(packet) for packet in last["packets"][2:])
+    end_trim = max(0, last_samples - last["granule"])
+
+    serial = struct.unpack_from("<I", chunks[0], 14)[0]
+    pages = [_ogg_page(OGG_BOS, 0, serial, 0, [head]), _ogg_page(0, 0, serial, 1, [tags])]
+    granule = 0
+    page_packets, page_bytes, page_segments = [], 0, 0
+    for index, packet in enumerate(audio_packets):
+        segments = len(packet) // 255 + 1
+        if page_packets and (page_segments + segments > 255 or page_bytes + len(packet) > max_page_bytes):
+            pages.append(_ogg_page(0, granule, serial, len(pages), page_packets))
+            page_packets, page_bytes, page_segments = [], 0, 0
+        page_packets.append(packet)
+        page_bytes += len(packet)
+        page_segments += segments
+        granule += opus_packet_samples(packet)
+    pages.append(_ogg_page(OGG_EOS, max(pre_skip, granule - end_trim), serial, len(pages), page_packets))
+    return b"".join(pages)
+
+
+def ogg_duration(data):
+    """從 Ogg Opus 各邏輯流的最後 granule position 減去 pre-skip 計算時長（秒），鏈式流按各段相加"""
+    try:
+        links = ogg_links(data)
+        samples = sum(max(0, link["granule"] - opus_pre_skip(link["packets"][0])) for link in links)
+    except (ValueError, IndexError, struct.error):
+        return None
+    if not links:
+        return None
+    # Opus 的 granule position 固定以 48kHz 計算
+    return samples / 48000
+
+
+def audio_duration(data, mimetype="audio/wav"):
+    """按 MIME 類型計算音頻時長（秒），無法解析時返回 None"""
+    if mimetype == "audio/wav":
+        return wav_duration(data)
+    if mimetype == "audio/ogg":
+        return ogg_duration(data)
+    if mimetype == "audio/mpeg":
+        # TTS 使用 32kbps 固定碼率 MP3
+        return len(data) * 8 / 32000
+    return None
+
+
+class AudioClip:
+    """一段保存在內存中的音頻及其元數據"""
+
+    def __init__(self, audio_id, data, mimetype="audio/wav", duration=None):
+        self.audio_id = audio_id
+        self.data = data
+        self.mimetype = mimetype
+        self.duration = duration
+        self.etag = hashlib.sha1(data).hexdigest()
+        self.created_at = time.time()
+
+    @property
+    def url(self):
+        """網頁和機器人可訪問的音頻地址"""
+        return f"/api/audio/{self.audio_id}"
+
+
+class AudioStore:
+    """有界的內存音頻存儲，超出字節預算或條目數時淘汰最舊的音頻"""
+
+    def __init__(self, max_bytes=AUDIO_STORE_MAX_BYTES, max_entries=AUDIO_STORE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._clips = OrderedDict()  # audio_id -> AudioClip，按寫入時間排序
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id():
+        """生成新的音頻 ID，可在音頻生成前預先分配"""
+        return uuid.uuid4().hex
+
+    def put(self, data, mimetype="audio/wav", duration=None, audio_id=None):
+        """保存音頻並返回 AudioClip，未提供時長時從音頻數據中計算"""
+        if duration is None:
+            duration = audio_duration(data, mimetype)
+        clip = AudioClip(audio_id or self.new_id(), data, mimetype, duration)
+
+        with self._lock:
+            self._clips[clip.audio_id] = clip
+            self._total_bytes += len(data)
+            while self._clips and (self._total_bytes > self.max_bytes
+                                   or len(self._clips) > self.max_entries):
+                _, evicted = self._clips.popitem(last=False)
+                self._total_bytes -= len(evicted.data)
+                logging.debug(f"音頻存儲已淘汰: {evicted.audio_id}")
+        return clip
+
+    def get(self, audio_id):
+        """獲取音頻，不存在或已被淘汰時返回 None"""
+        with self._lock:
+            return self._clips.get(audio_id)
+
+    def stats(self):
+        """返回存儲統計"""
+        with self._lock:
+            return {
+                "entries": len(self._clips),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries
+            }
+
+
+# 全局音頻存儲
+audio_store = AudioStore()
@@ -0,0 +1,84 @@
+"""比較本地 Whisper 逐個轉錄與微批量調度在 1、4、8 路並發下的吞吐量和延遲
+
+逐個轉錄: 每路請求直接調用共享模型的 transcribe（與原實現相同，各請求同時爭用 CPU）。
+微批量: 請求經 BatchScheduler 在窗口時間內合併，一次批量推理。
+
+吞吐量以每秒處理的音頻秒數計算；測試集中超過 30 秒的音頻會被跳過。
+
+用法: python benchmarks/stt_batch_benchmark.py --model small [--streams 1 4 8] [--window-ms 30]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stt_common import DEFAULT_DATA_DIR, load_dataset, percentile
+from model_registry import model_registry
+from stt_batcher import BatchScheduler, WHISPER_WINDOW_SECONDS
+
+DECODE_OPTIONS = {"language": "zh", "temperature": 0.0, "fp16": False}
+
+
+def run_streams(transcribe, samples, streams, requests_per_stream):
+    """每路線程依次轉錄 requests_per_stream 段音頻，返回 (總耗時, 延遲列表, 音頻總秒數)"""
+    latencies, audio_seconds = [], []
+    lock = threading.Lock()
+
+    def worker(index):
+        for i in range(requests_per_stream):
+            sample = samples[(index + i * streams) % len(samples)]
+            start = time.perf_counter()
+            transcribe(sample.audio)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                audio_seconds.append(sample.duration)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(streams)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, sum(audio_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Whisper 微批量吞吐量基準測試")
+    parser.add_argument("--model", default="small", help="Whisper 模型大小")
+    parser.add_argument("--quantized", action="store_true", help="使用動態 int8 量化模型")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="WAV + TXT 測試集目錄")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=4, help="每路請求數")
+    parser.add_argument("--window-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    samples = [sample for sample in load_dataset(args.data) if sample.duration <= WHISPER_WINDOW_SECONDS]
+    if not samples:
+        raise SystemExit("測試集中沒有 30 秒以內的音頻")
+
+    with model_registry.use(args.model, quantized=args.quantized) as model:
+        # 預熱一次，避免首次調用的初始化開銷計入結果
+        model.transcribe(samples[0].audio, **DECODE_OPTIONS)
+        scheduler = BatchScheduler(args.model, args.quantized, window_ms=args.window_ms,
+                                   max_batch=max(args.streams))
+        variants = (
+            ("逐個", lambda audio: model.transcribe(audio, **DECODE_OPTIONS)),
+            ("微批量", lambda audio: scheduler.transcribe(audio, DECODE_OPTIONS)),
+        )
+
+        print(f"模型: {args.model}{' (int8)' if args.quantized else ''}, 每路 {args.requests} 個請求")
+        print(f"{'方式':<8}{'並發':>6}{'吞吐(音頻秒/秒)':>18}{'p50(秒)':>10}{'p95(秒)':>10}")
+        for streams in args.streams:
+            for label, transcribe in variants:
+                wall, latencies, audio_seconds = run_streams(transcribe, samples, streams, args.requests)
+                print(f"{label:<8}{streams:>6}{audio_seconds / wall:>18.2f}"
+                      f"{percentile(latencies, 0.5):>10.2f}{percentile(latencies, 0.95):>10.2f}")
+        print(f"批量統計: {scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""比較各 SpeechToTextSelector 配置的粵語字錯誤率、實時率、延遲、峰值內存和模型加載時間
+
+每個配置在獨立子進程中運行（峰值 RSS 只反映該配置），依次: 加載後端（計入加載時間）、
+預熱一次、逐段轉錄測試集。結果以表格打印，並可用 --json 寫入文件。
+
+配置格式為 <模式>:<模型>，例如 local:small、local_quantized:medium、azure。
+
+Azure 離線運行: 用 --azure-record 指定錄製文件。設置了 AZURE_OPENAI_API_KEY 和
+AZURE_OPENAI_ENDPOINT 時實際調用 Azure，並把每段的識別文本和往返時間寫入該文件；
+沒有憑證時讀取錄製文件，按記錄的往返時間等待後返回記錄的文本，使結果可在離線環境中復現。
+
+用法: python benchmarks/stt_benchmark.py [--configs local:tiny local:small azure]
+      [--data benchmarks/data/cantonese] [--azure-record benchmarks/data/azure_responses.json]
+      [--json results.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stt_common import DEFAULT_DATA_DIR, load_dataset, character_error_rate, percentile
+
+DEFAULT_CONFIGS = ("local:tiny", "local:base", "local:small", "local:medium",
+                   "local_quantized:medium", "azure")
+DEFAULT_AZURE_RECORD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "azure_responses.json")
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class RecordingAzureClient:
+    """包裝 Azure 客戶端的 audio.transcriptions.create，按當前樣本名錄製或回放響應
+
+    live 為 None 時回放: 等待錄製的往返時間後返回錄製的文本。
+    """
+
+    def __init__(self, recordings, live=None):
+        self.recordings = recordings
+        self.live = live
+        self.sample_name = None
+        self.audio = self
+        self.transcriptions = self
+
+    def create(self, **kwargs):
+        if self.live is None:
+            recording = self.recordings.get(self.sample_name)
+            if recording is None:
+                raise KeyError(f"錄製文件中沒有樣本 {self.sample_name}")
+            time.sleep(recording["seconds"])
+            return _Response(recording["text"])
+
+        start = time.perf_counter()
+        result = self.live.audio.transcriptions.create(**kwargs)
+        self.recordings[self.sample_name] = {
+            "text": result.text, "seconds": round(time.perf_counter() - start, 3)
+        }
+        return result
+
+
+def peak_rss_mb():
+    """本進程的峰值常駐內存（MB），Linux 上 ru_maxrss 以 KB 為單位，macOS 上以字節為單位"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_config(name, data_dir, limit, profile, azure_record):
+    """在子進程中測試一個配置，返回結果字典"""
+    from whisper_selector import SpeechToTextSelector
+
+    mode, _, model = name.partition(":")
+    samples = load_dataset(data_dir, limit)
+    selector_config = {"stt_mode": mode, "decoding_profile": profile}
+    if model:
+        selector_config["local_whisper_model" if mode != "azure" else "azure_whisper_model"] = model
+    selector = SpeechToTextSelector(selector_config)
+    baseline_rss = peak_rss_mb()
+
+    recorder = None
+    start = time.perf_counter()
+    if mode == "azure":
+        recordings = {}
+        if os.path.exists(azure_record):
+            with open(azure_record, encoding="utf-8") as f:
+                recordings = json.load(f)
+        if os.getenv("AZURE_OPENAI_API_KEY") and os.getenv("AZURE_OPENAI_ENDPOINT"):
+            selector.initialize()
+            recorder = RecordingAzureClient(recordings, live=selector.azure_client)
+        elif recordings:
+            recorder = RecordingAzureClient(recordings)
+        else:
+            raise RuntimeError(f"沒有 Azure 憑證，也找不到錄製文件 {azure_record}")
+        selector.azure_client = recorder
+    else:
+        selector.initialize()
+    load_seconds = time.perf_counter() - start
+
+    # 預熱一次，避免首次調用的初始化開銷計入結果；回放模式下第一段的錄製就是預熱響應
+    if recorder is not None:
+        recorder.sample_name = samples[0].name
+    selector.transcribe(samples[0].audio)
+
+    latencies, hypotheses = [], []
+    for sample in samples:
+        if recorder is not None:
+            recorder.sample_name = sample.name
+        start = time.perf_counter()
+        hypotheses.append(selector.transcribe(sample.audio))
+        latencies.append(time.perf_counter() - start)
+
+    if recorder is not None and recorder.live is not None:
+        os.makedirs(os.path.dirname(azure_record) or ".", exist_ok=True)
+        with open(azure_record, "w", encoding="utf-8") as f:
+            json.dump(recorder.recordings, f, ensure_ascii=False, indent=2)
+
+    total_audio = sum(sample.duration for sample in samples)
+    return {
+        "config": name,
+        "samples": len(samples),
+        "audio_seconds": round(total_audio, 2),
+        "cer": round(character_error_rate([sample.reference for sample in samples], hypotheses), 4),
+        "rtf": round(sum(latencies) / total_audio, 3),
+        "p50_seconds": round(percentile(latencies, 0.5), 3),
+        "p95_seconds": round(percentile(latencies, 0.95), 3),
+        "load_seconds": round(load_seconds, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "model_rss_mb": round(peak_rss_mb() - baseline_rss, 1),
+        "azure_replayed": recorder is not None and recorder.live is None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="STT 後端基準測試（CER、RTF、延遲、內存、加載時間）")
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS, help="要測試的 <模式>:<模型> 配置")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="WAV + TXT 測試集目錄")
+    parser.add_argument("--limit", type=int, help="只使用前 N 段音頻")
+    parser.add_argument("--profile", default="auto", help="解碼配置 (auto / command / dictation)")
+    parser.add_argument("--azure-record", default=DEFAULT_AZURE_RECORD, help="Azure 響應錄製文件")
+    parser.add_argument("--json", help="把結果寫入 JSON 文件")
+    args = parser.parse_args()
+
+    # 提前檢查測試集，避免每個子進程分別報錯
+    samples = load_dataset(args.data, args.limit)
+    print(f"測試集: {len(samples)} 段, 共 {sum(sample.duration for sample in samples):.1f} 秒, "
+          f"解碼配置: {args.profile}")
+    print(f"{'配置':<24}{'CER':>8}{'RTF':>8}{'p50(秒)':>10}{'p95(秒)':>10}{'加載(秒)':>10}{'峰值RSS(MB)':>13}")
+
+    results = []
+    for name in args.configs:
+        # 每個配置使用新的子進程，峰值 RSS 和模型緩存互不影響
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            try:
+                result = executor.submit(run_config, name, args.data, args.limit,
+                                         args.profile, args.azure_record).result()
+            except Exception as e:
+                print(f"{name:<24}失敗: {e}")
+                results.append({"config": name, "error": str(e)})
+                continue
+        label = name + (" (回放)" if result["azure_replayed"] else "")
+        print(f"{label:<24}{result['cer']:>8.1%}{result['rtf']:>8.2f}{result['p50_seconds']:>10.2f}"
+              f"{result['p95_seconds']:>10.2f}{result['load_seconds']:>10.1f}{result['peak_rss_mb']:>13.0f}")
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
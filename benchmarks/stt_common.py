@@ -0,0 +1,87 @@
+"""STT 基準測試共用的工具：測試集加載、字錯誤率和延遲統計
+
+測試集目錄中每段音頻為一對文件：<名稱>.wav 和同名的 <名稱>.txt（參考轉錄文本，UTF-8）。
+"""
+import os
+import sys
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from whisper_selector import load_pcm, STT_SAMPLE_RATE
+
+# 默認的粵語測試集目錄（不隨代碼提供，需自行放入錄音和參考文本）
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cantonese")
+
+
+class Sample:
+    """一段測試音頻（16kHz 單聲道 float32）及其參考文本"""
+
+    def __init__(self, name, audio, reference):
+        self.name = name
+        self.audio = audio
+        self.reference = reference
+
+    @property
+    def duration(self):
+        return len(self.audio) / STT_SAMPLE_RATE
+
+
+def load_dataset(data_dir=DEFAULT_DATA_DIR, limit=None):
+    """加載目錄中的 WAV + 參考文本對，按文件名排序保證每次順序一致"""
+    if not os.path.isdir(data_dir):
+        raise SystemExit(f"找不到測試集目錄: {data_dir}（每段音頻需要 <名稱>.wav 和 <名稱>.txt）")
+
+    samples = []
+    for filename in sorted(os.listdir(data_dir)):
+        name, ext = os.path.splitext(filename)
+        transcript_path = os.path.join(data_dir, f"{name}.txt")
+        if ext.lower() != ".wav" or not os.path.exists(transcript_path):
+            continue
+        with open(os.path.join(data_dir, filename), "rb") as f:
+            audio = load_pcm(f.read())
+        with open(transcript_path, encoding="utf-8") as f:
+            reference = f.read().strip()
+        samples.append(Sample(name, audio, reference))
+        if limit and len(samples) >= limit:
+            break
+
+    if not samples:
+        raise SystemExit(f"測試集目錄中沒有 WAV + TXT 文件對: {data_dir}")
+    return samples
+
+
+def normalize_text(text):
+    """去掉空白、標點和符號並轉為小寫，只比較文字內容"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] not in "PZSC")
+
+
+def edit_distance(reference, hypothesis):
+    """字級編輯距離（替換、插入、刪除）"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(references, hypotheses):
+    """整個測試集的字錯誤率：總編輯距離 / 參考文本總字數"""
+    errors = chars = 0
+    for reference, hypothesis in zip(references, hypotheses):
+        reference, hypothesis = normalize_text(reference), normalize_text(hypothesis)
+        errors += edit_distance(reference, hypothesis)
+        chars += len(reference)
+    return errors / max(chars, 1)
+
+
+def percentile(values, fraction):
+    """最近秩百分位數，values 為空時返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
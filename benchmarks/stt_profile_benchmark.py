@@ -0,0 +1,66 @@
+"""比較各 STT 解碼配置（command / dictation）的延遲和字錯誤率
+
+對測試集中每段音頻分別用各解碼配置轉錄，並按時長分組（短於 STT_COMMAND_MAX_SECONDS 的為短句），
+用於確定 auto 配置的時長閾值是否合適。
+
+用法: python benchmarks/stt_profile_benchmark.py --mode local --model small [--data benchmarks/data/cantonese]
+      （azure 模式需要設置 AZURE_OPENAI_API_KEY 和 AZURE_OPENAI_ENDPOINT 環境變量）
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stt_common import DEFAULT_DATA_DIR, load_dataset, character_error_rate, percentile
+from whisper_selector import SpeechToTextSelector, DECODING_PROFILES, STT_COMMAND_MAX_SECONDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="STT 解碼配置延遲與準確度基準測試")
+    parser.add_argument("--mode", default="local", choices=("local", "local_quantized", "azure"))
+    parser.add_argument("--model", default="small", help="本地 Whisper 模型大小")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="WAV + TXT 測試集目錄")
+    parser.add_argument("--limit", type=int, help="只使用前 N 段音頻")
+    parser.add_argument("--vocabulary", action="store_true", help="以知識庫動作詞彙作 command 配置的提示")
+    args = parser.parse_args()
+
+    samples = load_dataset(args.data, args.limit)
+    selector = SpeechToTextSelector({"stt_mode": args.mode, "local_whisper_model": args.model})
+    selector.initialize()
+    if args.vocabulary:
+        import json
+        with open("knowledge_base.json", encoding="utf-8") as f:
+            actions = json.load(f)["actions"]
+        selector.set_command_vocabulary([word for mapping in actions.values() for word in mapping])
+
+    # 預熱一次，避免首次調用的初始化開銷計入結果
+    selector.transcribe(samples[0].audio)
+
+    groups = (("短句", lambda s: s.duration <= STT_COMMAND_MAX_SECONDS),
+              ("長句", lambda s: s.duration > STT_COMMAND_MAX_SECONDS),
+              ("全部", lambda s: True))
+    print(f"模式: {args.mode}, 模型: {args.model}, 短句閾值: {STT_COMMAND_MAX_SECONDS} 秒")
+    print(f"{'配置':<10}{'分組':<6}{'段數':>6}{'p50(秒)':>10}{'p95(秒)':>10}{'RTF':>8}{'CER':>8}")
+    for profile in DECODING_PROFILES:
+        results = []
+        for sample in samples:
+            start = time.perf_counter()
+            text = selector.transcribe(sample.audio, profile=profile)
+            results.append((sample, time.perf_counter() - start, text))
+
+        for label, belongs in groups:
+            group = [result for result in results if belongs(result[0])]
+            if not group:
+                continue
+            latencies = [elapsed for _, elapsed, _ in group]
+            rtf = sum(latencies) / sum(sample.duration for sample, _, _ in group)
+            cer = character_error_rate([sample.reference for sample, _, _ in group],
+                                       [text for _, _, text in group])
+            print(f"{profile:<10}{label:<6}{len(group):>6}{percentile(latencies, 0.5):>10.2f}"
+                  f"{percentile(latencies, 0.95):>10.2f}{rtf:>8.2f}{cer:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""比較本地 Whisper fp32 與動態 int8 量化模型在 CPU 上的實時率和字錯誤率
+
+兩種模型都從共享模型註冊表加載（量化模型首次運行時量化並緩存到 WHISPER_QUANTIZED_CACHE_DIR），
+使用相同的確定性解碼參數（粵語/中文、溫度 0）轉錄同一測試集。
+
+實時率 (RTF) = 轉錄耗時 / 音頻時長，小於 1 表示快於實時。
+
+用法: python benchmarks/stt_quantization_benchmark.py --model medium [--data benchmarks/data/cantonese]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stt_common import DEFAULT_DATA_DIR, load_dataset, character_error_rate
+from model_registry import WhisperModelRegistry
+
+DECODE_OPTIONS = {"language": "zh", "temperature": 0.0, "fp16": False}
+
+
+def run_variant(registry, model_size, quantized, samples):
+    """返回 (加載秒數, [(轉錄秒數, 音頻秒數)], [識別文本])"""
+    start = time.perf_counter()
+    registry.load(model_size, device="cpu", quantized=quantized)
+    load_seconds = time.perf_counter() - start
+
+    timings, hypotheses = [], []
+    with registry.use(model_size, device="cpu", quantized=quantized) as model:
+        # 預熱一次，避免首次調用的初始化開銷計入結果
+        model.transcribe(samples[0].audio[:16000], **DECODE_OPTIONS)
+        for sample in samples:
+            start = time.perf_counter()
+            result = model.transcribe(sample.audio, **DECODE_OPTIONS)
+            timings.append((time.perf_counter() - start, sample.duration))
+            hypotheses.append(result.get("text", ""))
+
+    registry.unload(model_size, device="cpu", quantized=quantized)
+    return load_seconds, timings, hypotheses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Whisper fp32 與 int8 量化基準測試")
+    parser.add_argument("--model", default="medium", help="Whisper 模型大小")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="WAV + TXT 測試集目錄")
+    parser.add_argument("--limit", type=int, help="只使用前 N 段音頻")
+    parser.add_argument("--threads", type=int, help="torch 使用的 CPU 線程數")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    samples = load_dataset(args.data, args.limit)
+    references = [sample.reference for sample in samples]
+    total_audio = sum(sample.duration for sample in samples)
+    print(f"測試集: {len(samples)} 段, 共 {total_audio:.1f} 秒, 模型: {args.model}")
+
+    # 每次只保留一個模型，避免兩個模型同時佔用內存影響計時
+    registry = WhisperModelRegistry(idle_seconds=0)
+    print(f"{'模型':<8}{'加載(秒)':>10}{'RTF':>8}{'單段 p50(秒)':>14}{'CER':>8}")
+    for label, quantized in (("fp32", False), ("int8", True)):
+        load_seconds, timings, hypotheses = run_variant(registry, args.model, quantized, samples)
+        rtf = sum(elapsed for elapsed, _ in timings) / total_audio
+        median = statistics.median(elapsed for elapsed, _ in timings)
+        cer = character_error_rate(references, hypotheses)
+        print(f"{label:<8}{load_seconds:>10.1f}{rtf:>8.2f}{median:>14.2f}{cer:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""比較上傳 Azure Whisper 時 WAV、FLAC 和 Opus (OGG) 的字節數、編碼耗時和往返時間
+
+默認離線運行: 只在內存中編碼測試集，按 --bandwidth-kbps 和 --rtt-ms 估算上傳耗時。
+加上 --live 時把每段音頻分別以三種格式發送到 Azure，測量實際往返時間和字錯誤率
+（需要設置 AZURE_OPENAI_API_KEY 和 AZURE_OPENAI_ENDPOINT）。
+
+用法: python benchmarks/stt_upload_benchmark.py [--data benchmarks/data/cantonese] [--bandwidth-kbps 2000] [--live]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stt_common import DEFAULT_DATA_DIR, load_dataset, character_error_rate, percentile
+from whisper_selector import SpeechToTextSelector, encode_upload_audio, UPLOAD_MIMETYPES
+
+FORMATS = ("wav", "flac", "ogg")
+
+
+def encode_all(samples, audio_format):
+    """返回 ([編碼後字節], [編碼秒數])"""
+    payloads, timings = [], []
+    for sample in samples:
+        start = time.perf_counter()
+        payloads.append(encode_upload_audio(sample.audio, audio_format))
+        timings.append(time.perf_counter() - start)
+    return payloads, timings
+
+
+def send_all(selector, audio_format, payloads):
+    """逐段上傳到 Azure，返回 ([往返秒數], [識別文本])"""
+    timings, hypotheses = [], []
+    for data in payloads:
+        start = time.perf_counter()
+        result = selector.azure_client.audio.transcriptions.create(
+            file=(f"audio.{audio_format}", data, UPLOAD_MIMETYPES[audio_format]),
+            model=selector.azure_model,
+            language="zh",
+            temperature=0.0
+        )
+        timings.append(time.perf_counter() - start)
+        hypotheses.append(result.text)
+    return timings, hypotheses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Azure Whisper 上傳格式基準測試")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="WAV + TXT 測試集目錄")
+    parser.add_argument("--limit", type=int, help="只使用前 N 段音頻")
+    parser.add_argument("--bandwidth-kbps", type=float, default=2000, help="估算用的上行帶寬 (kbit/s)")
+    parser.add_argument("--rtt-ms", type=float, default=80, help="估算用的網絡往返延遲（毫秒）")
+    parser.add_argument("--live", action="store_true", help="實際發送到 Azure 並測量往返時間")
+    parser.add_argument("--model", default="whisper", help="Azure Whisper 部署名稱")
+    args = parser.parse_args()
+
+    samples = load_dataset(args.data, args.limit)
+    references = [sample.reference for sample in samples]
+    total_audio = sum(sample.duration for sample in samples)
+    print(f"測試集: {len(samples)} 段, 共 {total_audio:.1f} 秒, "
+          f"估算條件: {args.bandwidth_kbps:.0f} kbit/s, RTT {args.rtt_ms:.0f} 毫秒")
+
+    selector = None
+    if args.live:
+        selector = SpeechToTextSelector({"stt_mode": "azure", "azure_whisper_model": args.model})
+        selector._initialize_azure_client()
+
+    header = f"{'格式':<6}{'平均字節':>12}{'壓縮比':>8}{'編碼(毫秒)':>12}{'估算上傳(毫秒)':>16}"
+    if args.live:
+        header += f"{'往返 p50(秒)':>14}{'往返 p95(秒)':>14}{'CER':>8}"
+    print(header)
+
+    wav_bytes = None
+    for audio_format in FORMATS:
+        try:
+            payloads, encode_timings = encode_all(samples, audio_format)
+        except Exception as e:
+            print(f"{audio_format:<6}無法編碼: {e}")
+            continue
+
+        sizes = [len(data) for data in payloads]
+        average_bytes = statistics.mean(sizes)
+        if wav_bytes is None:
+            wav_bytes = average_bytes
+        upload_ms = statistics.mean(args.rtt_ms + size * 8 / args.bandwidth_kbps for size in sizes)
+        line = (f"{audio_format:<6}{average_bytes:>12.0f}{wav_bytes / average_bytes:>8.1f}"
+                f"{statistics.mean(encode_timings) * 1000:>12.1f}{upload_ms:>16.0f}")
+
+        if args.live:
+            timings, hypotheses = send_all(selector, audio_format, payloads)
+            cer = character_error_rate(references, hypotheses)
+            line += f"{percentile(timings, 0.5):>14.2f}{percentile(timings, 0.95):>14.2f}{cer:>8.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
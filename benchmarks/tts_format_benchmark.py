@@ -0,0 +1,107 @@
+"""比較 WAV、MP3 和 Ogg Opus 三種 TTS 格式的負載大小和開始播放時間
+
+開始播放時間 = 生成時間 + 在模擬網絡帶寬下傳輸整段音頻的時間 + 往返延遲。
+
+兩種模式：
+  --live       使用 config.py 中的 Azure Speech 憑證，按各格式實際合成示例語句
+  --wav FILE   離線模式，用 pydub (ffmpeg) 把一段 16kHz 單聲道 WAV 編碼為 MP3/Opus
+
+用法: python benchmarks/tts_format_benchmark.py --live [--bandwidth-kbps 1000]
+      python benchmarks/tts_format_benchmark.py --wav tts_cache/<key>.wav
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FORMATS = ("wav", "mp3", "ogg")
+
+SAMPLE_TEXTS = [
+    "你好啊！很高興見到你。",
+    "好的，我會向揮手，重複1次",
+    "今日天氣晴朗，氣溫大約二十五度，適合出外走走。記得帶定水同埋戴帽。",
+]
+
+
+def render_live(texts, repeats):
+    """使用 Azure 按各格式合成，返回 {格式: [(字節數, 生成秒數)]}"""
+    from tts_service import TTSService, TTSCache
+    import tempfile
+
+    # 使用臨時緩存目錄，保證每次都真正合成
+    service = TTSService(cache=TTSCache(tempfile.mkdtemp(prefix="tts_bench_")))
+    service.warm_up(FORMATS)
+
+    results = {audio_format: [] for audio_format in FORMATS}
+    for _ in range(repeats):
+        for text in texts:
+            for audio_format in FORMATS:
+                service.cache = TTSCache(tempfile.mkdtemp(prefix="tts_bench_"))
+                start = time.perf_counter()
+                data = service.synthesize(text, audio_format=audio_format)
+                elapsed = time.perf_counter() - start
+                if data:
+                    results[audio_format].append((len(data), elapsed))
+    return results
+
+
+def render_offline(wav_path):
+    """用 pydub 把 WAV 編碼為 MP3 (32kbps) 和 Ogg Opus，返回 {格式: [(字節數, 編碼秒數)]}"""
+    from pydub import AudioSegment
+
+    with open(wav_path, "rb") as f:
+        wav_data = f.read()
+    audio = AudioSegment.from_file(io.BytesIO(wav_data), format="wav")
+    audio = audio.set_frame_rate(16000).set_channels(1).set_sample_width(2)
+
+    results = {"wav": [(len(wav_data), 0.0)]}
+    for audio_format, export_args in (
+        ("mp3", {"format": "mp3", "bitrate": "32k"}),
+        ("ogg", {"format": "ogg", "codec": "libopus", "bitrate": "24k"}),
+    ):
+        start = time.perf_counter()
+        buffer = io.BytesIO()
+        audio.export(buffer, **export_args)
+        results[audio_format] = [(len(buffer.getvalue()), time.perf_counter() - start)]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS 音頻格式負載與開始播放時間基準測試")
+    parser.add_argument("--live", action="store_true", help="使用 Azure Speech 實際合成")
+    parser.add_argument("--wav", help="離線模式使用的 16kHz 單聲道 WAV 文件")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--bandwidth-kbps", type=float, default=1000, help="模擬的 Wi-Fi 可用帶寬")
+    parser.add_argument("--rtt-ms", type=float, default=40, help="模擬的網絡往返延遲")
+    args = parser.parse_args()
+
+    if args.live:
+        results = render_live(SAMPLE_TEXTS, args.repeats)
+    elif args.wav:
+        results = render_offline(args.wav)
+    else:
+        parser.error("請指定 --live 或 --wav FILE")
+
+    bytes_per_second = args.bandwidth_kbps * 1000 / 8
+    baseline = statistics.mean(size for size, _ in results["wav"])
+
+    print(f"帶寬 {args.bandwidth_kbps:.0f} kbps, RTT {args.rtt_ms:.0f} ms")
+    print(f"{'格式':<6}{'平均大小(KB)':>14}{'相對WAV':>10}{'生成(ms)':>12}{'開始播放(ms)':>14}")
+    for audio_format in FORMATS:
+        samples = results.get(audio_format)
+        if not samples:
+            print(f"{audio_format:<6}{'無數據':>14}")
+            continue
+        size = statistics.mean(s for s, _ in samples)
+        render = statistics.mean(t for _, t in samples)
+        time_to_play = render + size / bytes_per_second + args.rtt_ms / 1000
+        print(f"{audio_format:<6}{size / 1024:>14.1f}{size / baseline:>10.2f}"
+              f"{render * 1000:>12.1f}{time_to_play * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
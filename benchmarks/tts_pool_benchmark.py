@@ -0,0 +1,194 @@
+"""比較每次新建 SpeechSynthesizer 與連接池復用的 TTS 延遲
+
+默認使用本地的語音合成替身模擬 Azure 的連接建立和流式合成延遲，無需網絡；
+替身結果只反映 --connect-ms 等參數的設定，不能說明實際 Connection.open 節省的時間。
+加上 --live 時使用真實的 Azure SpeechSynthesizer（需要 config 中的 AZURE_SPEECH_API_KEY
+和 AZURE_SPEECH_REGION）：每次新建的 synthesizer 在首次合成時才建立連接，
+連接池中的 synthesizer 由 create_azure_synthesizer 創建並預先調用 Connection.open。
+
+用法: python benchmarks/tts_pool_benchmark.py [--requests 20] [--connect-ms 150]
+      python benchmarks/tts_pool_benchmark.py --live [--requests 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from azure.cognitiveservices.speech import ResultReason, SpeechConfig, SpeechSynthesizer
+from tts_service import SynthesizerPool, create_azure_synthesizer, DEFAULT_AUDIO_FORMAT
+
+SAMPLE_TEXTS = [
+    "你好啊！很高興見到你。",
+    "好的，我會向揮手，重複1次",
+    "好的，我開始跳舞了！💃🎵",
+    "今日天氣晴朗，氣溫大約二十五度，適合出外走走。",
+]
+
+
+class _Signal:
+    """模擬 Azure SDK 的 EventSignal"""
+
+    def __init__(self):
+        self._callbacks = []
+
+    def connect(self, callback):
+        self._callbacks.append(callback)
+
+    def disconnect_all(self):
+        self._callbacks = []
+
+    def fire(self, event):
+        for callback in self._callbacks:
+            callback(event)
+
+
+class _StandInResult:
+    def __init__(self, audio_data):
+        self.reason = ResultReason.SynthesizingAudioCompleted
+        self.audio_data = audio_data
+
+
+class _StandInFuture:
+    def __init__(self, func):
+        self._func = func
+
+    def get(self):
+        return self._func()
+
+
+class StandInSynthesizer:
+    """本地語音合成替身：首次使用時建立連接，然後按塊流式輸出音頻"""
+
+    def __init__(self, voice, connect_latency, first_chunk_latency, chunk_latency, chars_per_chunk=4):
+        self.voice = voice
+        self.connect_latency = connect_latency
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_latency = chunk_latency
+        self.chars_per_chunk = chars_per_chunk
+        self.connected = False
+        self.synthesizing = _Signal()
+
+    def open_connection(self):
+        time.sleep(self.connect_latency)
+        self.connected = True
+        return self
+
+    def stop_speaking_async(self):
+        pass
+
+    def speak_text_async(self, text):
+        return _StandInFuture(lambda: self._speak(text))
+
+    def _speak(self, text):
+        if not self.connected:
+            self.open_connection()
+        chunks = []
+        time.sleep(self.first_chunk_latency)
+        for i in range(0, len(text), self.chars_per_chunk):
+            chunk = b"\x00\x01" * 3200
+            chunks.append(chunk)
+            self.synthesizing.fire(chunk)
+            time.sleep(self.chunk_latency)
+        return _StandInResult(b"RIFF" + b"".join(chunks))
+
+
+def make_live_synthesizer(voice):
+    """與原實現相同的 Azure synthesizer：不預先建立連接"""
+    import config
+    speech_config = SpeechConfig(subscription=config.AZURE_SPEECH_API_KEY, region=config.AZURE_SPEECH_REGION)
+    speech_config.speech_synthesis_voice_name = voice
+    return SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+
+
+def _measure(synthesizer, text):
+    """返回 (首字節延遲, 總延遲)，從開始請求計時"""
+    start = time.perf_counter()
+    first_byte = []
+    synthesizer.synthesizing.disconnect_all()
+    synthesizer.synthesizing.connect(
+        lambda _: first_byte.append(time.perf_counter()) if not first_byte else None)
+    synthesizer.speak_text_async(text).get()
+    total = time.perf_counter() - start
+    return (first_byte[0] - start) if first_byte else total, total
+
+
+def run(requests, concurrency, make_synthesizer, make_pooled_synthesizer, pool_size):
+    texts = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(requests)]
+    per_call, pooled = [], []
+    lock = threading.Lock()
+
+    def per_call_worker(chunk):
+        for text in chunk:
+            # 與原實現相同：每次請求新建 synthesizer，連接在首次合成時建立
+            start = time.perf_counter()
+            synthesizer = make_synthesizer("zh-HK-WanLungNeural")
+            setup = time.perf_counter() - start
+            first, total = _measure(synthesizer, text)
+            with lock:
+                per_call.append((first + setup, total + setup))
+
+    pool = SynthesizerPool(pool_size, factory=make_pooled_synthesizer)
+    pool.warm_up("zh-HK-WanLungNeural", DEFAULT_AUDIO_FORMAT)
+
+    def pooled_worker(chunk):
+        for text in chunk:
+            start = time.perf_counter()
+            with pool.checkout("zh-HK-WanLungNeural", DEFAULT_AUDIO_FORMAT) as synthesizer:
+                wait = time.perf_counter() - start
+                first, total = _measure(synthesizer, text)
+            with lock:
+                pooled.append((first + wait, total + wait))
+
+    for worker, label in ((per_call_worker, "per-call"), (pooled_worker, "pooled")):
+        threads = [threading.Thread(target=worker, args=(texts[i::concurrency],))
+                   for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return per_call, pooled
+
+
+def _summary(samples):
+    firsts = sorted(s[0] * 1000 for s in samples)
+    totals = sorted(s[1] * 1000 for s in samples)
+    p95 = lambda values: values[min(len(values) - 1, int(len(values) * 0.95))]
+    return (statistics.median(firsts), p95(firsts), statistics.median(totals), p95(totals))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS 連接池延遲基準測試")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--connect-ms", type=float, default=150, help="模擬的連接建立延遲")
+    parser.add_argument("--first-chunk-ms", type=float, default=80, help="模擬的首塊音頻延遲")
+    parser.add_argument("--chunk-ms", type=float, default=20, help="模擬的後續每塊音頻延遲")
+    parser.add_argument("--live", action="store_true", help="使用真實的 Azure 語音合成")
+    args = parser.parse_args()
+
+    if args.live:
+        make_synthesizer = make_live_synthesizer
+        make_pooled_synthesizer = create_azure_synthesizer
+    else:
+        make_synthesizer = lambda voice: StandInSynthesizer(
+            voice, args.connect_ms / 1000, args.first_chunk_ms / 1000, args.chunk_ms / 1000)
+        make_pooled_synthesizer = lambda voice, audio_format: make_synthesizer(voice).open_connection()
+
+    per_call, pooled = run(args.requests, args.concurrency, make_synthesizer,
+                           make_pooled_synthesizer, args.pool_size)
+
+    print(f"後端: {'Azure' if args.live else '本地替身'}")
+
+    print(f"{'模式':<10}{'首字節 p50':>12}{'首字節 p95':>12}{'總時長 p50':>12}{'總時長 p95':>12}  (毫秒)")
+    for label, samples in (("per-call", per_call), ("pooled", pooled)):
+        print(f"{label:<10}" + "".join(f"{value:>12.1f}" for value in _summary(samples)))
+
+
+if __name__ == "__main__":
+    main()
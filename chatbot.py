@@ -5,15 +5,14 @@ from langchain_openai import AzureChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.memory import ConversationBufferWindowMemory
 from langchain.chains import ConversationChain
-from langchain.schema import BaseMessage
+from langchain.schema import BaseMessage, SystemMessage, HumanMessage
 from langchain.chains import LLMChain
-from azure.cognitiveservices.speech import SpeechConfig, SpeechSynthesizer, AudioConfig, ResultReason
 from datetime import datetime
 from queue import Queue, Empty
 from threading import Thread
 from time import sleep
 from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_fixed
-from tenacity import wait_exponential
+from tenacity import wait_exponential, Retrying, stop_before_delay, retry_if_not_exception_type
 import config
 import json
 import re
@@ -22,6 +21,9 @@ import traceback
 import time
 from custom_actions import CustomActions
 from google_search import GoogleSearch
+from app_utils import TTLCache
+from tts_service import get_tts_service
+from turn_context import TurnDeadlineExceeded, TurnCancelled, TURN_TIMEOUT_REPLY, run_with_deadline, wait_future
 import threading
 
 class ChatBot:
@@ -36,6 +38,16 @@ class ChatBot:
             "double": 4.0   # 雙位數動作等待時間
         }
 
+        # GPT 調用策略：重試只在本輪時間預算內進行，並限制最小請求間隔
+        self.llm_max_attempts = getattr(config, "LLM_MAX_ATTEMPTS", 2)
+        self.llm_request_timeout = getattr(config, "LLM_REQUEST_TIMEOUT", 15)
+        self.gpt_min_interval = getattr(config, "GPT_MIN_REQUEST_INTERVAL", 1.0)
+        self._gpt_lock = threading.Lock()
+        self._last_gpt_request = 0.0
+
+        # 可選的結構化輸出模式：一次 GPT 調用同時返回回應文字和機器人動作
+        self.action_tools_enabled = getattr(config, "LLM_ACTION_TOOLS_ENABLED", False)
+
         # 初始化工具類
         self.custom_actions = CustomActions()
         self.google_search = GoogleSearch()
@@ -59,7 +71,10 @@ class ChatBot:
                 if action is None:
                     continue
                     
-                action_type, action_id, repeat_count = action
+                action_type, action_id, repeat_count, turn = action
+                if turn is not None and turn.cancelled:
+                    print(f"⏭ 跳過已取消對話輪次的動作 {action_id}")
+                    continue
                 try:
                     # 根據動作類型選擇不同的發送方式
                     if action_type == "single":
@@ -172,8 +187,8 @@ class ChatBot:
                 azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
                 api_key=config.AZURE_OPENAI_API_KEY,
                 api_version=config.AZURE_OPENAI_API_VERSION,
-                request_timeout=15,  # 增加超時時間
-                max_retries=3        # 減少重試次數
+                request_timeout=self.llm_request_timeout,
+                max_retries=0        # 重試由 _call_llm 按本輪時間預算控制
             )
             # 縮短記憶長度以減少 token 使用
             self.memory = ConversationBufferWindowMemory(
@@ -204,24 +219,192 @@ class ChatBot:
                 verbose=False
             )
 
+            # 搜索摘要專用的輕量鏈：較小的 max_tokens，且不寫入對話記憶
+            self.summary_llm = AzureChatOpenAI(
+                azure_deployment=config.AZURE_OPENAI_DEPLOYMENT_NAME,
+                model_name="gpt-4",
+                temperature=0.3,
+                max_tokens=200,
+                azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
+                api_key=config.AZURE_OPENAI_API_KEY,
+                api_version=config.AZURE_OPENAI_API_VERSION,
+                request_timeout=self.llm_request_timeout,
+                max_retries=0
+            )
+
+            self.summary_prompt = PromptTemplate(
+                input_variables=["results", "current_date"],
+                template="""
+                你是 Raspberry，請使用繁體中文、廣東話回應。今天是 {current_date}。
+                基於以下搜索結果：
+                {results}
+
+                請用3-4個簡短的句子總結主要信息。注意保持友善的語氣，並確保信息準確完整。
+                不要提及信息來源或網站。
+                回應："""
+            )
+
+            self.summary_chain = LLMChain(
+                llm=self.summary_llm,
+                prompt=self.summary_prompt,
+                verbose=False
+            )
+
+            # 場景描述專用的輕量鏈：不經過意圖路由，也不寫入對話記憶
+            self.vision_llm = AzureChatOpenAI(
+                azure_deployment=config.AZURE_OPENAI_DEPLOYMENT_NAME,
+                model_name="gpt-4",
+                temperature=0.5,
+                max_tokens=120,
+                azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
+                api_key=config.AZURE_OPENAI_API_KEY,
+                api_version=config.AZURE_OPENAI_API_VERSION,
+                request_timeout=10,
+                max_retries=0
+            )
+
+            self.vision_prompt = PromptTemplate(
+                input_variables=["caption", "objects", "tags"],
+                template="""你是 Raspberry。用一至兩句自然、活潑的廣東話描述以下畫面，必須以「我見到」開頭。
+                場景：{caption}
+                物件：{objects}
+                特徵：{tags}
+                回應："""
+            )
+
+            self.vision_chain = LLMChain(
+                llm=self.vision_llm,
+                prompt=self.vision_prompt,
+                verbose=False
+            )
+
+            # 綁定動作目錄的結構化輸出 LLM，強制調用 respond 工具
+            if self.action_tools_enabled:
+                self.action_llm = self.llm.bind_tools(
+                    [self._build_action_tool()],
+                    tool_choice="respond"
+                )
+
+            # 以 (查詢, 日期) 為鍵緩存最終摘要
+            self.search_summary_cache = TTLCache(
+                ttl_seconds=getattr(config, "SEARCH_CACHE_TTL", 600),
+                max_entries=getattr(config, "SEARCH_CACHE_MAX_ENTRIES", 128)
+            )
+
         except Exception as e:
             print(f"LLM 設置失敗：{e}")
 
-    @retry(
-        stop=stop_after_attempt(2),  # 最多重試 2 次
-        wait=wait_exponential(multiplier=1, min=5, max=10),  # 最多等 10 秒
-        retry=retry_if_exception_type(Exception)
-    )
-    def ask_gpt_direct(self, user_input):
+    def _wait_for_gpt_slot(self, turn=None):
+        """限制 GPT 請求的最小間隔，等待時間不會超過本輪剩餘預算"""
+        with self._gpt_lock:
+            wait = self._last_gpt_request + self.gpt_min_interval - time.monotonic()
+            if wait > 0:
+                if turn is not None and wait >= turn.remaining():
+                    raise TurnDeadlineExceeded("等待 GPT 請求間隔時超出時間預算")
+                time.sleep(wait)
+            self._last_gpt_request = time.monotonic()
+
+    def _call_llm(self, func, turn=None, **kwargs):
+        """調用 LLM，只在本輪時間預算仍有剩餘時重試"""
+        stop = stop_after_attempt(self.llm_max_attempts)
+        if turn is not None:
+            stop = stop | stop_before_delay(turn.remaining())
+
+        for attempt in Retrying(
+            stop=stop,
+            wait=wait_exponential(multiplier=1, min=1, max=3),
+            retry=retry_if_not_exception_type(TurnDeadlineExceeded),
+            reraise=True
+        ):
+            with attempt:
+                return run_with_deadline(func, turn, cap=self.llm_request_timeout, **kwargs)
+
+    def ask_gpt_direct(self, user_input, turn=None):
         """直接使用 GPT 回應用戶問題"""
         try:
-            # **避免過多請求，每次請求間隔 10 秒**
-            time.sleep(10)  # <-- 讓每個 GPT 請求之間間隔至少 10 秒
-            response = self.conversation.predict(input=user_input)
+            self._wait_for_gpt_slot(turn)
+            response = self._call_llm(self.conversation.predict, turn, input=user_input)
             return response
         except Exception as e:
             print(f"GPT 調用失敗：{e}")
-            raise  # 讓 retry 裝飾器捕獲異常並重試
+            raise
+
+    def _get_action_catalogue(self):
+        """從知識庫生成動作目錄 {動作名稱: (動作類型, 動作ID)}，每個動作ID只保留一個名稱"""
+        catalogue = {}
+        for action_type, actions in (("single", self.single_digit_actions),
+                                     ("double", self.double_digit_actions)):
+            for action_id in dict.fromkeys(actions.values()):
+                catalogue[self.get_action_name(action_id)] = (action_type, action_id)
+        return catalogue
+
+    def _build_action_tool(self):
+        """生成提供給 GPT 的 respond 工具定義"""
+        action_names = list(self._get_action_catalogue().keys())
+        return {
+            "type": "function",
+            "function": {
+                "name": "respond",
+                "description": "回應用戶，並列出機器人需要按順序執行的動作（不需要動作時為空列表）。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "reply": {
+                            "type": "string",
+                            "description": "以繁體中文、廣東話講出的回應"
+                        },
+                        "actions": {
+                            "type": "array",
+                            "description": "用戶要求機器人做的動作，按執行順序排列",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "name": {"type": "string", "enum": action_names},
+                                    "repeat": {"type": "integer", "minimum": 1, "maximum": 10}
+                                },
+                                "required": ["name"]
+                            }
+                        }
+                    },
+                    "required": ["reply", "actions"]
+                }
+            }
+        }
+
+    def ask_gpt_with_actions(self, user_input, turn=None):
+        """以結構化輸出模式調用 GPT，一次返回回應文字和動作列表
+
+        Returns:
+            (回應文字, [(動作類型, 動作ID, 重複次數), ...])
+        """
+        messages = [
+            SystemMessage(content="你是 Raspberry，VTC 學生開發的機器人助手。請使用繁體中文、廣東話回應。"
+                                  "不要說自己是虛擬助手或無法執行動作；用戶要求做動作時，把動作放入 actions。"),
+            *self.get_memory_content(),
+            HumanMessage(content=user_input)
+        ]
+
+        self._wait_for_gpt_slot(turn)
+        ai_message = self._call_llm(self.action_llm.invoke, turn, input=messages)
+
+        reply = ai_message.content or ""
+        actions = []
+        catalogue = self._get_action_catalogue()
+        for tool_call in ai_message.tool_calls:
+            if tool_call.get("name") != "respond":
+                continue
+            args = tool_call.get("args", {})
+            reply = args.get("reply") or reply
+            for action in args.get("actions", [])[:5]:
+                if action.get("name") not in catalogue:
+                    print(f"[WARNING] GPT 返回未知動作: {action.get('name')}")
+                    continue
+                action_type, action_id = catalogue[action["name"]]
+                actions.append((action_type, action_id, action.get("repeat", 1)))
+
+        # 手動寫入對話記憶，保持與 ConversationChain 相同的上下文
+        self.memory.save_context({"input": user_input}, {"output": reply})
+        return reply, actions
 
     def _predict_with_retry(self, user_input):
         return self.conversation.predict(input=user_input)
@@ -255,8 +438,11 @@ class ChatBot:
                 
         return 1  # 預設為 1
 
-    def execute_single_digit_action(self, action_id, repeat_count):
-        """執行單位數動作"""
+    def execute_single_digit_action(self, action_id, repeat_count, turn=None):
+        """執行單位數動作
+
+        turn 不為 None 時表示裝飾動作，所屬對話輪次被取消後不再執行。
+        """
         try:
             print("[机器人动作触发]")
             print(f"➡️ 动作: {action_id}")
@@ -266,19 +452,22 @@ class ChatBot:
             repeat_count = int(repeat_count) if isinstance(repeat_count, str) else repeat_count
             
             # 加入隊列
-            self.action_queue.put(("single", action_id, min(repeat_count, 10)))
+            self.action_queue.put(("single", action_id, min(repeat_count, 10), turn))
             
             # 顯示 curl 指令
             print(f"🖨 已將動作加入隊列")
             
-            return f"好的，我會向{self.get_action_name(action_id)}，重複{min(repeat_count, 10)}次"
+            return self.get_action_confirmation(action_id, repeat_count)
             
         except Exception as e:
             print(f"❌ 發送指令失敗: {str(e)}")
             return "抱歉，執行動作時出現問題。"
 
-    def execute_double_digit_action(self, action_id, repeat_count):
-        """執行單位數動作"""
+    def execute_double_digit_action(self, action_id, repeat_count, turn=None):
+        """執行雙位數動作
+
+        turn 不為 None 時表示裝飾動作，所屬對話輪次被取消後不再執行。
+        """
         try:
             print("[机器人动作触发]")
             print(f"➡️ 动作: {action_id}")
@@ -288,17 +477,56 @@ class ChatBot:
             repeat_count = int(repeat_count) if isinstance(repeat_count, str) else repeat_count
             
             # 加入隊列
-            self.action_queue.put(("double", action_id, min(repeat_count, 10)))
+            self.action_queue.put(("double", action_id, min(repeat_count, 10), turn))
             
             # 顯示 curl 指令
             print(f"🖨 已將動作加入隊列")
             
-            return f"好的，我會向{self.get_action_name(action_id)}，重複{min(repeat_count, 10)}次"
+            return self.get_action_confirmation(action_id, repeat_count)
             
         except Exception as e:
             print(f"❌ 發送指令失敗: {str(e)}")
             return "抱歉，執行動作時出現問題。"
             
+    def get_action_confirmation(self, action_id, repeat_count):
+        """生成動作確認回應"""
+        return f"好的，我會向{self.get_action_name(action_id)}，重複{min(repeat_count, 10)}次"
+
+    def get_predictable_phrases(self, repeat_counts=None):
+        """收集可預先合成語音的固定回應：知識庫問答、動作回應、動作確認和備用回應"""
+        if repeat_counts is None:
+            repeat_counts = getattr(config, "TTS_PRERENDER_REPEAT_COUNTS", (1, 2, 3))
+        phrases = list(self.knowledge_base["general_qa"].values())
+
+        for category, mappings in self.knowledge_base.get("actions", {}).items():
+            for details in mappings.values():
+                if isinstance(details, dict):
+                    phrases.extend(details.get("text_responses", []))
+
+        for actions in (self.single_digit_actions, self.double_digit_actions):
+            for action_id in dict.fromkeys(actions.values()):
+                for repeat_count in repeat_counts:
+                    phrases.append(self.get_action_confirmation(action_id, repeat_count))
+
+        phrases.extend([
+            "好的，我開始跳舞了！💃🎵",
+            "抱歉，我無法處理您的請求。",
+            "抱歉，我未能找到相關資訊。",
+            "抱歉，執行動作時出現問題。",
+            "已停止所有動作",
+            "已清除對話記憶",
+            TURN_TIMEOUT_REPLY,
+        ])
+        # 去重並保持順序
+        return list(dict.fromkeys(phrases))
+
+    def get_command_vocabulary(self):
+        """返回用戶可能說出的指令詞彙（動作名稱和知識庫關鍵詞），作為語音識別的提示"""
+        words = []
+        for mappings in self.knowledge_base.get("actions", {}).values():
+            words.extend(mappings.keys())
+        return list(dict.fromkeys(words))
+
     def get_action_name(self, action_id):
         """根據動作 ID 獲取動作名稱"""
         # 反向查找動作名稱
@@ -309,24 +537,69 @@ class ChatBot:
         return f"動作{action_id}"
             
 
-    def handle_google_search(self, user_input):
-        """處理 Google 搜索"""
-        search_results = self.google_search.search(user_input)
-        if not search_results or search_results[0].startswith("查詢失敗"):
-            return "抱歉，我未能找到相關資訊。"
+    def is_search_query(self, user_input):
+        """檢查輸入是否需要 Google 搜索"""
+        return "天氣" in user_input or "新聞" in user_input
 
-        # 使用 LangChain 總結搜索結果
-        summary_prompt = f"""
-        基於以下搜索結果：
-        {search_results}
-        
-        請用3-4個簡短的句子總結主要信息。注意保持友善的語氣，並確保信息準確完整。
+    def _search_cache_key(self, user_input):
+        return (user_input.strip(), datetime.now().strftime("%Y-%m-%d"))
+
+    def handle_google_search(self, user_input, search_future=None, turn=None):
+        """處理 Google 搜索
+
+        Args:
+            user_input: 用戶輸入
+            search_future: 已提前發出的搜索請求 (Future)，為 None 時在此發出並等待
+            turn: 本輪對話的 TurnContext，用於限制等待時間
         """
-        
-        response = self.conversation.predict(
-            input=summary_prompt,
-            current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cache_key = self._search_cache_key(user_input)
+        cached = self.search_summary_cache.get(cache_key)
+        if cached:
+            print(f"[DEBUG] 命中搜索摘要緩存: {user_input}")
+            # 摘要命中時原始結果一般也在緩存中，未開始的請求直接取消
+            if search_future is not None:
+                search_future.cancel()
+            return cached
+
+        if search_future is None:
+            search_future = self.google_search.search_async(user_input)
+        search_results = wait_future(search_future, turn, cap=self.google_search.request_timeout + 1)
+        if self.google_search.is_failed_result(search_results):
+            return "抱歉，我未能找到相關資訊。"
+
+        # 使用獨立的摘要鏈總結搜索結果，不污染對話記憶
+        formatted_results = "\n".join(
+            f"{idx + 1}. {result}" for idx, result in enumerate(search_results[:3])
         )
+        response = self._call_llm(
+            self.summary_chain.predict,
+            turn,
+            results=formatted_results,
+            current_date=cache_key[1]
+        ).strip()
+
+        if response:
+            self.search_summary_cache.set(cache_key, response)
+        return response
+
+    def describe_scene(self, caption, objects=None, tags=None, turn=None):
+        """根據 Azure Vision 分析結果直接生成廣東話場景描述
+
+        不經過 get_response 的關鍵詞路由、隨機動作和對話記憶，
+        LLM 調用失敗時拋出異常，由調用方使用備用回應。
+        """
+        objects = objects or []
+        tags = tags or []
+        response = self._call_llm(
+            self.vision_chain.predict,
+            turn,
+            caption=caption or "無",
+            objects=", ".join(objects[:8]) if objects else "無",
+            tags=", ".join(tags[:8]) if tags else "無"
+        ).strip()
+
+        if response and not response.startswith("我見到"):
+            response = "我見到" + response
         return response
 
     def query_knowledge_base(self, query):
@@ -337,7 +610,7 @@ class ChatBot:
                 return answer
         return None
     
-    def _perform_random_small_action(self):
+    def _perform_random_small_action(self, turn=None):
         """在普通聊天时随机执行小动作"""
         # 控制随机动作触发概率 (60%)
         if random.random() < 0.6:
@@ -363,16 +636,23 @@ class ChatBot:
             
             # 执行选中的动作
             for action in selected_actions:
+                if turn is not None and turn.cancelled:
+                    return
                 action_id, repeat_count = action
                 if len(action_id) == 1:
-                    self.execute_single_digit_action(action_id, repeat_count)
+                    self.execute_single_digit_action(action_id, repeat_count, turn)
                 else:
-                    self.execute_double_digit_action(action_id, repeat_count)
+                    self.execute_double_digit_action(action_id, repeat_count, turn)
                 # 添加短暂延迟，避免动作之间冲突
                 time.sleep(1)
                 
-    def get_response(self, user_input):
-        """生成对话回应并控制机器人动作"""
+    def get_response(self, user_input, turn=None):
+        """生成对话回应并控制机器人动作
+
+        Args:
+            user_input: 用户输入
+            turn: 本轮对话的 TurnContext，超出时间预算时返回备用回应
+        """
         
         try:
             # 只保留最後一輪對話作為上下文
@@ -389,7 +669,7 @@ class ChatBot:
                 # 如果是问候语，在回应后执行挥手
                 if is_greeting:
                     print("[DEBUG] 检测到问候语，执行挥手动作")
-                    self.execute_single_digit_action('9', '1')
+                    self.execute_single_digit_action('9', '1', turn)
                 return response  # **直接返回知識庫內的回答**
                     
             # **2️⃣ 如果用戶說「跳舞」，執行 `random_dance()`**
@@ -430,8 +710,11 @@ class ChatBot:
                     return command_response
 
             # **5️⃣ 檢查 Google 搜索**
-            if "天氣" in user_input or "新聞" in user_input:
-                return self.handle_google_search(user_input)
+            # 只在知識庫、動作和命令都不匹配時才發出搜索請求，提前返回的輸入不會消耗 API 配額；
+            # 請求先在後台發出，與摘要緩存查詢和日期準備並行
+            if self.is_search_query(user_input):
+                search_future = self.google_search.search_async(user_input)
+                return self.handle_google_search(user_input, search_future, turn)
 
             # **6️⃣ 處理日期相關問題**
             if "日期" in user_input or "今天" in user_input:
@@ -439,18 +722,36 @@ class ChatBot:
                 return f"今天是 {current_date}。"
 
             # **7️⃣ 使用 GPT 回應**
-            response = self.ask_gpt_direct(user_input)
+            if self.action_tools_enabled:
+                response, actions = self.ask_gpt_with_actions(user_input, turn)
+                if actions:
+                    # GPT 已返回用戶要求的動作，立即加入隊列，不再執行隨機動作
+                    print(f"[DEBUG] GPT 返回動作: {actions}")
+                    for action_type, action_id, repeat_count in actions:
+                        if action_type == "single":
+                            self.execute_single_digit_action(action_id, repeat_count)
+                        else:
+                            self.execute_double_digit_action(action_id, repeat_count)
+                    return response
+            else:
+                response = self.ask_gpt_direct(user_input, turn)
             
             # 如果是问候语，执行挥手动作
             if is_greeting:
                 print("[DEBUG] 检测到问候语，执行挥手动作")
-                self.execute_single_digit_action('9', '1')
+                self.execute_single_digit_action('9', '1', turn)
             else:
                 # 随机执行小动作（非问候时）
-                self._perform_random_small_action()
+                self._perform_random_small_action(turn)
                 
             return response
 
+        except TurnCancelled:
+            print("本輪對話已被新的輸入取代，停止生成回應")
+            return None
+        except TurnDeadlineExceeded as e:
+            print(f"本輪對話超出時間預算：{e}")
+            return TURN_TIMEOUT_REPLY
         except Exception as e:
             print(f"錯誤處理用戶輸入時發生問題：{e}")
             return "抱歉，我無法處理您的請求。"
@@ -469,10 +770,8 @@ class ChatBot:
                         text_response = text_responses[0] if text_responses else "你好！"
                         print(f"[DEBUG] 選擇響應: {text_response}")
 
-                        # 優先生成 TTS
-                        tts_file = self.generate_tts(text_response)
-                        
-                        # 然後執行動作
+                        # 動作加入隊列後由工作線程執行，不等待 TTS；
+                        # 知識庫的回應已在啟動時按分句和客戶端格式預先合成，調用方生成 TTS 時直接命中緩存
                         for action in details.get('actions', []):
                             try:
                                 print(f"[DEBUG] 執行動作: {action}")
@@ -503,34 +802,18 @@ class ChatBot:
             return None
         
     def generate_tts(self, text):
-        """生成 TTS 音頻"""
-        output_file = "static/response.wav"
-        
-        # 如果存在舊的文件就刪除
-        if os.path.exists(output_file):
-            try:
-                os.remove(output_file)
-            except Exception as e:
-                print(f"[ERROR] 刪除舊 TTS 文件時出錯: {e}")
-
+        """生成 TTS 音頻，保存在內存音頻存儲中並返回音頻地址"""
         try:
-            speech_config = SpeechConfig(
-                subscription=config.AZURE_SPEECH_API_KEY, 
-                region=config.AZURE_SPEECH_REGION
-            )
-            speech_config.speech_synthesis_voice_name = "zh-HK-WanLungNeural"
-            audio_config = AudioConfig(filename=output_file)
-            synthesizer = SpeechSynthesizer(
-                speech_config=speech_config, audio_config=audio_config)
+            audio_data = get_tts_service().synthesize(text)
 
-            result = synthesizer.speak_text_async(text).get()
-
-            if result.reason == ResultReason.SynthesizingAudioCompleted:
-                print(f"[INFO] TTS 文件生成成功: {output_file}")
-                return f"/{output_file}"
+            if audio_data:
+                from audio_store import audio_store
+                clip = audio_store.put(audio_data)
+                print(f"[INFO] TTS 音頻生成成功: {clip.url}")
+                return clip.url
             else:
-                print(f"[ERROR] TTS 生成失敗: {result.reason}")
+                print("[ERROR] TTS 生成失敗")
                 return None
         except Exception as e:
             print(f"[ERROR] 生成 TTS 時出錯: {e}")
-            return None
\ No newline at end of file
+            return None
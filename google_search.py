@@ -1,9 +1,15 @@
 import requests
+import threading
 import config
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from langchain_openai import AzureChatOpenAI
 from langchain.schema import HumanMessage
 from azure.core.credentials import AzureKeyCredential
+from app_utils import TTLCache
+
+# 搜索失敗時返回結果的前綴
+SEARCH_FAILURE_PREFIXES = ("查询失败", "查詢失敗", "未知错误", "没有找到相关结果")
 
 class GoogleSearch:
     def __init__(self):
@@ -22,12 +28,44 @@ class GoogleSearch:
             model="gpt-4"  # 选择使用 GPT-4 模型
         )
 
+        # 每個線程復用自己的 HTTP 連接（requests.Session 不保證線程安全），
+        # 並以 (查詢, 日期) 為鍵緩存原始搜索結果
+        self._local = threading.local()
+        self.request_timeout = getattr(config, "SEARCH_REQUEST_TIMEOUT", 5)
+        self.results_cache = TTLCache(
+            ttl_seconds=getattr(config, "SEARCH_CACHE_TTL", 600),
+            max_entries=getattr(config, "SEARCH_CACHE_MAX_ENTRIES", 128)
+        )
+        # 用於與其他每輪工作並行執行搜索請求
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="google_search")
+
+    @property
+    def session(self):
+        """當前線程的 requests.Session，首次使用時創建"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
     def get_today_date(self):
         """获取当前日期，格式为 YYYY-MM-DD"""
         return datetime.now().strftime("%Y-%m-%d")
 
+    def is_failed_result(self, results):
+        """检查搜索结果是否为失败或空结果"""
+        return not results or results[0].startswith(SEARCH_FAILURE_PREFIXES)
+
+    def search_async(self, query):
+        """在后台线程中执行搜索，返回 Future"""
+        return self.executor.submit(self.search, query)
+
     def search(self, query):
         """使用 Google Custom Search API 进行搜索"""
+        cache_key = (query.strip(), self.get_today_date())
+        cached = self.results_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             # 自动附加日期（如果查询中包含“今日”或“今天”）
             if "今日" in query or "今天" in query:
@@ -42,7 +80,7 @@ class GoogleSearch:
                 "num": 3,  # 限制返回最多3个结果
                 "safe": "off",
             }
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=self.request_timeout)
             response.raise_for_status()
 
             data = response.json()
@@ -51,6 +89,7 @@ class GoogleSearch:
                     f"{item.get('title', '无标题')} - {item.get('snippet', '无描述')} ({item.get('link', '')})"
                     for item in data["items"]
                 ]
+                self.results_cache.set(cache_key, results)
                 return results
             else:
                 return ["没有找到相关结果。"]
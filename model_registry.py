@@ -0,0 +1,294 @@
+import gc
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import config
+
+# 模型閒置多久後卸載（秒），0 表示不自動卸載
+WHISPER_MODEL_IDLE_SECONDS = getattr(config, "WHISPER_MODEL_IDLE_SECONDS", 1800)
+# 所有已加載 Whisper 模型的內存預算（MB）
+WHISPER_MODEL_MEMORY_BUDGET_MB = getattr(config, "WHISPER_MODEL_MEMORY_BUDGET_MB", 4096)
+# 加載模型使用的設備，None 表示由 whisper 自動選擇（有 CUDA 時使用 GPU）
+WHISPER_DEVICE = getattr(config, "WHISPER_DEVICE", None)
+# 動態 int8 量化模型的磁盤緩存目錄，首次量化後保存，之後直接加載
+WHISPER_QUANTIZED_CACHE_DIR = getattr(config, "WHISPER_QUANTIZED_CACHE_DIR", "model_cache")
+
+# 各模型大小的參數量（百萬），加載前用於估算內存（fp32 每個參數 4 字節）
+WHISPER_MODEL_PARAMS_M = {
+    "tiny": 39, "base": 74, "small": 244, "medium": 769,
+    "large": 1550, "large-v1": 1550, "large-v2": 1550, "large-v3": 1550, "turbo": 809,
+}
+
+
+def estimate_model_bytes(model_size, quantized=False):
+    """加載前估算模型佔用的內存，未知大小按 medium 估算
+
+    量化模型的線性層權重為 int8，嵌入層和卷積層仍為 fp32，平均每個參數約 1.5 字節。
+    """
+    base_size = model_size.split(".")[0]
+    params = WHISPER_MODEL_PARAMS_M.get(base_size, WHISPER_MODEL_PARAMS_M["medium"]) * 1_000_000
+    return int(params * (1.5 if quantized else 4))
+
+
+def measure_model_bytes(model):
+    """按模型參數和緩衝區計算實際佔用的內存"""
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return None
+
+
+def quantize_whisper_model(model):
+    """對 Whisper 模型的線性層做動態 int8 量化（僅支持 CPU）"""
+    import torch
+    from whisper.model import Linear as WhisperLinear
+
+    # whisper 的 Linear 只在前向時把權重轉為輸入的 dtype，CPU fp32 下與 nn.Linear 等價；
+    # quantize_dynamic 按精確類型匹配，需先換回 nn.Linear 才會被量化
+    for module in model.modules():
+        if type(module) is WhisperLinear:
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_quantized_model(model_size):
+    """加載動態 int8 量化的 Whisper 模型，優先使用磁盤緩存，首次量化後寫入緩存"""
+    import torch
+    import whisper
+
+    torch_version = torch.__version__.split("+")[0]
+    cache_path = os.path.join(WHISPER_QUANTIZED_CACHE_DIR, f"whisper-{model_size}-int8-torch{torch_version}.pt")
+    if os.path.exists(cache_path):
+        try:
+            model = torch.load(cache_path, map_location="cpu", weights_only=False)
+            logging.info(f"已從緩存加載量化模型: {cache_path}")
+            return model
+        except Exception as e:
+            logging.warning(f"加載量化模型緩存失敗，重新量化: {e}")
+
+    model = quantize_whisper_model(whisper.load_model(model_size, device="cpu"))
+    try:
+        os.makedirs(WHISPER_QUANTIZED_CACHE_DIR, exist_ok=True)
+        temp_path = f"{cache_path}.tmp"
+        torch.save(model, temp_path)
+        os.replace(temp_path, cache_path)
+        logging.info(f"量化模型已緩存: {cache_path}")
+    except Exception as e:
+        logging.warning(f"保存量化模型緩存失敗: {e}")
+    return model
+
+
+class ModelEntry:
+    """一個已加載的模型及其使用情況"""
+
+    def __init__(self, key, model, size_bytes, load_seconds):
+        self.key = key
+        self.model = model
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.in_use = 0
+        self.last_used = time.time()
+
+
+class WhisperModelRegistry:
+    """進程內共享的 Whisper 模型註冊表
+
+    按 (模型大小, 設備, 是否量化) 提供共享實例，避免不同模塊各自加載同一模型；
+    閒置超過設定時間的模型會被後台線程卸載，加載新模型前按最久未使用的順序
+    卸載閒置模型，使總內存不超出預算。正在使用中的模型不會被卸載。
+    """
+
+    def __init__(self, idle_seconds=WHISPER_MODEL_IDLE_SECONDS,
+                 memory_budget_mb=WHISPER_MODEL_MEMORY_BUDGET_MB, device=WHISPER_DEVICE):
+        self.idle_seconds = idle_seconds
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self.device = device
+        self._entries = {}       # (model_size, device, quantized) -> ModelEntry
+        self._key_locks = {}     # 每個模型一把加載鎖，同一模型只加載一次
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.loads = 0
+        self.unloads = 0
+
+    def _key(self, model_size, device=None, quantized=False):
+        # 動態量化只支持 CPU
+        return (model_size, "cpu" if quantized else device or self.device, quantized)
+
+    def is_loaded(self, model_size, device=None, quantized=False):
+        """模型是否已加載"""
+        with self._lock:
+            return self._key(model_size, device, quantized) in self._entries
+
+    def load(self, model_size, device=None, quantized=False):
+        """確保模型已加載並返回模型實例，已加載時直接返回共享實例"""
+        key = self._key(model_size, device, quantized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.last_used = time.time()
+                return entry.model
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return entry.model
+
+            self._make_room(estimate_model_bytes(model_size, quantized))
+
+            logging.info(f"正在加載 Whisper 模型: {model_size}{' (int8)' if quantized else ''} "
+                         f"(設備: {key[1] or '自動'})")
+            start_time = time.perf_counter()
+            if quantized:
+                model = load_quantized_model(model_size)
+            else:
+                import whisper
+                model = whisper.load_model(model_size, device=key[1])
+            load_seconds = time.perf_counter() - start_time
+            # 量化線性層的權重不在 parameters() 中，按估算值計算
+            size_bytes = estimate_model_bytes(model_size, True) if quantized else (
+                measure_model_bytes(model) or estimate_model_bytes(model_size))
+
+            with self._lock:
+                self._entries[key] = ModelEntry(key, model, size_bytes, load_seconds)
+                self.loads += 1
+            logging.info(f"Whisper 模型 {model_size} 加載完成，耗時 {load_seconds:.1f} 秒，"
+                         f"約 {size_bytes / 1024 / 1024:.0f} MB")
+            self._start_sweeper()
+            return model
+
+    @contextmanager
+    def use(self, model_size, device=None, quantized=False):
+        """借用模型進行推理，借用期間模型不會被卸載
+
+        用法:
+            with model_registry.use("small") as model:
+                model.transcribe(...)
+        """
+        key = self._key(model_size, device, quantized)
+        while True:
+            model = self.load(model_size, device, quantized)
+            with self._lock:
+                entry = self._entries.get(key)
+                # 加載後到登記使用前被卸載時重新加載
+                if entry is not None and entry.model is model:
+                    entry.in_use += 1
+                    break
+        try:
+            yield model
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+
+    def unload(self, model_size, device=None, quantized=False):
+        """卸載指定模型，使用中的模型不卸載，返回是否已卸載"""
+        key = self._key(model_size, device, quantized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.in_use:
+                return False
+            del self._entries[key]
+            self.unloads += 1
+        self._release(entry, "手動卸載")
+        return True
+
+    def _release(self, entry, reason):
+        """釋放模型佔用的內存"""
+        model_size = entry.key[0]
+        entry.model = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+        logging.info(f"已卸載 Whisper 模型 {model_size} ({reason})，釋放約 {entry.size_bytes / 1024 / 1024:.0f} MB")
+
+    def _make_room(self, needed_bytes):
+        """按最久未使用的順序卸載閒置模型，直到新模型可放入內存預算"""
+        released = []
+        with self._lock:
+            used_bytes = sum(e.size_bytes for e in self._entries.values())
+            for entry in sorted(self._entries.values(), key=lambda e: e.last_used):
+                if used_bytes + needed_bytes <= self.memory_budget_bytes:
+                    break
+                if entry.in_use:
+                    continue
+                del self._entries[entry.key]
+                used_bytes -= entry.size_bytes
+                self.unloads += 1
+                released.append(entry)
+
+        for entry in released:
+            self._release(entry, "超出內存預算")
+        if used_bytes + needed_bytes > self.memory_budget_bytes:
+            logging.warning(f"Whisper 模型內存預計 {(used_bytes + needed_bytes) / 1024 / 1024:.0f} MB，"
+                            f"超出預算 {self.memory_budget_bytes / 1024 / 1024:.0f} MB，已無可卸載的閒置模型")
+
+    def sweep_idle(self):
+        """卸載閒置超過設定時間的模型，返回卸載數量"""
+        if not self.idle_seconds:
+            return 0
+        now = time.time()
+        released = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if not entry.in_use and now - entry.last_used > self.idle_seconds:
+                    del self._entries[key]
+                    self.unloads += 1
+                    released.append(entry)
+
+        for entry in released:
+            self._release(entry, f"閒置超過 {self.idle_seconds} 秒")
+        return len(released)
+
+    def _start_sweeper(self):
+        """首次加載模型時啟動後台閒置清理線程"""
+        if self._sweeper is not None or not self.idle_seconds:
+            return
+        interval = max(1, min(60, self.idle_seconds / 2))
+
+        def sweep_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep_idle()
+                except Exception as e:
+                    logging.error(f"清理閒置 Whisper 模型時出錯: {e}")
+
+        self._sweeper = threading.Thread(target=sweep_loop, daemon=True, name="whisper_model_sweeper")
+        self._sweeper.start()
+
+    def stats(self):
+        """返回已加載模型和內存使用統計"""
+        now = time.time()
+        with self._lock:
+            return {
+                "models": [
+                    {
+                        "model": entry.key[0],
+                        "device": entry.key[1] or "auto",
+                        "quantized": entry.key[2],
+                        "mb": round(entry.size_bytes / 1024 / 1024),
+                        "in_use": entry.in_use,
+                        "idle_seconds": round(now - entry.last_used),
+                        "load_seconds": round(entry.load_seconds, 2)
+                    }
+                    for entry in self._entries.values()
+                ],
+                "used_mb": round(sum(e.size_bytes for e in self._entries.values()) / 1024 / 1024),
+                "budget_mb": round(self.memory_budget_bytes / 1024 / 1024),
+                "idle_unload_seconds": self.idle_seconds,
+                "loads": self.loads,
+                "unloads": self.unloads
+            }
+
+
+# 全局模型註冊表
+model_registry = WhisperModelRegistry()
@@ -18,10 +18,15 @@ class PCRecorder:
         self.frames = []
         self.recording_thread = None
         self.vad = webrtcvad.Vad(3)  # 設置VAD敏感度為3（最高）
+        self.on_audio = None  # 每錄到一幀保留的音頻時調用，用於流式轉錄
         self.debug = True
         
-    def start_recording(self):
-        """開始錄音"""
+    def start_recording(self, on_audio=None):
+        """開始錄音
+
+        Args:
+            on_audio: 可選回調，參數為每一幀保留的 16 位 PCM 字節（例如 StreamingTranscriber.feed）
+        """
         # 確保目錄存在
         os.makedirs("uploads", exist_ok=True)
         
@@ -32,6 +37,7 @@ class PCRecorder:
         # 重置狀態
         self.is_recording = True
         self.frames = []
+        self.on_audio = on_audio
         
         # 開始新線程錄音
         self.recording_thread = threading.Thread(target=self._record)
@@ -100,6 +106,7 @@ class PCRecorder:
                     if self.debug and not has_detected_speech:
                         print("[PC_RECORDER] 檢測到語音，錄音中...")
                     self.frames.append(data)
+                    self._notify_audio(data)
                     silence_count = 0
                     has_detected_speech = True
                 else:
@@ -107,6 +114,7 @@ class PCRecorder:
                     # 如果檢測到語音，我們仍然添加一些靜音幀以保持上下文
                     if has_detected_speech:
                         self.frames.append(data)
+                        self._notify_audio(data)
                 
                 # 如果已經檢測到語音，且之後的靜音超過閾值，則停止錄音
                 if has_detected_speech and silence_count > max_silence_frames:
@@ -126,6 +134,16 @@ class PCRecorder:
             p.terminate()
             self.is_recording = False
             
+    def _notify_audio(self, data):
+        """把錄到的音頻交給回調，回調出錯不影響錄音"""
+        if self.on_audio is None:
+            return
+        try:
+            self.on_audio(data)
+        except Exception as e:
+            if self.debug:
+                print(f"[PC_RECORDER] 音頻回調出錯: {e}")
+
     def _save_wav(self):
         """將錄音幀保存為WAV文件"""
         if not self.frames:
@@ -280,9 +280,25 @@ socket.on('phone_mode_response', function(data) {
 });
 
 // 連接狀態更新
+// 檢測瀏覽器可解碼的 TTS 音頻格式，服務端按優先順序選擇
+function getSupportedAudioFormats() {
+    const probe = document.createElement('audio');
+    const candidates = {
+        ogg: 'audio/ogg; codecs="opus"',
+        mp3: 'audio/mpeg',
+        wav: 'audio/wav'
+    };
+    return Object.keys(candidates).filter(format => probe.canPlayType(candidates[format]) !== '');
+}
+
 socket.on('connect', () => {
     updateSystemStatus(true);
     showSystemMessage('已連接到服務器');
+    socket.emit('audio_capabilities', { formats: getSupportedAudioFormats() });
+});
+
+socket.on('audio_format_selected', (data) => {
+    console.log('TTS 音頻格式:', data.format);
 });
 
 socket.on('disconnect', () => {
@@ -774,6 +790,32 @@ socket.on('response', (data) => {
     }
 });
 
+// 分句 TTS 音頻：按序號排入播放隊列，完整音頻到達時不再重複自動播放
+const pendingAudioChunks = {};
+
+socket.on('response_audio_chunk', (data) => {
+    autoPlayedAudioFiles.add(data.stream_id);
+
+    if (!pendingAudioChunks[data.stream_id]) {
+        pendingAudioChunks[data.stream_id] = { next: 0, chunks: {} };
+    }
+    const stream = pendingAudioChunks[data.stream_id];
+    stream.chunks[data.seq] = data.audio_file;
+
+    while (stream.chunks[stream.next] !== undefined) {
+        const chunkAudio = new Audio(stream.chunks[stream.next]);
+        chunkAudio.setAttribute('data-source', audioSources.CHATBOT);
+        audioPlayQueue.push(chunkAudio);
+        delete stream.chunks[stream.next];
+        stream.next++;
+    }
+
+    if (stream.next >= data.total) {
+        delete pendingAudioChunks[data.stream_id];
+    }
+    playQueuedAudio();
+});
+
 // 修改開始錄音確認事件
 let beepAudio = null;
 
@@ -907,6 +949,21 @@ socket.on('phone_mode_speech_detected', () => {
     showSystemMessage('檢測到語音輸入...');
 });
 
+// 流式轉錄的局部結果：已確認的文字正常顯示，仍可能變化的部分淡色顯示
+socket.on('partial_transcript', (data) => {
+    const transcript = document.getElementById('phone-mode-transcript');
+    if (!transcript) return;
+    const stable = document.createElement('span');
+    stable.textContent = data.stable_text;
+    const unstable = document.createElement('span');
+    unstable.className = 'unstable';
+    unstable.textContent = data.text.slice(data.stable_text.length);
+    transcript.replaceChildren(stable, unstable);
+    if (data.final) {
+        setTimeout(() => transcript.replaceChildren(), 3000);
+    }
+});
+
 // 添加錯誤處理
 socket.on('error', (data) => {
     showSystemMessage(`錯誤: ${data.message}`);
@@ -1177,7 +1234,7 @@ function loadWhisperSettings() {
             }
             
             // 切換顯示設置面板
-            if (status.mode === 'local') {
+            if (status.mode.startsWith('local')) {
                 document.getElementById('local-whisper-settings').style.display = 'block';
                 document.getElementById('azure-whisper-settings').style.display = 'none';
             } else {
@@ -1394,7 +1451,7 @@ if (whisperMode) {
         const localSettings = document.getElementById('local-whisper-settings');
         const azureSettings = document.getElementById('azure-whisper-settings');
         
-        if (mode === 'local') {
+        if (mode.startsWith('local')) {
             if (localSettings) localSettings.style.display = 'block';
             if (azureSettings) azureSettings.style.display = 'none';
         } else {
@@ -0,0 +1,161 @@
+import time
+import logging
+import threading
+import numpy as np
+import config
+from whisper_selector import load_pcm, STT_SAMPLE_RATE
+
+# 是否在錄音過程中進行流式轉錄（每次局部轉錄都會調用一次 STT 後端，因此默認關閉；
+# 關閉時錄音結束後一次轉錄整段語音，不發送 partial_transcript 事件）
+STT_STREAMING_ENABLED = getattr(config, "STT_STREAMING_ENABLED", False)
+# 兩次局部轉錄之間的間隔（秒）
+STT_STREAM_STEP_SECONDS = getattr(config, "STT_STREAM_STEP_SECONDS", 1.0)
+# 未確認音頻的最大長度（秒），超出時強制確認較早的分段
+STT_STREAM_WINDOW_SECONDS = getattr(config, "STT_STREAM_WINDOW_SECONDS", 15.0)
+# 結束時最後一次局部轉錄未覆蓋的音頻短於此值（秒）時直接沿用其結果，
+# 調用方在 VAD 檢測到靜音後才結束，這段音頻只是靜音
+STT_STREAM_FINAL_REUSE_SECONDS = getattr(config, "STT_STREAM_FINAL_REUSE_SECONDS", 1.0)
+
+
+class StreamingTranscriber:
+    """錄音過程中對滑動窗口做增量轉錄
+
+    後台線程每隔 step_seconds 轉錄一次「已確認位置之後」的全部音頻，並通過 on_partial 回調
+    交付局部結果。相鄰兩次轉錄中除最後一段外文本一致的分段被確認，已確認位置前移到該分段結束處，
+    之後不再重複轉錄。VAD 檢測到語音結束時調用 finish()，只轉錄未確認的尾部；
+    沒有進行過局部轉錄時（未啟用後台轉錄或語音很短）改用 transcribe_text 一次轉錄整段語音。
+    """
+
+    def __init__(self, transcribe_segments, on_partial=None, sample_rate=STT_SAMPLE_RATE,
+                 step_seconds=STT_STREAM_STEP_SECONDS, window_seconds=STT_STREAM_WINDOW_SECONDS,
+                 final_reuse_seconds=STT_STREAM_FINAL_REUSE_SECONDS, transcribe_text=None):
+        """
+        Args:
+            transcribe_segments: 參數為 (16kHz float32 數組, 目前整段語音的秒數)、返回 [{start, end, text}] 的函數
+            on_partial: 局部結果回調，參數為 {text, stable_text, final}
+            sample_rate: feed() 輸入音頻的採樣率
+            transcribe_text: 參數為整段 16kHz float32 數組、返回文本的函數，
+                             沒有局部轉錄時 finish() 使用它，與非流式轉錄路徑相同
+        """
+        self.transcribe_segments = transcribe_segments
+        self.transcribe_text = transcribe_text
+        self.on_partial = on_partial
+        self.sample_rate = sample_rate
+        self.step_seconds = step_seconds
+        self.window_samples = int(window_seconds * STT_SAMPLE_RATE)
+        self.final_reuse_samples = int(final_reuse_seconds * STT_SAMPLE_RATE)
+
+        self._chunks = []
+        self._audio = np.zeros(0, dtype=np.float32)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+
+        self.confirmed_text = ""
+        self.confirmed_samples = 0     # 已確認文本覆蓋到的樣本位置
+        self.hypothesis = []           # 上一次局部轉錄中未確認的分段
+        self.hypothesis_end = 0        # 上一次局部轉錄覆蓋到的樣本位置
+        self.partial_passes = 0
+
+    def start(self):
+        """啟動後台局部轉錄線程"""
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True, name="streaming_stt")
+            self._worker.start()
+        return self
+
+    def feed(self, audio):
+        """追加一段錄音（int16/float32 數組或 16 位 PCM 字節）"""
+        if isinstance(audio, (bytes, bytearray)):
+            audio = np.frombuffer(audio, dtype=np.int16)
+        with self._lock:
+            self._chunks.append(np.asarray(audio))
+
+    def _snapshot(self):
+        """合併新收到的音頻，返回目前全部音頻（16kHz float32）"""
+        with self._lock:
+            chunks, self._chunks = self._chunks, []
+        if chunks:
+            pcm = np.concatenate([chunk.reshape(len(chunk), -1) for chunk in chunks])
+            self._audio = np.concatenate([self._audio, load_pcm(pcm, self.sample_rate)])
+        return self._audio
+
+    def _run(self):
+        while not self._stop.wait(self.step_seconds):
+            try:
+                audio = self._snapshot()
+                if len(audio) - self.hypothesis_end >= self.step_seconds * STT_SAMPLE_RATE / 2:
+                    self._partial_pass(audio)
+            except Exception as e:
+                logging.error(f"流式轉錄出錯: {e}")
+
+    def _partial_pass(self, audio):
+        """轉錄已確認位置之後的音頻，確認穩定的分段並交付局部結果"""
+        offset = self.confirmed_samples
+        segments = self.transcribe_segments(audio[offset:], len(audio) / STT_SAMPLE_RATE)
+        self.partial_passes += 1
+
+        # 除最後一段（可能在詞中間被截斷）外，與上一次結果一致的前綴分段視為穩定
+        stable = 0
+        while (stable < len(segments) - 1 and stable < len(self.hypothesis)
+               and segments[stable]["text"] == self.hypothesis[stable]["text"]):
+            stable += 1
+        # 未確認音頻超出窗口時，強制確認除最後一段外的全部分段
+        if len(audio) - offset > self.window_samples:
+            stable = max(stable, len(segments) - 1)
+
+        if stable:
+            self.confirmed_text += "".join(segment["text"] for segment in segments[:stable])
+            self.confirmed_samples = offset + int(segments[stable - 1]["end"] * STT_SAMPLE_RATE)
+            # 以新的確認位置為起點重新計算剩餘分段的時間
+            shift = segments[stable - 1]["end"]
+            segments = [dict(segment, start=segment["start"] - shift, end=segment["end"] - shift)
+                        for segment in segments[stable:]]
+
+        self.hypothesis = segments
+        self.hypothesis_end = len(audio)
+        self._emit(final=False)
+
+    def _emit(self, final):
+        if self.on_partial is None:
+            return
+        try:
+            self.on_partial({
+                "text": self.text,
+                "stable_text": self.confirmed_text,
+                "final": final
+            })
+        except Exception as e:
+            logging.error(f"發送局部轉錄結果時出錯: {e}")
+
+    @property
+    def text(self):
+        """目前的完整轉錄：已確認文本加上最新的未確認分段"""
+        return self.confirmed_text + "".join(segment["text"] for segment in self.hypothesis)
+
+    def finish(self):
+        """語音結束時調用：停止後台轉錄，只轉錄未確認的尾部，返回最終文本"""
+        self._stop.set()
+        if self._worker is not None:
+            # 等待進行中的局部轉錄完成，它覆蓋的音頻不必重新轉錄
+            self._worker.join()
+        audio = self._snapshot()
+
+        start_time = time.perf_counter()
+        if self.partial_passes == 0 and self.transcribe_text is not None:
+            # 整段一次轉錄：會裁剪首尾靜音、可參與批量推理，並按整段時長選擇解碼配置
+            text = self.transcribe_text(audio) if len(audio) else ""
+            self.hypothesis = [{"start": 0.0, "end": len(audio) / STT_SAMPLE_RATE, "text": text}] if text else []
+            self.hypothesis_end = len(audio)
+        elif len(audio) - self.hypothesis_end > self.final_reuse_samples or self.partial_passes == 0:
+            tail = audio[self.confirmed_samples:]
+            self.hypothesis = self.transcribe_segments(tail, len(audio) / STT_SAMPLE_RATE) if len(tail) else []
+            self.hypothesis_end = len(audio)
+        logging.info(f"流式轉錄完成: {len(audio) / STT_SAMPLE_RATE:.1f} 秒音頻, {self.partial_passes} 次局部轉錄, "
+                     f"結束後耗時 {time.perf_counter() - start_time:.2f} 秒")
+        self._emit(final=True)
+        return self.text
+
+    def cancel(self):
+        """放棄本次轉錄（例如未檢測到有效語音）"""
+        self._stop.set()
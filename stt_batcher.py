@@ -0,0 +1,214 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+import config
+from model_registry import model_registry
+
+# 是否把同時到達的本地 Whisper 轉錄請求合併為一次批量推理
+STT_BATCHING_ENABLED = getattr(config, "STT_BATCHING_ENABLED", True)
+# 第一個請求到達後等待更多請求加入同一批的時間（毫秒）
+STT_BATCH_WINDOW_MS = getattr(config, "STT_BATCH_WINDOW_MS", 30)
+# 每批最多合併的請求數
+STT_BATCH_MAX_SIZE = getattr(config, "STT_BATCH_MAX_SIZE", 8)
+# Whisper 單個窗口的最大長度（秒），更長的音頻需要逐段轉錄，不參與批量推理
+WHISPER_WINDOW_SECONDS = 30
+
+# 與 whisper.transcribe 默認值相同的回退閾值
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def decoding_key(options):
+    """把 transcribe 參數轉為可比較的鍵，只有參數相同的請求可以合併"""
+    return tuple(sorted((key, tuple(value) if isinstance(value, (list, tuple)) else value)
+                        for key, value in options.items()))
+
+
+class _Request:
+    def __init__(self, audio, options):
+        self.audio = audio
+        self.options = options
+        self.key = decoding_key(options)
+        self.future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """本地 Whisper 轉錄的微批量調度器
+
+    請求進入隊列後，工作線程等待 window_ms 收集同時到達的其他請求，把解碼參數相同的請求
+    填充為 30 秒的 log-mel 頻譜後堆疊成一批，一次編碼器/解碼器前向完成；只有一個請求時
+    按原來的 model.transcribe 處理。模型推理都在工作線程中串行進行，避免多個請求同時爭用 CPU 核心。
+
+    批量解碼只用第一個溫度，每段結果按 transcribe 相同的閾值檢查（壓縮率、平均對數概率、
+    無語音概率）：判為無語音的返回空文本，需要回退的段落單獨經 model.transcribe 重新轉錄。
+    """
+
+    def __init__(self, model_size, quantized=False, window_ms=STT_BATCH_WINDOW_MS, max_batch=STT_BATCH_MAX_SIZE):
+        self.model_size = model_size
+        self.quantized = quantized
+        self.window_seconds = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.batched_requests = 0
+        self.single_requests = 0
+        self.fallback_requests = 0
+        self._worker = threading.Thread(
+            target=self._run, daemon=True, name=f"stt_batcher_{model_size}{'_int8' if quantized else ''}")
+        self._worker.start()
+
+    def submit(self, audio, options):
+        """提交 16kHz float32 音頻（不超過 30 秒），返回結果為轉錄文本的 Future"""
+        request = _Request(audio, options)
+        self._queue.put(request)
+        return request.future
+
+    def transcribe(self, audio, options):
+        """提交並等待轉錄結果"""
+        return self.submit(audio, options).result()
+
+    def _collect(self):
+        """阻塞等待第一個請求，再在窗口時間內收集其餘請求"""
+        requests = [self._queue.get()]
+        deadline = time.perf_counter() + self.window_seconds
+        while len(requests) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                requests.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            # 按解碼參數分組，參數不同的請求不能放在同一批
+            groups = {}
+            for request in requests:
+                groups.setdefault(request.key, []).append(request)
+            for group in groups.values():
+                try:
+                    self._process(group)
+                except Exception as e:
+                    logging.error(f"批量轉錄失敗: {e}")
+                    for request in group:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+
+    def _process(self, group):
+        with model_registry.use(self.model_size, quantized=self.quantized) as model:
+            # CPU 不支持 fp16
+            fp16 = getattr(getattr(model, "device", None), "type", "cpu") == "cuda"
+            if len(group) == 1:
+                request = group[0]
+                result = model.transcribe(request.audio, **dict(request.options, fp16=fp16))
+                request.future.set_result(result.get("text", ""))
+                self.single_requests += 1
+                return
+
+            options = dict(group[0].options, fp16=fp16)
+            texts = self._decode_batch(model, [request.audio for request in group], options)
+            # 未通過回退檢查的段落按單個請求重新轉錄，使用完整的溫度回退
+            retried = 0
+            for index, text in enumerate(texts):
+                if text is None:
+                    texts[index] = model.transcribe(group[index].audio, **options).get("text", "")
+                    retried += 1
+            if retried:
+                logging.info(f"批量轉錄中 {retried}/{len(group)} 段未通過回退檢查，已單獨重新轉錄")
+                self.fallback_requests += retried
+
+        for request, text in zip(group, texts):
+            request.future.set_result(text)
+        self.batches += 1
+        self.batched_requests += len(group)
+        logging.info(f"批量轉錄 {len(group)} 個請求，首個請求總耗時 "
+                     f"{(time.perf_counter() - group[0].submitted_at):.2f} 秒")
+
+    @staticmethod
+    def needs_fallback(result, options):
+        """按 whisper.transcribe 的規則檢查單段解碼結果
+
+        Returns:
+            "silence": 判為無語音；"fallback": 需要以更高溫度重新解碼；None: 結果可用
+        """
+        logprob_threshold = options.get("logprob_threshold", LOGPROB_THRESHOLD)
+        no_speech_threshold = options.get("no_speech_threshold", NO_SPEECH_THRESHOLD)
+        compression_ratio_threshold = options.get("compression_ratio_threshold", COMPRESSION_RATIO_THRESHOLD)
+
+        # transcribe 跳過的無語音段：無語音概率高，且平均對數概率不高於閾值（或未設置該閾值）
+        if (no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold
+                and (logprob_threshold is None or result.avg_logprob <= logprob_threshold)):
+            return "silence"
+        if compression_ratio_threshold is not None and result.compression_ratio > compression_ratio_threshold:
+            return "fallback"
+        if logprob_threshold is not None and result.avg_logprob < logprob_threshold:
+            return "fallback"
+        return None
+
+    @classmethod
+    def _decode_batch(cls, model, audios, options):
+        """把多段音頻填充為 30 秒 log-mel 頻譜後一次解碼，返回各段文本；需要回退的段落為 None"""
+        import torch
+        import whisper
+
+        n_mels = getattr(getattr(model, "dims", None), "n_mels", 80)
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audio)), n_mels=n_mels)
+            for audio in audios
+        ]).to(model.device)
+
+        # decode 不支持按溫度回退，使用第一個溫度；束搜索只在溫度為 0 時有效
+        temperature = options.get("temperature", 0.0)
+        if isinstance(temperature, (list, tuple)):
+            temperature = temperature[0]
+        decode_options = whisper.DecodingOptions(
+            language=options.get("language"),
+            temperature=temperature,
+            beam_size=options.get("beam_size") if temperature == 0 else None,
+            best_of=options.get("best_of") if temperature > 0 else None,
+            prompt=options.get("initial_prompt"),
+            fp16=options.get("fp16", False),
+            without_timestamps=True,
+        )
+        texts = []
+        for result in whisper.decode(model, mel, decode_options):
+            verdict = cls.needs_fallback(result, options)
+            texts.append("" if verdict == "silence" else None if verdict == "fallback" else result.text.strip())
+        return texts
+
+    def stats(self):
+        return {
+            "model": self.model_size,
+            "quantized": self.quantized,
+            "batches": self.batches,
+            "batched_requests": self.batched_requests,
+            "single_requests": self.single_requests,
+            "fallback_requests": self.fallback_requests,
+            "queued": self._queue.qsize()
+        }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_batch_scheduler(model_size, quantized=False):
+    """返回指定模型的批量調度器（每個模型一個工作線程）"""
+    key = (model_size, quantized)
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = BatchScheduler(model_size, quantized)
+        return _schedulers[key]
+
+
+def batching_stats():
+    """返回所有批量調度器的統計"""
+    with _schedulers_lock:
+        return [scheduler.stats() for scheduler in _schedulers.values()]
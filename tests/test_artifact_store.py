@@ -0,0 +1,103 @@
+"""產物存儲後台清理的大小/時間預算和聊天歷史固定的測試
+
+每個測試使用 pytest 的臨時目錄作為產物目錄，直接調用 sweep() 代替後台線程。
+
+用法: python -m pytest -q tests/test_artifact_store.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_utils import referenced_artifact_ids
+from artifact_store import ArtifactStore
+
+
+def make_store(tmp_path, max_bytes=1000, max_age_hours=24):
+    return ArtifactStore(directory=str(tmp_path), max_bytes=max_bytes, max_age_hours=max_age_hours)
+
+
+def save_aged(store, name, size, age_seconds):
+    """保存一個產物並把創建時間設為 age_seconds 秒前"""
+    artifact = store.save(b"x" * size, "tts", "wav", artifact_id=name)
+    artifact.created_at = time.time() - age_seconds
+    return artifact
+
+
+def test_ids_are_unique_within_the_same_second(tmp_path):
+    store = make_store(tmp_path)
+    first = store.save(b"a", "tts", "wav")
+    second = store.save(b"b", "tts", "wav")
+
+    assert first.artifact_id != second.artifact_id
+    assert first.url == f"/static/artifacts/{first.filename}"
+    assert open(first.path, "rb").read() == b"a"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_sweep_evicts_oldest_until_within_byte_budget(tmp_path):
+    store = make_store(tmp_path, max_bytes=250)
+    oldest = save_aged(store, "oldest", 100, 300)
+    middle = save_aged(store, "middle", 100, 200)
+    newest = save_aged(store, "newest", 100, 100)
+
+    assert store.sweep() == 1
+    assert store.get("oldest") is None
+    assert not os.path.exists(oldest.path)
+    assert store.get("middle") is middle and os.path.exists(middle.path)
+    assert store.get("newest") is newest
+    assert store.stats()["bytes"] == 200
+    assert store.stats()["evictions"] == 1
+
+
+def test_sweep_evicts_artifacts_older_than_max_age(tmp_path):
+    store = make_store(tmp_path, max_age_hours=1)
+    save_aged(store, "expired", 10, 3601)
+    save_aged(store, "fresh", 10, 3599)
+
+    assert store.sweep() == 1
+    assert store.get("expired") is None
+    assert store.get("fresh") is not None
+
+
+def test_pinned_artifacts_survive_until_unpinned(tmp_path):
+    store = make_store(tmp_path, max_bytes=150, max_age_hours=1)
+    pinned = save_aged(store, "pinned", 100, 7200)
+    save_aged(store, "old", 100, 60)
+    save_aged(store, "new", 100, 30)
+    store.set_pinned({"pinned"})
+
+    # 固定的產物既不因過期也不因超出預算被淘汰，改為淘汰其他產物
+    assert store.sweep() == 2
+    assert store.get("pinned") is pinned and os.path.exists(pinned.path)
+    assert store.get("old") is None and store.get("new") is None
+
+    # 對應的歷史條目被移除後照常淘汰
+    store.set_pinned(set())
+    assert store.sweep() == 1
+    assert store.get("pinned") is None
+    assert not os.path.exists(pinned.path)
+
+
+def test_index_restored_after_restart(tmp_path):
+    store = make_store(tmp_path)
+    artifact = store.save(b"x" * 10, "upload", "jpg")
+    (tmp_path / "partial.wav.tmp").write_bytes(b"x")
+
+    reloaded = make_store(tmp_path)
+    restored = reloaded.get(artifact.artifact_id)
+    assert restored is not None
+    assert restored.size == 10
+    assert restored.path == artifact.path
+    assert reloaded.stats()["entries"] == 1
+
+
+def test_chat_history_references_become_pins():
+    messages = [
+        {"type": "received", "text": "你好", "audioSrc": "/api/audio/tts_1"},
+        {"type": "sent", "text": "圖片", "imageSrc": "/static/artifacts/upload_2.jpg?v=3"},
+        {"type": "received", "text": "舊回應", "audioSrc": "/static/response.wav"},
+        {"type": "sent", "text": "沒有附件", "audioSrc": None},
+    ]
+    assert referenced_artifact_ids(messages) == {"tts_1", "upload_2"}
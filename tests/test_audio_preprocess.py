@@ -0,0 +1,114 @@
+"""STT 前處理（聲道混合、重採樣、首尾靜音裁剪）的測試
+
+語音以正弦音代替，並停用 webrtcvad 使用能量判斷，結果不依賴 VAD 模型。
+
+用法: python -m pytest -q tests/test_audio_preprocess.py
+"""
+import io
+import os
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_preprocess import TARGET_SAMPLE_RATE, mixdown, preprocess, resample, to_float32, trim_silence
+from whisper_selector import load_pcm
+
+PADDING_MS = 200
+FRAME = int(TARGET_SAMPLE_RATE * 0.03)
+
+
+@pytest.fixture(autouse=True)
+def energy_vad(monkeypatch):
+    """讓 import webrtcvad 失敗，改用能量判斷"""
+    monkeypatch.setitem(sys.modules, "webrtcvad", None)
+
+
+def tone(seconds, rate=TARGET_SAMPLE_RATE, frequency=440, amplitude=0.3):
+    t = np.arange(int(seconds * rate)) / rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def silence(seconds, rate=TARGET_SAMPLE_RATE):
+    return np.zeros(int(seconds * rate), dtype=np.float32)
+
+
+def test_mixdown_and_float_conversion():
+    stereo = np.array([[1000, 3000], [-2000, 0]], dtype=np.int16)
+    assert mixdown(stereo).tolist() == [2000, -1000]
+    assert mixdown(stereo[:, :1]).tolist() == [1000, -2000]
+
+    converted = to_float32(np.array([16384, -32768], dtype=np.int16))
+    assert converted.dtype == np.float32
+    assert converted.tolist() == [0.5, -1.0]
+
+
+def test_resample_keeps_duration_and_pitch():
+    pytest.importorskip("scipy")
+    samples = tone(1.0, rate=44100, frequency=1000)
+    resampled = resample(samples, 44100)
+
+    assert resampled.dtype == np.float32
+    assert len(resampled) == TARGET_SAMPLE_RATE
+    spectrum = np.abs(np.fft.rfft(resampled))
+    assert np.argmax(spectrum) * TARGET_SAMPLE_RATE / len(resampled) == pytest.approx(1000, abs=2)
+    assert resample(samples, TARGET_SAMPLE_RATE) is samples
+
+
+def test_trim_silence_keeps_speech_with_padding():
+    samples = np.concatenate([silence(1.0), tone(0.6), silence(2.0)])
+    trimmed = trim_silence(samples, padding_ms=PADDING_MS)
+
+    padding = TARGET_SAMPLE_RATE * PADDING_MS // 1000
+    # 語音邊界按 30 毫秒幀對齊，兩端各保留填充
+    assert abs(len(trimmed) - (len(tone(0.6)) + 2 * padding)) <= 2 * FRAME
+    start = np.flatnonzero(trimmed)[0]
+    assert abs(start - padding) <= FRAME
+
+
+def test_trim_padding_is_clipped_at_the_edges():
+    samples = np.concatenate([tone(0.5), silence(1.0)])
+    trimmed = trim_silence(samples, padding_ms=PADDING_MS)
+
+    # 語音從第一個樣本開始時不向前填充，結尾的靜音仍被裁剪
+    np.testing.assert_array_equal(trimmed, samples[:len(trimmed)])
+    assert len(trimmed) < len(samples)
+
+
+def test_no_speech_is_left_untouched():
+    samples = silence(1.0)
+    assert trim_silence(samples) is samples
+    short = tone(0.01)
+    assert trim_silence(short) is short
+
+
+def test_preprocess_from_stereo_int16_at_48k():
+    pytest.importorskip("scipy")
+    mono = np.concatenate([silence(1.0, 48000), tone(0.5, 48000), silence(1.5, 48000)])
+    stereo = (np.stack([mono, mono], axis=1) * 32767).astype(np.int16)
+
+    untrimmed = preprocess(stereo, 48000, trim=False)
+    assert untrimmed.dtype == np.float32 and untrimmed.ndim == 1
+    assert len(untrimmed) == 3 * TARGET_SAMPLE_RATE
+
+    trimmed = preprocess(stereo, 48000, trim=True)
+    assert len(trimmed) < 1.2 * TARGET_SAMPLE_RATE
+
+
+def test_load_pcm_reads_wav_bytes():
+    pytest.importorskip("scipy")
+    mono = np.concatenate([silence(0.5, 22050), tone(0.5, 22050)])
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(2)
+        writer.setsampwidth(2)
+        writer.setframerate(22050)
+        writer.writeframes((np.repeat(mono, 2) * 32767).astype(np.int16).tobytes())
+
+    samples = load_pcm(output.getvalue())
+    assert samples.dtype == np.float32
+    assert len(samples) == TARGET_SAMPLE_RATE
+    assert np.abs(samples).max() == pytest.approx(0.3, abs=0.02)
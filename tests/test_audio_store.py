@@ -0,0 +1,159 @@
+"""Ogg Opus 重新封裝和時長計算的測試
+
+測試數據在測試中按 Ogg 規範逐頁構造（OpusHead、OpusTags 和 TOC 為 20 毫秒幀的音頻包），
+頁校驗和用逐位計算的 CRC 獨立驗證，不依賴 Opus 編碼器。
+
+用法: python -m pytest -q tests/test_audio_store.py
+"""
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_store import (
+    OGG_BOS, OGG_EOS, concat_ogg_opus, ogg_duration, ogg_links, ogg_pages, opus_packet_samples
+)
+
+PRE_SKIP = 312
+# config 1（SILK 窄帶 20 毫秒）、單幀：每包 960 個 48kHz 樣本
+FRAME_TOC = 0x08
+FRAME_SAMPLES = 960
+
+
+def reference_crc(data):
+    """Ogg 頁校驗和：多項式 0x04C11DB7，初值 0，不反轉"""
+    crc = 0
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def build_page(header_type, granule, serial, sequence, packets):
+    lacing = bytearray()
+    for packet in packets:
+        lacing.extend(b"\xff" * (len(packet) // 255))
+        lacing.append(len(packet) % 255)
+    page = bytearray(struct.pack("<4sBBqIIIB", b"OggS", 0, header_type, granule, serial, sequence, 0, len(lacing)))
+    page += bytes(lacing) + b"".join(packets)
+    struct.pack_into("<I", page, 22, reference_crc(page))
+    return bytes(page)
+
+
+def opus_head(pre_skip=PRE_SKIP):
+    return b"OpusHead" + struct.pack("<BBHIhB", 1, 1, pre_skip, 16000, 0, 0)
+
+
+def audio_packet(tag, size=40):
+    return bytes([FRAME_TOC, tag]) + bytes(size - 2)
+
+
+def build_link(serial, packets, end_trim=0, packets_per_page=2):
+    """一段單一邏輯流的 Ogg Opus 數據
+
+    granule 為已解碼的樣本數（包含開頭 pre-skip 的樣本），最後一頁減去 end_trim 個填充樣本。
+    """
+    pages = [build_page(OGG_BOS, 0, serial, 0, [opus_head()]),
+             build_page(0, 0, serial, 1, [b"OpusTags" + bytes(8)])]
+    granule = 0
+    for start in range(0, len(packets), packets_per_page):
+        group = packets[start:start + packets_per_page]
+        granule += FRAME_SAMPLES * len(group)
+        last = start + packets_per_page >= len(packets)
+        pages.append(build_page(OGG_EOS if last else 0, granule - (end_trim if last else 0),
+                                serial, len(pages), group))
+    return b"".join(pages)
+
+
+@pytest.fixture
+def links():
+    """三句話的 Ogg Opus 音頻，各自是獨立的邏輯流"""
+    return [
+        build_link(0x1111, [audio_packet(1), audio_packet(2), audio_packet(3)]),
+        build_link(0x2222, [audio_packet(4), audio_packet(5)]),
+        build_link(0x3333, [audio_packet(6), audio_packet(7), audio_packet(8), audio_packet(9)], end_trim=200),
+    ]
+
+
+def test_opus_packet_samples_from_toc():
+    assert opus_packet_samples(bytes([FRAME_TOC])) == 960
+    # CELT 20 毫秒（config 31），code 1 雙幀
+    assert opus_packet_samples(bytes([(31 << 3) | 1])) == 1920
+    # CELT 2.5 毫秒（config 28），code 3 帶 5 幀
+    assert opus_packet_samples(bytes([(28 << 3) | 3, 5])) == 600
+
+
+def test_concat_produces_single_logical_stream(links):
+    merged = concat_ogg_opus(links)
+
+    assert len(ogg_links(merged)) == 1
+    pages = list(ogg_pages(merged))
+    assert [header & (OGG_BOS | OGG_EOS) for header, *_ in pages] == (
+        [OGG_BOS] + [0] * (len(pages) - 2) + [OGG_EOS])
+    assert {serial for _, _, serial, _ in pages} == {0x1111}
+
+    packets = ogg_links(merged)[0]["packets"]
+    assert packets[0] == opus_head()
+    assert [packet[1] for packet in packets[2:]] == list(range(1, 10))
+
+
+def test_concat_pages_have_valid_crc_and_continuous_sequence(links):
+    merged = concat_ogg_opus(links)
+
+    offset, sequences = 0, []
+    while offset < len(merged):
+        segment_count = merged[offset + 26]
+        length = 27 + segment_count + sum(merged[offset + 27:offset + 27 + segment_count])
+        page = bytearray(merged[offset:offset + length])
+        stored = struct.unpack_from("<I", page, 22)[0]
+        struct.pack_into("<I", page, 22, 0)
+        assert stored == reference_crc(page)
+        sequences.append(struct.unpack_from("<I", page, 18)[0])
+        offset += length
+
+    assert sequences == list(range(len(sequences)))
+
+
+def test_concat_granule_is_continuous_across_links(links):
+    # 每頁最多放兩個音頻包，使合併後的音頻跨越多頁
+    merged = concat_ogg_opus(links, max_page_bytes=80)
+
+    samples = 0
+    audio_pages = list(ogg_pages(merged))[2:]
+    assert len(audio_pages) > 3
+    for _, granule, _, segments in audio_pages[:-1]:
+        samples += FRAME_SAMPLES * sum(1 for _, complete in segments if complete)
+        assert granule == samples
+    # 最後一頁裁掉最後一段原有的填充樣本
+    assert audio_pages[-1][1] == 9 * FRAME_SAMPLES - 200
+
+
+def test_concat_splits_large_packets_into_lacing_values():
+    link = build_link(0x4444, [audio_packet(1, size=600), audio_packet(2, size=255)])
+    merged = concat_ogg_opus([link, link])
+
+    packets = ogg_links(merged)[0]["packets"][2:]
+    assert [len(packet) for packet in packets] == [600, 255, 600, 255]
+
+
+def test_ogg_duration_subtracts_pre_skip(links):
+    assert ogg_duration(links[0]) == pytest.approx((3 * FRAME_SAMPLES - PRE_SKIP) / 48000)
+    assert ogg_duration(links[2]) == pytest.approx((4 * FRAME_SAMPLES - 200 - PRE_SKIP) / 48000)
+
+
+def test_ogg_duration_of_merged_and_chained_streams(links):
+    expected = (9 * FRAME_SAMPLES - 200 - 3 * PRE_SKIP) / 48000
+    # 鏈式流按各段相加
+    assert ogg_duration(b"".join(links)) == pytest.approx(expected)
+    # 合併後只保留第一段的 pre-skip，其他各段的 pre-skip 樣本照常播放
+    assert ogg_duration(concat_ogg_opus(links)) == pytest.approx(expected + 2 * PRE_SKIP / 48000)
+
+
+def test_ogg_duration_of_invalid_data_is_none():
+    assert ogg_duration(b"RIFF0000WAVE") is None
+    assert ogg_duration(build_page(OGG_BOS, 0, 1, 0, [b"not opus"])) is None
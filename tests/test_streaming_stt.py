@@ -0,0 +1,144 @@
+"""流式轉錄的穩定前綴確認和結束時只轉錄尾部的測試
+
+transcribe_segments 以按調用順序返回預設分段的替身代替，不加載任何 STT 後端。
+
+用法: python -m pytest -q tests/test_streaming_stt.py
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming_stt import StreamingTranscriber
+from whisper_selector import STT_SAMPLE_RATE
+
+
+def seconds(duration):
+    """duration 秒的 16kHz 音頻（內容不影響替身的返回值）"""
+    return np.full(int(duration * STT_SAMPLE_RATE), 0.1, dtype=np.float32)
+
+
+def segment(start, end, text):
+    return {"start": start, "end": end, "text": text}
+
+
+class _Segments:
+    """transcribe_segments 替身：按順序返回預設結果，並記錄每次收到的音頻秒數"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def __call__(self, audio, utterance_seconds):
+        self.calls.append(len(audio) / STT_SAMPLE_RATE)
+        return self.results.pop(0)
+
+
+def make_streamer(transcribe_segments, transcribe_text=None, **kwargs):
+    kwargs.setdefault("final_reuse_seconds", 0.5)
+    return StreamingTranscriber(transcribe_segments, transcribe_text=transcribe_text, **kwargs)
+
+
+def partial_pass(streamer):
+    streamer._partial_pass(streamer._snapshot())
+
+
+def test_matching_prefix_is_confirmed():
+    fake = _Segments(
+        [segment(0.0, 1.0, "打開"), segment(1.0, 1.8, "燈")],
+        [segment(0.0, 1.0, "打開"), segment(1.0, 2.0, "燈光"), segment(2.0, 2.6, "唔")],
+    )
+    partials = []
+    streamer = make_streamer(fake, on_partial=partials.append)
+
+    streamer.feed(seconds(2.0))
+    partial_pass(streamer)
+    # 第一次轉錄沒有可比較的結果，不確認任何分段
+    assert streamer.confirmed_text == ""
+    assert streamer.confirmed_samples == 0
+
+    streamer.feed(seconds(1.0))
+    partial_pass(streamer)
+    # 只有與上次一致的前綴被確認，最後一段即使一致也不確認
+    assert streamer.confirmed_text == "打開"
+    assert streamer.confirmed_samples == STT_SAMPLE_RATE
+    assert [s["text"] for s in streamer.hypothesis] == ["燈光", "唔"]
+    # 剩餘分段的時間以新的確認位置為起點
+    assert streamer.hypothesis[0]["start"] == pytest.approx(0.0)
+    assert streamer.hypothesis[-1]["end"] == pytest.approx(1.6)
+    assert partials[-1] == {"text": "打開燈光唔", "stable_text": "打開", "final": False}
+
+
+def test_changed_first_segment_is_not_confirmed():
+    fake = _Segments(
+        [segment(0.0, 1.0, "打開"), segment(1.0, 1.8, "燈")],
+        [segment(0.0, 1.0, "打晒"), segment(1.0, 2.0, "燈光")],
+    )
+    streamer = make_streamer(fake)
+    streamer.feed(seconds(2.0))
+    partial_pass(streamer)
+    streamer.feed(seconds(0.5))
+    partial_pass(streamer)
+
+    assert streamer.confirmed_text == ""
+    assert streamer.text == "打晒燈光"
+
+
+def test_window_overflow_forces_confirmation():
+    fake = _Segments([segment(0.0, 1.0, "一"), segment(1.0, 2.0, "二"), segment(2.0, 3.0, "三")])
+    streamer = make_streamer(fake, window_seconds=2.0)
+    streamer.feed(seconds(3.0))
+    partial_pass(streamer)
+
+    assert streamer.confirmed_text == "一二"
+    assert streamer.confirmed_samples == 2 * STT_SAMPLE_RATE
+    assert streamer.text == "一二三"
+
+
+def test_finish_transcribes_only_the_unconfirmed_tail():
+    fake = _Segments(
+        [segment(0.0, 1.0, "打開"), segment(1.0, 1.8, "燈")],
+        [segment(0.0, 1.0, "打開"), segment(1.0, 2.0, "燈")],
+        [segment(0.0, 2.0, "燈光")],
+    )
+    streamer = make_streamer(fake, transcribe_text=lambda audio: pytest.fail("不應整段重新轉錄"))
+    streamer.feed(seconds(2.0))
+    partial_pass(streamer)
+    streamer.feed(seconds(0.5))
+    partial_pass(streamer)
+
+    # 結束前又錄到超過 final_reuse_seconds 的音頻
+    streamer.feed(seconds(0.8))
+    assert streamer.finish() == "打開燈光"
+    # 最後一次只轉錄確認位置（1 秒）之後的 2.3 秒
+    assert fake.calls[-1] == pytest.approx(2.3)
+
+
+def test_finish_reuses_last_partial_when_tail_is_short():
+    fake = _Segments([segment(0.0, 1.5, "停止")])
+    streamer = make_streamer(fake)
+    streamer.feed(seconds(1.5))
+    partial_pass(streamer)
+
+    streamer.feed(seconds(0.2))
+    assert streamer.finish() == "停止"
+    assert len(fake.calls) == 1
+
+
+def test_finish_without_partial_passes_transcribes_whole_utterance():
+    received = []
+
+    def transcribe_text(audio):
+        received.append(len(audio) / STT_SAMPLE_RATE)
+        return "你好"
+
+    partials = []
+    streamer = make_streamer(_Segments(), transcribe_text=transcribe_text, on_partial=partials.append)
+    streamer.feed((seconds(1.2) * 32767).astype(np.int16).tobytes())
+
+    assert streamer.finish() == "你好"
+    assert received == [pytest.approx(1.2)]
+    assert partials == [{"text": "你好", "stable_text": "", "final": True}]
@@ -0,0 +1,108 @@
+"""批量轉錄的回退判斷和回退重轉錄的測試
+
+needs_fallback 使用與 whisper.DecodingResult 同名屬性的替身；_process 使用不加載模型的
+模型替身，並以預設結果代替 _decode_batch。
+
+用法: python -m pytest -q tests/test_stt_batcher.py
+"""
+import os
+import sys
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stt_batcher
+from stt_batcher import BatchScheduler, _Request
+
+
+def decoded(avg_logprob=-0.3, no_speech_prob=0.1, compression_ratio=1.5):
+    return SimpleNamespace(avg_logprob=avg_logprob, no_speech_prob=no_speech_prob,
+                           compression_ratio=compression_ratio, text="文本")
+
+
+@pytest.mark.parametrize("result, verdict", [
+    (decoded(), None),
+    # 重複輸出（壓縮率過高）或置信度過低時以更高溫度重新解碼
+    (decoded(compression_ratio=2.5), "fallback"),
+    (decoded(avg_logprob=-1.2), "fallback"),
+    # 無語音概率高且置信度不高於閾值時跳過該段，不再回退
+    (decoded(no_speech_prob=0.7, avg_logprob=-1.2), "silence"),
+    (decoded(no_speech_prob=0.7, avg_logprob=-1.0), "silence"),
+    (decoded(no_speech_prob=0.7, avg_logprob=-1.2, compression_ratio=3.0), "silence"),
+    # 無語音概率高但置信度正常時保留結果，壓縮率過高仍然回退
+    (decoded(no_speech_prob=0.7), None),
+    (decoded(no_speech_prob=0.7, compression_ratio=3.0), "fallback"),
+    # 恰好等於閾值時不回退
+    (decoded(avg_logprob=-1.0, no_speech_prob=0.6, compression_ratio=2.4), None),
+])
+def test_needs_fallback_default_thresholds(result, verdict):
+    assert BatchScheduler.needs_fallback(result, {}) == verdict
+
+
+def test_needs_fallback_uses_transcribe_options():
+    result = decoded(avg_logprob=-0.8, no_speech_prob=0.4, compression_ratio=2.0)
+    assert BatchScheduler.needs_fallback(result, {"compression_ratio_threshold": 1.8}) == "fallback"
+    assert BatchScheduler.needs_fallback(result, {"logprob_threshold": -0.5}) == "fallback"
+    assert BatchScheduler.needs_fallback(
+        result, {"logprob_threshold": -0.5, "no_speech_threshold": 0.3}) == "silence"
+    # 閾值為 None 時關閉對應檢查；未設置對數概率閾值時只按無語音概率跳過
+    low = decoded(avg_logprob=-2.0, compression_ratio=5.0)
+    assert BatchScheduler.needs_fallback(
+        low, {"logprob_threshold": None, "compression_ratio_threshold": None}) is None
+    assert BatchScheduler.needs_fallback(
+        decoded(no_speech_prob=0.9), {"logprob_threshold": None}) == "silence"
+
+
+class _Model:
+    """模型替身：記錄經 transcribe 單獨轉錄的音頻"""
+
+    device = SimpleNamespace(type="cpu")
+
+    def __init__(self):
+        self.transcribed = []
+
+    def transcribe(self, audio, **options):
+        self.transcribed.append((audio, options))
+        return {"text": f"重轉錄{audio}"}
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    model = _Model()
+
+    @contextmanager
+    def use(model_size, quantized=False):
+        yield model
+
+    monkeypatch.setattr(stt_batcher.model_registry, "use", use)
+    scheduler = BatchScheduler("tiny")
+    scheduler.model = model
+    return scheduler
+
+
+def test_batched_fallback_items_are_retranscribed(scheduler):
+    scheduler._decode_batch = lambda model, audios, options: ["第一段", None, "", None]
+    group = [_Request(index, {"language": "zh"}) for index in range(4)]
+
+    scheduler._process(group)
+
+    assert [request.future.result() for request in group] == ["第一段", "重轉錄1", "", "重轉錄3"]
+    # 只有未通過檢查的段落重新轉錄，使用與批量解碼相同的參數
+    assert scheduler.model.transcribed == [(1, {"language": "zh", "fp16": False}),
+                                           (3, {"language": "zh", "fp16": False})]
+    stats = scheduler.stats()
+    assert (stats["batches"], stats["batched_requests"], stats["fallback_requests"]) == (1, 4, 2)
+
+
+def test_single_request_uses_transcribe_directly(scheduler):
+    scheduler._decode_batch = lambda model, audios, options: pytest.fail("單個請求不應批量解碼")
+    request = _Request(7, {"language": "zh"})
+
+    scheduler._process([request])
+
+    assert request.future.result() == "重轉錄7"
+    assert scheduler.stats()["single_requests"] == 1
+    assert scheduler.stats()["fallback_requests"] == 0
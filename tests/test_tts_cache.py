@@ -0,0 +1,185 @@
+"""TTS 內容緩存的 LRU 淘汰和 TTSService 單飛合併的測試
+
+緩存寫入 pytest 的臨時目錄；Azure 後端以計數並可阻塞的替身代替，不連接任何服務。
+
+用法: python -m pytest -q tests/test_tts_cache.py
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_service import TTSBackend, TTSCache, TTSRouter, TTSService
+from turn_context import TurnContext
+
+
+def put(cache, text, size):
+    key = cache.make_key(text, "voice")
+    cache.put(key, b"x" * size)
+    return key
+
+
+def test_make_key_depends_on_text_voice_and_format():
+    keys = {
+        TTSCache.make_key("你好", "voice-a", "wav"),
+        TTSCache.make_key("你好", "voice-b", "wav"),
+        TTSCache.make_key("你好", "voice-a", "ogg"),
+        TTSCache.make_key("再見", "voice-a", "wav"),
+    }
+    assert len(keys) == 4
+    assert TTSCache.make_key("你好", "voice-a", "ogg").endswith(".ogg")
+
+
+def test_evicts_least_recently_used_within_byte_budget(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=30)
+    first = put(cache, "一", 10)
+    second = put(cache, "二", 10)
+    third = put(cache, "三", 10)
+
+    # 讀取使「一」成為最近使用，下一次寫入淘汰最久未使用的「二」
+    assert cache.get(first) == b"x" * 10
+    fourth = put(cache, "四", 10)
+
+    assert cache.contains(first) and cache.contains(third) and cache.contains(fourth)
+    assert not cache.contains(second)
+    assert not os.path.exists(tmp_path / second)
+    stats = cache.stats()
+    assert stats["bytes"] == 30
+    assert stats["evictions"] == 1
+
+
+def test_large_entry_evicts_several_and_oversized_entry_is_skipped(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=30)
+    keys = [put(cache, text, 10) for text in "一二三"]
+
+    big = put(cache, "長", 25)
+    assert [cache.contains(key) for key in keys] == [False, False, False]
+    assert cache.contains(big)
+
+    too_big = put(cache, "太長", 31)
+    assert not cache.contains(too_big)
+    assert not os.path.exists(tmp_path / too_big)
+    assert cache.stats()["bytes"] == 25
+
+
+def test_hit_and_miss_counters(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=100)
+    key = put(cache, "你好", 10)
+
+    assert cache.get(key) is not None
+    assert cache.get(cache.make_key("未緩存", "voice")) is None
+    # contains 不計入命中統計
+    cache.contains(key)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_index_rebuilt_from_modification_times(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=100)
+    keys = [put(cache, text, 10) for text in "一二三"]
+    now = time.time()
+    # 「二」最舊，其次是「三」
+    for key, age in zip(keys, (100, 300, 200)):
+        os.utime(tmp_path / key, (now - age, now - age))
+    (tmp_path / "partial.wav.123.tmp").write_bytes(b"x" * 50)
+
+    reloaded = TTSCache(str(tmp_path), max_bytes=20)
+    assert reloaded.contains(keys[0])
+    assert not reloaded.contains(keys[1])
+    assert reloaded.contains(keys[2])
+    assert reloaded.stats()["bytes"] == 20
+
+
+class _Backend(TTSBackend):
+    """Azure 替身：記錄合成次數，release 設置前阻塞；所屬輪次被取消時拋出異常"""
+
+    name = "azure"
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def cache_voice(self, voice):
+        return voice
+
+    def synthesize(self, text, voice, audio_format, turn=None):
+        with self._lock:
+            self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if turn is not None and turn.cancelled:
+            raise RuntimeError("合成已停止")
+        return f"{text}/{audio_format}".encode("utf-8")
+
+
+@pytest.fixture
+def service(tmp_path):
+    backend = _Backend()
+    service = TTSService(cache=TTSCache(str(tmp_path), max_bytes=1024))
+    service.azure = backend
+    service.router = TTSRouter(backend)
+    yield service
+    backend.release.set()
+    service.executor.shutdown(wait=True)
+
+
+def wait_for_joins(service, count):
+    deadline = time.monotonic() + 2
+    while service.stats()["single_flight_joins"] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return service.stats()["single_flight_joins"]
+
+
+def test_concurrent_identical_requests_share_one_synthesis(service):
+    backend = service.azure
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(service.synthesize, "你好", None, None, "wav") for _ in range(4)]
+        assert backend.started.wait(2)
+        assert wait_for_joins(service, 3) == 3
+        backend.release.set()
+        results = [future.result(timeout=2) for future in futures]
+
+    assert results == ["你好/wav".encode("utf-8")] * 4
+    assert backend.calls == 1
+    assert service.stats()["in_flight"] == 0
+
+    # 之後的相同請求直接命中緩存
+    assert service.synthesize("你好", audio_format="wav") == results[0]
+    assert backend.calls == 1
+
+
+def test_different_formats_are_not_merged(service):
+    backend = service.azure
+    backend.release.set()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(lambda fmt: service.synthesize("你好", audio_format=fmt), ["wav", "ogg"]))
+
+    assert results == ["你好/wav".encode("utf-8"), "你好/ogg".encode("utf-8")]
+    assert backend.calls == 2
+    assert service.stats()["single_flight_joins"] == 0
+
+
+def test_waiter_retries_when_leader_turn_is_cancelled(service):
+    backend = service.azure
+    leader_turn = TurnContext()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(service.synthesize, "你好", None, leader_turn, "wav")
+        assert backend.started.wait(2)
+        waiter = pool.submit(service.synthesize, "你好", None, None, "wav")
+        assert wait_for_joins(service, 1) == 1
+
+        leader_turn.cancel()
+        backend.release.set()
+        assert leader.result(timeout=2) is None
+        # 等待者不屬於被取消的輪次，重新發起合成並得到結果
+        assert waiter.result(timeout=2) == "你好/wav".encode("utf-8")
+
+    assert backend.calls == 2
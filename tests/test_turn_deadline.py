@@ -0,0 +1,140 @@
+"""每輪對話時間預算的上限測試
+
+LLM 和 TTS 以掛起或失敗的替身代替，檢查 get_response + generate_tts 在
+TURN_DEADLINE + TTS_MIN_BUDGET 內返回備用回應，不會因外部調用無限等待。
+
+用法: python -m pytest -q tests/test_turn_deadline.py
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_audio
+import turn_context
+from chatbot import ChatBot
+from turn_context import TurnContext, TurnDeadlineExceeded, TURN_TIMEOUT_REPLY, run_with_deadline
+
+TURN_DEADLINE = 1.0
+TTS_MIN_BUDGET = 0.5
+# 線程調度和日誌輸出的餘量
+SLACK = 0.5
+
+LLM_FAILURE_REPLY = "抱歉，我無法處理您的請求。"
+
+
+class _ChatMemory:
+    def __init__(self):
+        self.messages = []
+
+
+class _Memory:
+    def __init__(self):
+        self.chat_memory = _ChatMemory()
+
+    def clear(self):
+        self.chat_memory.messages = []
+
+
+class _Conversation:
+    """LLM 替身: hang 時阻塞到測試結束，否則拋出異常"""
+
+    def __init__(self, hang, release):
+        self.hang = hang
+        self.release = release
+
+    def predict(self, input):
+        if self.hang:
+            self.release.wait()
+            return "太遲的回應"
+        raise RuntimeError("LLM 不可用")
+
+
+class _TTSService:
+    """TTS 替身: 每句返回永不完成或已失敗的 Future"""
+
+    def __init__(self, hang):
+        self.hang = hang
+
+    def synthesize_chunks(self, text, voice=None, turn=None, audio_format=None):
+        future = Future()
+        if not self.hang:
+            future.set_exception(RuntimeError("TTS 不可用"))
+        return [(text, future)]
+
+
+def make_chatbot(conversation):
+    """不連接任何外部服務的 ChatBot，只設置 get_response 的 GPT 路徑需要的屬性"""
+    bot = ChatBot.__new__(ChatBot)
+    bot.llm_max_attempts = 2
+    bot.llm_request_timeout = 15
+    bot.gpt_min_interval = 0
+    bot._gpt_lock = threading.Lock()
+    bot._last_gpt_request = 0.0
+    bot.action_tools_enabled = False
+    bot.should_stop = True
+    bot.action_queue = Queue()
+    bot.memory = _Memory()
+    bot.conversation = conversation
+    bot.knowledge_base = {"general_qa": {}}
+    bot.single_digit_actions = {}
+    bot.double_digit_actions = {}
+    return bot
+
+
+@pytest.fixture
+def release():
+    """測試結束時放行掛起的 LLM 調用，釋放工作線程"""
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+@pytest.mark.parametrize("llm_hangs, tts_hangs", [
+    (True, True),
+    (True, False),
+    (False, True),
+    (False, False),
+])
+def test_turn_returns_fallback_within_deadline(monkeypatch, release, llm_hangs, tts_hangs):
+    monkeypatch.setattr(app_audio, "TTS_MIN_BUDGET", TTS_MIN_BUDGET)
+    monkeypatch.setattr(app_audio, "get_tts_service", lambda: _TTSService(tts_hangs))
+    bot = make_chatbot(_Conversation(llm_hangs, release))
+
+    turn = TurnContext(TURN_DEADLINE)
+    start = time.monotonic()
+    reply = bot.get_response("講個故事俾我聽", turn=turn)
+    audio_url = app_audio.generate_tts(reply, turn=turn)
+    elapsed = time.monotonic() - start
+
+    assert reply == (TURN_TIMEOUT_REPLY if llm_hangs else LLM_FAILURE_REPLY)
+    assert audio_url is None
+    assert elapsed <= TURN_DEADLINE + TTS_MIN_BUDGET + SLACK
+
+
+def test_abandoned_calls_do_not_queue_later_turns(monkeypatch, release):
+    monkeypatch.setattr(turn_context, "TURN_MAX_ABANDONED_CALLS", 2)
+
+    for _ in range(2):
+        with pytest.raises(TurnDeadlineExceeded):
+            run_with_deadline(release.wait, TurnContext(0.2))
+    assert turn_context.abandoned_calls() == 2
+
+    # 名額已滿: 新的調用立即按超時處理，而不是排隊等待被佔用的工作線程
+    start = time.monotonic()
+    with pytest.raises(TurnDeadlineExceeded):
+        run_with_deadline(lambda: "ok", TurnContext(TURN_DEADLINE))
+    assert time.monotonic() - start < 0.1
+
+    # 掛起的調用結束後釋放名額
+    release.set()
+    deadline = time.monotonic() + 1
+    while turn_context.abandoned_calls() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert run_with_deadline(lambda: "ok", TurnContext(TURN_DEADLINE)) == "ok"
@@ -0,0 +1,749 @@
+import abc
+import io
+import os
+import re
+import wave
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from queue import Queue, Empty
+from azure.cognitiveservices.speech import (
+    SpeechConfig, SpeechSynthesizer, SpeechSynthesisOutputFormat, Connection, ResultReason
+)
+import config
+from audio_store import concat_ogg_opus
+
+# 默認語音
+DEFAULT_VOICE = getattr(config, "TTS_VOICE", "zh-HK-WanLungNeural")
+
+# 每種語音保持的 SpeechSynthesizer 數量
+TTS_POOL_SIZE = getattr(config, "TTS_POOL_SIZE", 2)
+# 連接池已滿時等待空閒 synthesizer 的最長時間（秒）
+TTS_POOL_CHECKOUT_TIMEOUT = getattr(config, "TTS_POOL_CHECKOUT_TIMEOUT", 10)
+
+# TTS 緩存目錄與磁盤字節預算
+TTS_CACHE_DIR = getattr(config, "TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_BYTES = getattr(config, "TTS_CACHE_MAX_BYTES", 100 * 1024 * 1024)
+
+# 啟動時預先合成常用語句的線程數，預先合成使用同樣數量的獨立 synthesizer，不佔用實時請求的連接池
+TTS_PRERENDER_WORKERS = getattr(config, "TTS_PRERENDER_WORKERS", 2)
+
+# TTS 後端路由：Azure 平均延遲預算（秒）、判定不可用的連續失敗次數、恢復探測間隔（秒）
+TTS_LATENCY_BUDGET = getattr(config, "TTS_LATENCY_BUDGET", 3.0)
+TTS_FAILURE_THRESHOLD = getattr(config, "TTS_FAILURE_THRESHOLD", 2)
+TTS_PROBE_INTERVAL = getattr(config, "TTS_PROBE_INTERVAL", 30)
+TTS_LOCAL_FALLBACK_ENABLED = getattr(config, "TTS_LOCAL_FALLBACK_ENABLED", True)
+
+# 可協商的 TTS 輸出格式: 名稱 -> (Azure 輸出格式, MIME 類型)
+AUDIO_FORMATS = {
+    "ogg": ("Ogg16Khz16BitMonoOpus", "audio/ogg"),
+    "mp3": ("Audio16Khz32KBitRateMonoMp3", "audio/mpeg"),
+    "wav": ("Riff16Khz16BitMonoPcm", "audio/wav"),
+}
+
+# 客戶端同時支持多種格式時的優先順序（體積由小到大）
+TTS_FORMAT_PREFERENCE = getattr(config, "TTS_FORMAT_PREFERENCE", ("ogg", "mp3", "wav"))
+
+# 未聲明解碼能力的客戶端使用的格式，保持與舊客戶端兼容
+DEFAULT_AUDIO_FORMAT = "wav"
+
+# 啟動時預熱連接池並預先合成常用語句的格式
+TTS_WARM_FORMATS = getattr(config, "TTS_WARM_FORMATS", (DEFAULT_AUDIO_FORMAT, "ogg"))
+
+
+def negotiate_audio_format(supported_formats):
+    """按服務端優先順序選擇客戶端支持的格式，沒有交集時使用 WAV"""
+    supported = {str(fmt).lower() for fmt in supported_formats or []}
+    for audio_format in TTS_FORMAT_PREFERENCE:
+        if audio_format in supported and audio_format in AUDIO_FORMATS:
+            return audio_format
+    return DEFAULT_AUDIO_FORMAT
+
+
+def get_mimetype(audio_format):
+    """返回格式對應的 MIME 類型"""
+    return AUDIO_FORMATS.get(audio_format, AUDIO_FORMATS[DEFAULT_AUDIO_FORMAT])[1]
+
+
+# 所有 TTS 請求共用的工作線程數，以及同時發往 Azure 的最大請求數
+TTS_WORKER_THREADS = getattr(config, "TTS_WORKER_THREADS", 4)
+TTS_AZURE_MAX_CONCURRENCY = getattr(config, "TTS_AZURE_MAX_CONCURRENCY", 4)
+
+# 分句合成時過短句子合併的最少字數
+TTS_CHUNK_MIN_CHARS = getattr(config, "TTS_CHUNK_MIN_CHARS", 8)
+
+# 句末標點（保留在句子中）
+_SENTENCE_END = re.compile(r"(?<=[。！？；!?;…\n])|(?<=[.])(?=\s)")
+
+
+def split_sentences(text, min_chars=TTS_CHUNK_MIN_CHARS):
+    """按句末標點把文本切成句子，過短的句子併入下一句"""
+    sentences = []
+    buffer = ""
+    for part in _SENTENCE_END.split(text):
+        buffer += part
+        if len(buffer.strip()) >= min_chars:
+            sentences.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        if sentences:
+            sentences[-1] += buffer.rstrip()
+        else:
+            sentences.append(buffer.strip())
+    return sentences
+
+
+def concat_audio(chunks, audio_format=DEFAULT_AUDIO_FORMAT):
+    """把多段相同格式的音頻拼接成一段
+
+    WAV 需要重寫文件頭；MP3 幀流可以直接拼接；Ogg Opus 重新封裝為單一邏輯流，
+    避免只支持單一邏輯流的瀏覽器解碼器在第一句後停止播放。
+    """
+    if audio_format == "wav":
+        return concat_wav(chunks)
+    if audio_format == "ogg":
+        try:
+            return concat_ogg_opus(chunks)
+        except Exception as e:
+            logging.warning(f"重新封裝 Ogg Opus 失敗，改為鏈式拼接: {e}")
+    return b"".join(chunks)
+
+
+def concat_wav(chunks):
+    """把多段相同格式的 WAV 音頻拼接成一個 WAV 文件"""
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        for index, chunk in enumerate(chunks):
+            with wave.open(io.BytesIO(chunk), "rb") as reader:
+                if index == 0:
+                    writer.setparams(reader.getparams())
+                writer.writeframes(reader.readframes(reader.getnframes()))
+    return output.getvalue()
+
+
+def create_azure_synthesizer(voice, audio_format=DEFAULT_AUDIO_FORMAT):
+    """創建輸出到內存的 Azure SpeechSynthesizer，並預先建立連接"""
+    speech_config = SpeechConfig(
+        subscription=config.AZURE_SPEECH_API_KEY,
+        region=config.AZURE_SPEECH_REGION
+    )
+    speech_config.speech_synthesis_voice_name = voice
+    speech_config.set_speech_synthesis_output_format(
+        getattr(SpeechSynthesisOutputFormat, AUDIO_FORMATS[audio_format][0]))
+
+    # audio_config=None 表示合成結果只保存在 result.audio_data 中
+    synthesizer = SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+
+    # 預先打開到服務端的連接，避免第一次合成時才握手
+    connection = Connection.from_speech_synthesizer(synthesizer)
+    connection.open(True)
+    synthesizer.connection = connection  # 保持引用，避免連接被回收
+    return synthesizer
+
+
+class SynthesizerPool:
+    """按 (語音, 輸出格式) 分組的 SpeechSynthesizer 池，支持線程安全的借出與歸還"""
+
+    def __init__(self, size=TTS_POOL_SIZE, factory=None):
+        self.size = size
+        self.factory = factory or create_azure_synthesizer
+        self._idle = {}      # (voice, format) -> Queue[synthesizer]
+        self._created = {}   # (voice, format) -> 已創建數量
+        self._lock = threading.Lock()
+
+    def _get_queue(self, key):
+        with self._lock:
+            if key not in self._idle:
+                self._idle[key] = Queue()
+                self._created[key] = 0
+            return self._idle[key]
+
+    def _reserve_slot(self, key):
+        """如未達上限則預留一個創建名額"""
+        with self._lock:
+            if self._created[key] < self.size:
+                self._created[key] += 1
+                return True
+            return False
+
+    def _release_slot(self, key):
+        with self._lock:
+            self._created[key] -= 1
+
+    def warm_up(self, voice=DEFAULT_VOICE, audio_format=DEFAULT_AUDIO_FORMAT):
+        """預先創建該語音和格式的全部 synthesizer"""
+        key = (voice, audio_format)
+        idle = self._get_queue(key)
+        while self._reserve_slot(key):
+            try:
+                idle.put(self.factory(voice, audio_format))
+            except Exception:
+                self._release_slot(key)
+                raise
+        logging.info(f"TTS 連接池已預熱: {voice}/{audio_format} x {self.size}")
+
+    @contextmanager
+    def checkout(self, voice=DEFAULT_VOICE, audio_format=DEFAULT_AUDIO_FORMAT, timeout=TTS_POOL_CHECKOUT_TIMEOUT):
+        """借出一個 synthesizer，使用完畢自動歸還
+
+        合成出錯時丟棄該 synthesizer（連接可能已失效），下次按需重新創建。
+        全部 synthesizer 都在使用中且 timeout 秒內沒有歸還時拋出 queue.Empty。
+        """
+        key = (voice, audio_format)
+        idle = self._get_queue(key)
+        try:
+            synthesizer = idle.get_nowait()
+        except Empty:
+            if self._reserve_slot(key):
+                try:
+                    synthesizer = self.factory(voice, audio_format)
+                except Exception:
+                    self._release_slot(key)
+                    raise
+            else:
+                synthesizer = idle.get(timeout=timeout)
+
+        try:
+            yield synthesizer
+        except Exception:
+            self._release_slot(key)
+            raise
+        else:
+            idle.put(synthesizer)
+
+
+class TTSCache:
+    """按 (文本, 語音, 格式) 內容尋址的磁盤 TTS 緩存
+
+    超出字節預算時按最近最少使用 (LRU) 淘汰，文件修改時間用於在重啟後恢復 LRU 順序。
+    """
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # 文件名 -> 字節數，按使用時間排序
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(text, voice, audio_format="wav"):
+        """生成緩存鍵，格式名同時作為文件擴展名"""
+        digest = hashlib.sha256(f"{voice}\0{audio_format}\0{text}".encode("utf-8")).hexdigest()
+        return f"{digest}.{audio_format}"
+
+    def _load_index(self):
+        """掃描緩存目錄，按修改時間重建 LRU 索引"""
+        files = []
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if os.path.isfile(path) and not filename.endswith(".tmp"):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, filename, stat.st_size))
+
+        with self._lock:
+            for _, filename, size in sorted(files):
+                self._entries[filename] = size
+                self._total_bytes += size
+            self._evict_locked()
+        logging.info(f"TTS 緩存已加載: {len(self._entries)} 個文件, {self._total_bytes} 字節")
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            filename, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError as e:
+                logging.warning(f"刪除 TTS 緩存文件失敗 {filename}: {e}")
+
+    def contains(self, key):
+        """檢查緩存中是否存在該鍵，不影響命中統計和 LRU 順序"""
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """讀取緩存的音頻數據，未命中返回 None"""
+        path = os.path.join(self.directory, key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            # 文件在讀取前被淘汰或刪除
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+                self.hits -= 1
+                self.misses += 1
+            return None
+
+    def put(self, key, data):
+        """寫入緩存，先寫臨時文件再原子替換，避免並發讀到半個文件"""
+        if not data or len(data) > self.max_bytes:
+            return
+        path = os.path.join(self.directory, key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"寫入 TTS 緩存失敗: {e}")
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def stats(self):
+        """返回緩存統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+class TTSBackend(abc.ABC):
+    """TTS 後端接口：synthesize 成功時返回音頻數據，失敗時拋出異常"""
+
+    name = "base"
+
+    def cache_voice(self, voice):
+        """緩存鍵中使用的語音名稱，不同後端的音頻不能互相替代"""
+        return f"{self.name}:{voice}"
+
+    def warm_up(self, voice, audio_format):
+        pass
+
+    @abc.abstractmethod
+    def synthesize(self, text, voice, audio_format, turn=None):
+        """合成一句文本，返回 audio_format 格式的音頻數據"""
+
+
+class AzureTTSBackend(TTSBackend):
+    """Azure 語音合成，synthesizer 從連接池借用"""
+
+    name = "azure"
+
+    def __init__(self, pool, max_concurrency=TTS_AZURE_MAX_CONCURRENCY):
+        self.pool = pool
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def cache_voice(self, voice):
+        return voice
+
+    def warm_up(self, voice, audio_format):
+        self.pool.warm_up(voice, audio_format)
+
+    def synthesize(self, text, voice, audio_format, turn=None):
+        # 等待並發名額和空閒 synthesizer 的總時間不超過本輪剩餘預算
+        wait = TTS_POOL_CHECKOUT_TIMEOUT if turn is None else turn.timeout(TTS_POOL_CHECKOUT_TIMEOUT)
+        deadline = time.monotonic() + wait
+        if not self._semaphore.acquire(timeout=wait):
+            # 並發名額被掛起的請求佔滿，交由路由器改用備用後端
+            raise RuntimeError(f"等待 Azure TTS 並發名額超過 {wait:.1f} 秒")
+        try:
+            with self.pool.checkout(voice, audio_format, max(0.0, deadline - time.monotonic())) as synthesizer:
+                finished = threading.Event()
+                if turn is not None:
+                    turn.add_cancel_callback(
+                        lambda: None if finished.is_set() else synthesizer.stop_speaking_async())
+                try:
+                    result = synthesizer.speak_text_async(text).get()
+                finally:
+                    finished.set()
+
+                if result.reason != ResultReason.SynthesizingAudioCompleted:
+                    # 在借用範圍內拋出，連接可能已失效的 synthesizer 不再歸還
+                    raise RuntimeError(f"Azure TTS 合成失敗: {result.reason}")
+        except Empty:
+            # 連接池被佔滿，交由路由器改用備用後端
+            raise RuntimeError(f"等待空閒的 Azure synthesizer 超過 {wait:.1f} 秒") from None
+        finally:
+            self._semaphore.release()
+        return result.audio_data
+
+
+class LocalTTSBackend(TTSBackend):
+    """使用 pyttsx3 的本地離線語音合成，輸出轉換為與 Azure 相同的 16kHz 單聲道格式
+
+    sapi5 / nsss 驅動要求引擎只在創建它的線程上使用，因此引擎在一個專用線程中創建和運行，
+    其他 TTS 工作線程通過隊列提交請求並等待結果。
+    """
+
+    name = "local"
+
+    def __init__(self, rate=150):
+        self.rate = rate
+        self._requests = Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def cache_voice(self, voice):
+        return "pyttsx3"
+
+    def _ensure_worker(self):
+        """首次使用時啟動引擎線程"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._engine_worker, name="pyttsx3", daemon=True)
+                self._thread.start()
+
+    def _engine_worker(self):
+        """引擎線程：創建 pyttsx3 引擎，逐個處理隊列中的 (文本, 輸出路徑, Future)"""
+        engine = None
+        while True:
+            text, path, future = self._requests.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if engine is None:
+                    import pyttsx3
+                    engine = pyttsx3.init()
+                    engine.setProperty('rate', self.rate)
+                if text is not None:
+                    engine.save_to_file(text, path)
+                    engine.runAndWait()
+                future.set_result(path)
+            except Exception as e:
+                future.set_exception(e)
+
+    def _submit(self, text, path=None):
+        self._ensure_worker()
+        future = Future()
+        self._requests.put((text, path, future))
+        return future
+
+    def warm_up(self, voice, audio_format):
+        # 文本為 None 時只在引擎線程上初始化引擎
+        self._submit(None).result()
+
+    def synthesize(self, text, voice, audio_format, turn=None):
+        from pydub import AudioSegment
+        import tempfile
+
+        fd, temp_path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            self._submit(text, temp_path).result()
+            audio = AudioSegment.from_file(temp_path, format="wav")
+        finally:
+            os.remove(temp_path)
+
+        # 統一採樣率和聲道，才能與 Azure 合成的分句拼接
+        audio = audio.set_frame_rate(16000).set_channels(1).set_sample_width(2)
+        output = io.BytesIO()
+        if audio_format == "ogg":
+            audio.export(output, format="ogg", codec="libopus")
+        else:
+            audio.export(output, format=audio_format)
+        return output.getvalue()
+
+
+class BackendStats:
+    """單個後端的實時延遲與錯誤統計"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.ewma_latency = None
+        self.last_attempt_at = 0.0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "consecutive_errors": self.consecutive_errors,
+            "ewma_latency": round(self.ewma_latency, 3) if self.ewma_latency is not None else None
+        }
+
+
+class TTSRouter:
+    """按實時延遲和錯誤統計選擇 TTS 後端
+
+    主後端（Azure）的平均延遲超出預算或連續失敗時，請求改由備用後端（本地引擎）處理；
+    每隔 probe_interval 秒仍讓一個請求先嘗試主後端，以便在恢復後切回。
+    """
+
+    def __init__(self, primary, fallback=None, latency_budget=None,
+                 failure_threshold=None, probe_interval=None, smoothing=0.3):
+        self.primary = primary
+        self.fallback = fallback
+        self.latency_budget = latency_budget or TTS_LATENCY_BUDGET
+        self.failure_threshold = failure_threshold or TTS_FAILURE_THRESHOLD
+        self.probe_interval = probe_interval or TTS_PROBE_INTERVAL
+        self.smoothing = smoothing
+        self._stats = {backend.name: BackendStats() for backend in (primary, fallback) if backend}
+        self._lock = threading.Lock()
+
+    def _primary_degraded(self):
+        stats = self._stats[self.primary.name]
+        if stats.consecutive_errors >= self.failure_threshold:
+            return True
+        return stats.ewma_latency is not None and stats.ewma_latency > self.latency_budget
+
+    def order(self):
+        """返回本次請求嘗試後端的順序"""
+        if self.fallback is None:
+            return [self.primary]
+        with self._lock:
+            stats = self._stats[self.primary.name]
+            if self._primary_degraded():
+                if time.monotonic() - stats.last_attempt_at < self.probe_interval:
+                    return [self.fallback, self.primary]
+                # 探測主後端是否已恢復
+                stats.last_attempt_at = time.monotonic()
+            return [self.primary, self.fallback]
+
+    def record(self, backend, latency=None, error=False):
+        """記錄一次調用結果"""
+        with self._lock:
+            stats = self._stats[backend.name]
+            stats.calls += 1
+            stats.last_attempt_at = time.monotonic()
+            if error:
+                stats.errors += 1
+                stats.consecutive_errors += 1
+                return
+            stats.consecutive_errors = 0
+            if stats.ewma_latency is None:
+                stats.ewma_latency = latency
+            else:
+                stats.ewma_latency += self.smoothing * (latency - stats.ewma_latency)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "latency_budget": self.latency_budget,
+                "primary_degraded": self._primary_degraded(),
+                "backends": {name: stats.to_dict() for name, stats in self._stats.items()}
+            }
+
+
+class TTSService:
+    """文字轉語音服務，持有長期復用的 synthesizer 連接池、內容緩存和後端路由"""
+
+    def __init__(self, voice=DEFAULT_VOICE, pool_size=TTS_POOL_SIZE, synthesizer_factory=None,
+                 cache=None, local_backend=None):
+        self.voice = voice
+        self.pool = SynthesizerPool(pool_size, synthesizer_factory)
+        self.cache = cache or TTSCache()
+        self.azure = AzureTTSBackend(self.pool)
+        # 預先合成專用的連接池，與實時請求互不爭用
+        self.prerender_azure = AzureTTSBackend(
+            SynthesizerPool(TTS_PRERENDER_WORKERS, synthesizer_factory), max_concurrency=TTS_PRERENDER_WORKERS)
+        if local_backend is None and TTS_LOCAL_FALLBACK_ENABLED:
+            local_backend = LocalTTSBackend()
+        self.router = TTSRouter(self.azure, local_backend)
+        self.executor = ThreadPoolExecutor(
+            max_workers=TTS_WORKER_THREADS, thread_name_prefix="tts_worker")
+        # 進行中的合成：(文本, 語音, 格式) -> Future，相同請求共享一次合成
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self.single_flight_joins = 0
+        self.prerender_status = {
+            "running": False, "total": 0, "done": 0,
+            "rendered": 0, "skipped": 0, "failed": 0
+        }
+
+    def warm_up(self, audio_formats=TTS_WARM_FORMATS):
+        """預熱默認語音在各格式下的連接池"""
+        for audio_format in audio_formats:
+            try:
+                self.azure.warm_up(self.voice, audio_format)
+            except Exception as e:
+                logging.error(f"預熱 TTS 連接池失敗 ({audio_format}): {e}")
+
+    def _is_cached(self, text, voice, audio_format):
+        """任一後端合成的音頻已在緩存中"""
+        backends = [self.router.primary, self.router.fallback]
+        return any(self.cache.contains(self.cache.make_key(text, backend.cache_voice(voice), audio_format))
+                   for backend in backends if backend is not None)
+
+    def _prerender_one(self, text, voice, audio_format):
+        """用預先合成專用的 synthesizer 合成一句並寫入緩存"""
+        audio_data = self.prerender_azure.synthesize(text, voice, audio_format)
+        self.cache.put(self.cache.make_key(text, voice, audio_format), audio_data)
+        return audio_data
+
+    def prerender(self, phrases, voice=None, audio_formats=TTS_WARM_FORMATS,
+                  max_workers=TTS_PRERENDER_WORKERS):
+        """在有界線程池中按各格式預先合成語句，已在緩存中的語句直接跳過
+
+        語句按 split_sentences 分句後合成，與 synthesize_chunks 查找緩存時使用的鍵一致。
+        合成使用獨立的連接池，不與實時請求爭用 synthesizer；失敗的句子不改用本地後端。
+        進度記錄在 prerender_status 中，並定期寫入日誌。
+        """
+        voice = voice or self.voice
+        sentences = list(dict.fromkeys(
+            sentence for text in phrases if text for sentence in split_sentences(text)))
+        tasks = [(text, audio_format) for audio_format in audio_formats for text in sentences]
+        pending = [(text, audio_format) for text, audio_format in tasks
+                   if not self._is_cached(text, voice, audio_format)]
+        status = self.prerender_status
+        status.update(running=True, total=len(tasks), done=len(tasks) - len(pending),
+                      rendered=0, skipped=len(tasks) - len(pending), failed=0)
+        logging.info(f"開始預先合成 TTS: 共 {len(tasks)} 句，需合成 {len(pending)} 句")
+        start_time = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts_prerender") as executor:
+            futures = {executor.submit(self._prerender_one, text, voice, audio_format): text
+                       for text, audio_format in pending}
+            for future in as_completed(futures):
+                try:
+                    if future.result():
+                        status["rendered"] += 1
+                    else:
+                        status["failed"] += 1
+                except Exception as e:
+                    status["failed"] += 1
+                    logging.warning(f"預先合成失敗 '{futures[future][:20]}': {e}")
+                status["done"] += 1
+                if status["done"] % 10 == 0 or status["done"] == status["total"]:
+                    logging.info(f"TTS 預先合成進度: {status['done']}/{status['total']}")
+
+        status["running"] = False
+        logging.info(f"TTS 預先合成完成: 合成 {status['rendered']} 句，跳過 {status['skipped']} 句，"
+                     f"失敗 {status['failed']} 句，耗時 {time.perf_counter() - start_time:.1f}秒")
+        return dict(status)
+
+    def synthesize_chunks(self, text, voice=None, turn=None, audio_format=DEFAULT_AUDIO_FORMAT):
+        """把文本分句後並行合成，按句子順序返回 [(句子, Future)]
+
+        並行度受共用工作線程數限制，每個 Future 的結果為該句的音頻數據。
+        """
+        return [(sentence, self.submit(sentence, voice, turn, audio_format))
+                for sentence in split_sentences(text)]
+
+    def submit(self, text, voice=None, turn=None, audio_format=DEFAULT_AUDIO_FORMAT):
+        """在共用工作線程池中合成，返回 Future"""
+        return self.executor.submit(self.synthesize, text, voice, turn, audio_format)
+
+    def stats(self):
+        """返回進行中合成和單飛合併的統計"""
+        with self._in_flight_lock:
+            return {
+                "in_flight": len(self._in_flight),
+                "single_flight_joins": self.single_flight_joins
+            }
+
+    def synthesize(self, text, voice=None, turn=None, audio_format=DEFAULT_AUDIO_FORMAT):
+        """合成語音並返回指定格式的音頻數據，失敗時返回 None
+
+        相同 (文本, 語音, 格式) 的並發請求只合成一次，其餘請求等待並共享結果。
+        如果負責合成的請求被取消，仍在等待且未被取消的請求會重新發起合成。
+
+        Args:
+            text: 要轉換為語音的文本
+            voice: 語音名稱，默認使用服務的語音
+            turn: 本輪對話的 TurnContext，被取消時中止合成
+            audio_format: 輸出格式，見 AUDIO_FORMATS
+        """
+        voice = voice or self.voice
+        flight_key = (text, voice, audio_format)
+
+        while True:
+            cached = self.cache.get(self.cache.make_key(text, voice, audio_format))
+            if cached is not None:
+                logging.info(f"TTS 緩存命中: {text[:20]}")
+                return cached
+
+            with self._in_flight_lock:
+                future = self._in_flight.get(flight_key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._in_flight[flight_key] = future
+                else:
+                    self.single_flight_joins += 1
+
+            if leader:
+                audio_data = None
+                try:
+                    audio_data = self._render(text, voice, turn, audio_format)
+                finally:
+                    with self._in_flight_lock:
+                        del self._in_flight[flight_key]
+                    future.leader_cancelled = turn is not None and turn.cancelled
+                    future.set_result(audio_data)
+                return audio_data
+
+            logging.info(f"TTS 合併相同請求: {text[:20]}")
+            audio_data = future.result()
+            if audio_data is not None or not future.leader_cancelled:
+                return audio_data
+            if turn is not None and turn.cancelled:
+                return None
+
+    def _render(self, text, voice, turn, audio_format):
+        """按路由器給出的順序嘗試各後端，前一個後端失敗時立即改用下一個"""
+        for backend in self.router.order():
+            cache_key = self.cache.make_key(text, backend.cache_voice(voice), audio_format)
+            if backend is not self.azure:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+            start_time = time.perf_counter()
+            try:
+                audio_data = backend.synthesize(text, voice, audio_format, turn)
+            except Exception as e:
+                if turn is not None and turn.cancelled:
+                    return None
+                self.router.record(backend, error=True)
+                logging.error(f"TTS 後端 {backend.name} 合成失敗: {e}")
+                continue
+
+            elapsed = time.perf_counter() - start_time
+            self.router.record(backend, latency=elapsed)
+            logging.info(f"TTS 合成完成 ({backend.name})，耗時 {elapsed:.2f}秒，"
+                         f"大小 {len(audio_data)} 字節")
+            self.cache.put(cache_key, audio_data)
+            return audio_data
+
+        return None
+
+
+_tts_service = None
+_tts_service_lock = threading.Lock()
+
+
+def get_tts_service():
+    """獲取全局 TTS 服務實例"""
+    global _tts_service
+    with _tts_service_lock:
+        if _tts_service is None:
+            _tts_service = TTSService()
+        return _tts_service
@@ -0,0 +1,221 @@
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED
+from concurrent.futures import wait as wait_futures
+import config
+
+# 每輪對話的默認時間預算（秒）
+DEFAULT_TURN_BUDGET = getattr(config, "TURN_DEADLINE_SECONDS", 20)
+
+# 超出時間預算時的快速備用回應
+TURN_TIMEOUT_REPLY = "抱歉，我諗得太耐，請你再講多一次。"
+
+# 用於執行帶超時的外部調用（LLM、搜索、視覺、TTS）
+TURN_WORKER_THREADS = getattr(config, "TURN_WORKER_THREADS", 16)
+_executor = ThreadPoolExecutor(max_workers=TURN_WORKER_THREADS, thread_name_prefix="turn")
+
+# 超時後被放棄但仍在運行的調用最多可佔用的工作線程數。
+# Python 無法中止已在運行的線程，被放棄的調用會一直佔用工作線程，直到客戶端自身的
+# HTTP 超時（LLM_REQUEST_TIMEOUT、SEARCH_REQUEST_TIMEOUT、VISION_TIMEOUT）結束該請求；
+# 達到上限後新的調用立即按超時處理並使用備用回應，不在隊列中等待，保證每輪的最長時間不變。
+TURN_MAX_ABANDONED_CALLS = getattr(config, "TURN_MAX_ABANDONED_CALLS", TURN_WORKER_THREADS // 2)
+_abandoned_calls = 0
+_abandoned_lock = threading.Lock()
+
+
+class TurnDeadlineExceeded(Exception):
+    """本輪對話已超出時間預算"""
+    pass
+
+
+class TurnCancelled(TurnDeadlineExceeded):
+    """本輪對話已被同一會話的新輸入取代"""
+    pass
+
+
+class TurnContext:
+    """單輪對話的上下文，記錄本輪的截止時間
+
+    從收到用戶輸入開始計時，傳遞給 LLM、搜索、視覺和 TTS 調用，
+    各調用只使用剩餘的時間預算。
+    """
+
+    def __init__(self, budget_seconds=None, session_id=None):
+        self.budget = budget_seconds or DEFAULT_TURN_BUDGET
+        self.session_id = session_id
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + self.budget
+
+        # 取消狀態：以 Future 表示，便於與其他 Future 一起等待
+        self._cancel_future = Future()
+        self._cancel_callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        """本輪是否已被取消"""
+        return self._cancel_future.done()
+
+    def cancel(self):
+        """取消本輪，並執行已登記的取消回調"""
+        with self._lock:
+            if self._cancel_future.done():
+                return
+            self._cancel_future.set_result(True)
+            callbacks, self._cancel_callbacks = self._cancel_callbacks, []
+
+        logging.info(f"已取消會話 {self.session_id} 的上一輪對話 (已用時 {self.elapsed():.1f}秒)")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.warning(f"執行取消回調時出錯: {e}")
+
+    def add_cancel_callback(self, callback):
+        """登記取消時要執行的回調，如已取消則立即執行"""
+        with self._lock:
+            if not self._cancel_future.done():
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        """如本輪已被取消則拋出 TurnCancelled"""
+        if self.cancelled:
+            raise TurnCancelled("本輪對話已被新的輸入取代")
+
+    def elapsed(self):
+        """本輪已用時間（秒）"""
+        return time.monotonic() - self.started_at
+
+    def remaining(self):
+        """本輪剩餘時間（秒），已取消時為 0"""
+        if self.cancelled:
+            return 0.0
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        """是否已超出時間預算"""
+        return self.remaining() <= 0
+
+    def timeout(self, cap=None, floor=0.0):
+        """計算下一個調用可用的超時時間
+
+        Args:
+            cap: 單個調用的最長超時時間
+            floor: 最短超時時間，用於保證備用回應仍可生成語音
+        """
+        timeout = self.remaining()
+        if cap is not None:
+            timeout = min(timeout, cap)
+        return max(timeout, floor)
+
+
+def wait_future(future, turn, cap=None, floor=0.0):
+    """在本輪剩餘時間內等待 Future 的結果
+
+    超時拋出 TurnDeadlineExceeded，本輪被取消時立即拋出 TurnCancelled。
+    """
+    if turn is None:
+        return future.result(timeout=cap)
+
+    turn.check()
+    timeout = turn.timeout(cap, floor)
+    if timeout <= 0:
+        future.cancel()
+        raise TurnDeadlineExceeded("本輪時間預算已用完")
+
+    wait_futures([future, turn._cancel_future], timeout=timeout, return_when=FIRST_COMPLETED)
+    if future.done():
+        return future.result()
+
+    future.cancel()
+    turn.check()
+    logging.warning(f"調用超時 ({timeout:.1f}秒)，本輪已用時 {turn.elapsed():.1f}秒")
+    raise TurnDeadlineExceeded(f"調用超過 {timeout:.1f} 秒未完成")
+
+
+def abandoned_calls():
+    """超時後被放棄但仍佔用工作線程的調用數"""
+    with _abandoned_lock:
+        return _abandoned_calls
+
+
+def _abandon(future):
+    """記錄一個超時後仍在運行的調用，調用結束時釋放名額"""
+    global _abandoned_calls
+    if future.done():
+        return
+
+    def release(_):
+        global _abandoned_calls
+        with _abandoned_lock:
+            _abandoned_calls -= 1
+
+    with _abandoned_lock:
+        _abandoned_calls += 1
+    future.add_done_callback(release)
+
+
+def run_with_deadline(func, turn, *args, cap=None, floor=0.0, **kwargs):
+    """在工作線程中執行 func，最多等待本輪剩餘時間
+
+    turn 為 None 時直接在當前線程執行，保持原有行為。
+    超時的調用不能被中止，func 應自帶 HTTP 超時；被放棄的調用達到
+    TURN_MAX_ABANDONED_CALLS 時直接拋出 TurnDeadlineExceeded。
+    """
+    if turn is None:
+        return func(*args, **kwargs)
+
+    turn.check()
+    if turn.timeout(cap, floor) <= 0:
+        raise TurnDeadlineExceeded("本輪時間預算已用完")
+    if abandoned_calls() >= TURN_MAX_ABANDONED_CALLS:
+        logging.warning(f"{abandoned_calls()} 個超時調用仍佔用工作線程，本次調用直接使用備用回應")
+        raise TurnDeadlineExceeded("工作線程被未完成的超時調用佔用")
+
+    future = _executor.submit(func, *args, **kwargs)
+    try:
+        return wait_future(future, turn, cap, floor)
+    except TurnDeadlineExceeded:
+        _abandon(future)
+        raise
+
+
+class TurnRegistry:
+    """按會話追蹤進行中的對話輪次
+
+    同一會話開始新一輪時，會取消上一輪仍在進行的 LLM、搜索、TTS 和裝飾動作。
+    """
+
+    def __init__(self):
+        self._turns = {}
+        self._lock = threading.Lock()
+
+    def begin(self, session_id, budget_seconds=None):
+        """開始新一輪對話，並取消該會話的上一輪"""
+        turn = TurnContext(budget_seconds, session_id=session_id)
+        with self._lock:
+            previous = self._turns.get(session_id)
+            self._turns[session_id] = turn
+        if previous is not None:
+            previous.cancel()
+        return turn
+
+    def cancel(self, session_id):
+        """取消會話當前的對話輪次"""
+        with self._lock:
+            turn = self._turns.pop(session_id, None)
+        if turn is not None:
+            turn.cancel()
+
+    def finish(self, turn):
+        """本輪結束後移除記錄（僅當它仍是該會話的當前輪次）"""
+        with self._lock:
+            if self._turns.get(turn.session_id) is turn:
+                del self._turns[turn.session_id]
+
+
+# 全局對話輪次登記表
+turn_registry = TurnRegistry()
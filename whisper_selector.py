@@ -1,7 +1,167 @@
+import io
 import os
+import time
+import wave
 import logging
-import whisper
+import threading
+import numpy as np
 from openai import AzureOpenAI
+import config
+from model_registry import model_registry
+from audio_preprocess import preprocess, STT_TRIM_SILENCE
+from stt_batcher import get_batch_scheduler, batching_stats, STT_BATCHING_ENABLED, WHISPER_WINDOW_SECONDS
+
+# Whisper 要求的輸入採樣率
+STT_SAMPLE_RATE = 16000
+# 是否把內存中的待轉錄音頻另存到產物存儲，方便排查識別問題
+STT_DEBUG_SAVE_AUDIO = getattr(config, "STT_DEBUG_SAVE_AUDIO", False)
+
+
+# 使用本地 Whisper 模型的模式；local_quantized 在 CPU 上使用動態 int8 量化模型
+LOCAL_MODES = ("local", "local_quantized")
+STT_MODES = LOCAL_MODES + ("azure",)
+
+# 轉錄語言（粵語按 Whisper 的 zh 處理，避免短句語言檢測出錯和額外的檢測開銷）
+STT_LANGUAGE = getattr(config, "STT_LANGUAGE", "zh")
+# auto 解碼配置下，短於此時長（秒）的語音按 command 配置解碼
+STT_COMMAND_MAX_SECONDS = getattr(config, "STT_COMMAND_MAX_SECONDS", 4.0)
+# 指令詞彙提示的最大字數（Whisper 的提示最多約 224 個 token）
+STT_PROMPT_MAX_CHARS = getattr(config, "STT_PROMPT_MAX_CHARS", 150)
+
+# 上傳 Azure 時使用的壓縮格式（flac 無損，ogg 為 Opus 有損，wav 不壓縮），
+# 短於 STT_UPLOAD_COMPRESS_MIN_SECONDS 的音頻編碼開銷大於節省的傳輸時間，仍上傳 WAV
+STT_UPLOAD_FORMAT = getattr(config, "STT_UPLOAD_FORMAT", "flac")
+STT_UPLOAD_COMPRESS_MIN_SECONDS = getattr(config, "STT_UPLOAD_COMPRESS_MIN_SECONDS", 1.5)
+STT_UPLOAD_OPUS_BITRATE = getattr(config, "STT_UPLOAD_OPUS_BITRATE", "24k")
+
+UPLOAD_MIMETYPES = {"wav": "audio/wav", "flac": "audio/flac", "ogg": "audio/ogg"}
+
+# 解碼配置：local 為傳給 Whisper transcribe 的參數，vocabulary_prompt 表示是否以機器人指令詞彙作提示
+DECODING_PROFILES = {
+    "command": {
+        "description": "短指令：貪心解碼、固定語言、不按溫度回退，以動作詞彙作提示",
+        "local": {"temperature": 0.0, "condition_on_previous_text": False},
+        "vocabulary_prompt": True,
+    },
+    "dictation": {
+        "description": "長句聽寫：束搜索，解碼失敗時按溫度回退",
+        "local": {"temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0), "beam_size": 5, "best_of": 5,
+                  "condition_on_previous_text": True},
+        "vocabulary_prompt": False,
+    },
+}
+DECODING_PROFILE_NAMES = tuple(DECODING_PROFILES) + ("auto",)
+
+
+def resolve_decoding_profile(profile, duration=None, context=None):
+    """選擇實際使用的解碼配置
+
+    指定了具體配置時直接使用；auto 時先按對話上下文（command/dictation），
+    再按語音時長選擇，時長未知時使用 dictation。
+    """
+    if profile in DECODING_PROFILES:
+        return profile
+    if context in DECODING_PROFILES:
+        return context
+    if duration is not None and duration <= STT_COMMAND_MAX_SECONDS:
+        return "command"
+    return "dictation"
+
+
+
+
+def load_pcm(audio, sample_rate=STT_SAMPLE_RATE, trim=False):
+    """把音頻轉為 Whisper 所需的 16kHz 單聲道 float32 數組
+
+    Args:
+        audio: numpy 數組（int16 或 float32，多聲道時形狀為 (樣本數, 聲道數)），
+               WAV 字節，其他容器格式的字節（通過 pydub 在內存中解碼），或音頻文件路徑
+        sample_rate: 數組輸入的採樣率，字節輸入以文件頭為準
+        trim: 是否裁剪首尾靜音，見 audio_preprocess.trim_silence
+    """
+    if isinstance(audio, (str, os.PathLike)):
+        with open(audio, "rb") as f:
+            audio = f.read()
+    if isinstance(audio, (bytes, bytearray)):
+        if audio[:4] == b"RIFF":
+            with wave.open(io.BytesIO(audio), "rb") as reader:
+                sample_rate = reader.getframerate()
+                channels = reader.getnchannels()
+                sample_width = reader.getsampwidth()
+                frames = reader.readframes(reader.getnframes())
+        else:
+            # 非 WAV 容器（如瀏覽器錄製的 webm）由 pydub 解碼
+            from pydub import AudioSegment
+            segment = AudioSegment.from_file(io.BytesIO(audio))
+            sample_rate, channels = segment.frame_rate, segment.channels
+            sample_width, frames = segment.sample_width, segment.raw_data
+        dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[sample_width]
+        audio = np.frombuffer(frames, dtype=dtype).reshape(-1, channels)
+        if sample_width == 1:
+            audio = (audio.astype(np.int16) - 128) * 256
+
+    # 聲道混合、重採樣和靜音裁剪都在進程內完成
+    return preprocess(audio, sample_rate, trim=trim)
+
+
+def pcm_to_wav_bytes(samples, sample_rate=STT_SAMPLE_RATE):
+    """把 float32 數組編碼為 16 位 WAV 字節（用於上傳 Azure 和調試保存）"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def encode_upload_audio(samples, audio_format, sample_rate=STT_SAMPLE_RATE):
+    """在內存中把 float32 數組編碼為上傳格式的字節
+
+    優先使用 soundfile（libsndfile，無需子進程），未安裝或不支持該格式時改用 pydub (ffmpeg)。
+    """
+    if audio_format == "wav":
+        return pcm_to_wav_bytes(samples, sample_rate)
+
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    try:
+        import soundfile
+        if audio_format == "flac":
+            soundfile.write(buffer, pcm, sample_rate, format="FLAC", subtype="PCM_16")
+        else:
+            soundfile.write(buffer, pcm, sample_rate, format="OGG", subtype="OPUS")
+        return buffer.getvalue()
+    except Exception as e:
+        logging.debug(f"soundfile 無法編碼 {audio_format}，改用 pydub: {e}")
+
+    from pydub import AudioSegment
+    segment = AudioSegment(pcm.tobytes(), frame_rate=sample_rate, sample_width=2, channels=1)
+    buffer = io.BytesIO()
+    if audio_format == "flac":
+        segment.export(buffer, format="flac")
+    else:
+        segment.export(buffer, format="ogg", codec="libopus", bitrate=STT_UPLOAD_OPUS_BITRATE)
+    return buffer.getvalue()
+
+
+def segment_dicts(segments, duration):
+    """把 Whisper 或 Azure 返回的分段統一為 {start, end, text} 字典列表"""
+    result = []
+    for segment in segments or []:
+        get = segment.get if isinstance(segment, dict) else lambda key: getattr(segment, key, None)
+        result.append({"start": float(get("start") or 0), "end": float(get("end") or duration),
+                       "text": (get("text") or "").strip()})
+    return result
+
+
+def describe_audio(audio):
+    """日誌中使用的音頻描述：文件路徑或內存音頻時長"""
+    if isinstance(audio, np.ndarray):
+        return f"內存音頻 {len(audio) / STT_SAMPLE_RATE:.1f} 秒"
+    return audio
+
 
 def _initialize_azure_client(self):
     """初始化Azure OpenAI客戶端"""
@@ -47,28 +207,86 @@ class SpeechToTextSelector:
         self.local_model_size = config.get("local_whisper_model", "medium")  # 默認使用medium模型
         self.azure_model = config.get("azure_whisper_model", "whisper")  # Azure模型部署名稱
         self.azure_client = None
-        self.local_model = None
-        self.initialized = False
+        self.pending_mode = None  # 正在後台加載、加載完成後切換到的模式
+        self.pending_model_size = None  # 與 pending_mode 一起切換的本地模型大小
+        self.decoding_profile = config.get("decoding_profile", "auto")
+        self.command_prompt = None  # command 配置使用的指令詞彙提示，見 set_command_vocabulary
+        # 各解碼配置的調用次數、轉錄耗時和音頻時長，用於比較延遲
+        self.profile_stats = {
+            name: {"count": 0, "seconds": 0.0, "audio_seconds": 0.0} for name in DECODING_PROFILES
+        }
+        # Azure 上傳格式；後端拒絕壓縮格式時退回 WAV 並記住
+        self.upload_format = STT_UPLOAD_FORMAT if STT_UPLOAD_FORMAT in UPLOAD_MIMETYPES else "wav"
+        self.upload_stats = {"requests": 0, "compressed": 0, "bytes_sent": 0, "wav_bytes": 0}
+
+        # 各後端的加載狀態: idle / loading / ready / error
+        self.backend_status = {
+            mode: {"state": "idle", "model": None, "load_seconds": None, "error": None}
+            for mode in STT_MODES
+        }
+        self._load_lock = threading.Lock()
         
         logging.info(f"初始化STT選擇器，模式: {self.mode}, 本地模型: {self.local_model_size}")
+
+    @property
+    def initialized(self):
+        """當前模式的後端是否已就緒"""
+        return self._is_ready(self.mode)
+
+    def _is_ready(self, mode, model_size=None):
+        if mode in LOCAL_MODES:
+            # 本地模型由共享註冊表管理，閒置卸載後需要重新加載
+            return model_registry.is_loaded(model_size or self.local_model_size,
+                                            quantized=mode == "local_quantized")
+        return self.azure_client is not None
         
     def initialize(self):
-        """懶加載初始化模型，減少啟動時間"""
+        """加載當前模式的後端；如後台預加載正在進行，等待其完成"""
         if self.initialized:
             return
-            
-        if self.mode == "local":
-            self._initialize_local_model()
-        else:
-            self._initialize_azure_client()
-            
-        self.initialized = True
+        if not self._load_backend(self.mode):
+            raise RuntimeError(self.backend_status[self.mode]["error"])
+
+    def preload(self, mode=None):
+        """在後台線程加載指定後端（默認為當前模式），避免第一個語音請求等待模型加載"""
+        thread = threading.Thread(
+            target=self._load_backend, args=(mode or self.mode,), daemon=True, name="stt_preload")
+        thread.start()
+        return thread
+
+    def _load_backend(self, mode, model_size=None):
+        """加載後端並記錄耗時，成功返回 True；同一時間只進行一個加載
+
+        model_size 為本地模式要加載的模型大小，默認為當前使用的 local_model_size。
+        """
+        status = self.backend_status[mode]
+        model_size = model_size or self.local_model_size
+        with self._load_lock:
+            if self._is_ready(mode, model_size):
+                return True
+
+            model = model_size if mode in LOCAL_MODES else self.azure_model
+            status.update(state="loading", model=model, error=None)
+            start_time = time.perf_counter()
+            try:
+                if mode in LOCAL_MODES:
+                    self._initialize_local_model(quantized=mode == "local_quantized", model_size=model_size)
+                else:
+                    self._initialize_azure_client()
+            except Exception as e:
+                status.update(state="error", error=str(e))
+                return False
+
+            status.update(state="ready", load_seconds=round(time.perf_counter() - start_time, 2))
+            logging.info(f"STT 後端 {mode} ({model}) 已就緒，加載耗時 {status['load_seconds']} 秒")
+            return True
         
-    def _initialize_local_model(self):
-        """初始化本地Whisper模型"""
+    def _initialize_local_model(self, quantized=False, model_size=None):
+        """初始化本地Whisper模型，quantized 時加載動態 int8 量化版本"""
+        model_size = model_size or self.local_model_size
         try:
-            logging.info(f"正在加載本地Whisper模型: {self.local_model_size}")
-            self.local_model = whisper.load_model(self.local_model_size)
+            logging.info(f"正在加載本地Whisper模型: {model_size}{' (int8)' if quantized else ''}")
+            model_registry.load(model_size, quantized=quantized)
             logging.info("本地Whisper模型加載成功")
         except Exception as e:
             logging.error(f"加載本地Whisper模型失敗: {e}")
@@ -98,30 +316,105 @@ class SpeechToTextSelector:
             raise
             
     def switch_mode(self, mode, config=None):
-        """切換STT模式"""
-        if mode not in ["local", "azure"]:
-            raise ValueError(f"不支持的STT模式: {mode}，只支持'local'或'azure'")
+        """切換STT模式
+
+        目標後端已就緒時立即切換；否則在後台加載，加載期間仍由已就緒的當前後端處理請求，
+        加載完成後自動切換。切換後原後端保持加載狀態，切回時無需等待。
+        只更改本地模型大小時同樣如此：新模型加載完成前繼續使用原模型。
+        """
+        if mode not in STT_MODES:
+            raise ValueError(f"不支持的STT模式: {mode}，只支持'local'、'local_quantized'或'azure'")
             
-        # 如果提供了新配置，更新配置
+        # 如果提供了新配置，更新配置；新的本地模型大小在加載完成後才生效
+        model_size = self.local_model_size
         if config:
-            if mode == "local" and "local_whisper_model" in config:
-                self.local_model_size = config["local_whisper_model"]
-                # 重置本地模型以便重新加載
-                self.local_model = None
+            if mode in LOCAL_MODES and config.get("local_whisper_model"):
+                model_size = config["local_whisper_model"]
                 
-            if mode == "azure" and "azure_whisper_model" in config:
+            if mode == "azure" and config.get("azure_whisper_model"):
                 self.azure_model = config["azure_whisper_model"]
+
+            if config.get("decoding_profile"):
+                self.set_decoding_profile(config["decoding_profile"])
                 
-        # 切換模式
         prev_mode = self.mode
-        self.mode = mode
-        self.initialized = False  # 重置初始化狀態，以便懶加載新模型
-        
-        logging.info(f"STT模式已從 {prev_mode} 切換到 {mode}")
-        return f"語音轉文字模式已切換為: {mode}"
+        prev_model = self.local_model_size
+        if self._is_ready(mode, model_size) or not self._is_ready(prev_mode):
+            # 目標已就緒，或當前後端也未就緒（沒有可以繼續服務的後端），直接切換
+            self.local_model_size = model_size
+            self.mode = mode
+            self.pending_mode = None
+            self.pending_model_size = None
+            if not self._is_ready(mode):
+                self.preload(mode)
+            logging.info(f"STT模式已從 {prev_mode} ({prev_model}) 切換到 {mode} ({model_size})")
+            return f"語音轉文字模式已切換為: {mode}"
+
+        self.pending_mode = mode
+        self.pending_model_size = model_size
+
+        def finish_switch():
+            loaded = self._load_backend(mode, model_size)
+            # 期間再次切換時以最新的請求為準
+            if self.pending_mode == mode and self.pending_model_size == model_size:
+                if loaded:
+                    self.local_model_size = model_size
+                    self.mode = mode
+                    logging.info(f"STT模式已從 {prev_mode} ({prev_model}) 切換到 {mode} ({model_size})")
+                self.pending_mode = None
+                self.pending_model_size = None
+
+        threading.Thread(target=finish_switch, daemon=True, name="stt_switch").start()
+        logging.info(f"正在後台加載 {mode} ({model_size})，加載完成前繼續使用 {prev_mode} ({prev_model})")
+        return f"正在加載 {mode}，完成後自動切換，期間繼續使用 {prev_mode}"
         
-    def transcribe(self, audio_file):
-        """轉錄音頻文件 - 已禁用回退邏輯"""
+    def set_decoding_profile(self, profile):
+        """設置解碼配置：command、dictation 或 auto（按上下文和語音時長自動選擇）"""
+        if profile not in DECODING_PROFILE_NAMES:
+            raise ValueError(f"不支持的解碼配置: {profile}，只支持 {'、'.join(DECODING_PROFILE_NAMES)}")
+        self.decoding_profile = profile
+        logging.info(f"STT 解碼配置已設置為: {profile}")
+
+    def set_command_vocabulary(self, words):
+        """設置 command 配置的提示詞彙（例如機器人動作名稱），提高短指令的識別準確度"""
+        prompt = ""
+        for word in dict.fromkeys(words):
+            if len(prompt) + len(word) + 1 > STT_PROMPT_MAX_CHARS:
+                break
+            prompt = f"{prompt}、{word}" if prompt else word
+        self.command_prompt = prompt or None
+
+    def _decode_options(self, profile_name):
+        """返回解碼配置對應的 (本地 Whisper 參數, Azure 參數)"""
+        profile = DECODING_PROFILES[profile_name]
+        prompt = self.command_prompt if profile["vocabulary_prompt"] else None
+        local_options = dict(profile["local"], language=STT_LANGUAGE)
+        azure_options = {"language": STT_LANGUAGE, "temperature": 0}
+        if prompt:
+            local_options["initial_prompt"] = prompt
+            azure_options["prompt"] = prompt
+        return local_options, azure_options
+
+    def _record_profile(self, profile_name, seconds, audio_seconds):
+        stats = self.profile_stats[profile_name]
+        stats["count"] += 1
+        stats["seconds"] += seconds
+        stats["audio_seconds"] += audio_seconds or 0.0
+
+    def transcribe(self, audio_file, sample_rate=STT_SAMPLE_RATE, with_segments=False,
+                   profile=None, context=None):
+        """轉錄音頻 - 已禁用回退邏輯
+
+        Args:
+            audio_file: 音頻文件路徑，或內存中的音頻（numpy int16/float32 數組、WAV 或其他格式字節），
+                        內存音頻直接傳給 Whisper 或 Azure，不寫入磁盤
+            sample_rate: numpy 數組輸入的採樣率
+            with_segments: 為 True 時返回帶時間戳的分段列表 [{start, end, text}]（流式轉錄使用），
+                           失敗時返回空列表
+            profile: 解碼配置，默認使用 self.decoding_profile
+            context: 對話上下文（command 或 dictation），auto 配置下優先於時長判斷
+        """
+        failed = [] if with_segments else ""
         # 確保模型已初始化
         if not self.initialized:
             logging.info("模型未初始化，開始初始化...")
@@ -130,53 +423,159 @@ class SpeechToTextSelector:
                 logging.info(f"初始化完成，當前模式: {self.mode}")
             except Exception as init_error:
                 logging.error(f"初始化失敗，錯誤: {init_error}")
-                return ""
+                return failed
         
-        # 添加醒目的模式提示
+        # 添加醒目的模式提示（流式轉錄每秒調用多次，不重複打印）
         mode_banner = "=" * 50
-        if self.mode == "local":
-            logging.info(f"\n{mode_banner}\n當前使用模式: 本地 WHISPER ({self.local_model_size})\n{mode_banner}")
+        if with_segments:
+            logging.debug(f"流式轉錄，當前模式: {self.mode}")
+        elif self.mode in LOCAL_MODES:
+            quantized_label = " int8" if self.mode == "local_quantized" else ""
+            logging.info(f"\n{mode_banner}\n當前使用模式: 本地 WHISPER ({self.local_model_size}{quantized_label})\n{mode_banner}")
         else:
             logging.info(f"\n{mode_banner}\n當前使用模式: AZURE CLOUD WHISPER ({self.azure_model})\n{mode_banner}")
         
         try:
-            if self.mode == "local":
-                return self._transcribe_local(audio_file)
+            # 所有輸入先在內存中轉為 16kHz 單聲道並裁剪首尾靜音，再交給任一後端；
+            # 流式轉錄依賴分段時間戳與輸入音頻對齊，不裁剪
+            audio_file = load_pcm(audio_file, sample_rate, trim=STT_TRIM_SILENCE and not with_segments)
+            if STT_DEBUG_SAVE_AUDIO:
+                self._save_debug_audio(audio_file)
+            duration = len(audio_file) / STT_SAMPLE_RATE
+
+            profile_name = resolve_decoding_profile(profile or self.decoding_profile, duration, context)
+            local_options, azure_options = self._decode_options(profile_name)
+            start_time = time.perf_counter()
+
+            if self.mode in LOCAL_MODES:
+                result = self._transcribe_local(audio_file, with_segments, local_options)
             else:
                 # 嘗試使用 Azure
-                logging.info(f"嘗試使用 Azure 轉錄: {audio_file}")
+                logging.info(f"嘗試使用 Azure 轉錄: {describe_audio(audio_file)}")
                 if self.azure_client is None:
                     logging.error("Azure 客戶端未初始化！")
-                    return ""
-                return self._transcribe_azure(audio_file)
+                    return failed
+                result = self._transcribe_azure(audio_file, with_segments, azure_options)
+
+            self._record_profile(profile_name, time.perf_counter() - start_time, duration)
+            return result
         except Exception as e:
             logging.error(f"轉錄失敗: {e}")
             logging.error("轉錄失敗，不使用備份模式。")
-            return ""
+            return failed
             
-    def _transcribe_local(self, audio_file):
-        """使用本地Whisper模型轉錄"""
-        logging.info(f"使用本地Whisper模型轉錄文件: {audio_file}")
-        result = self.local_model.transcribe(audio_file)
+    def _transcribe_local(self, audio_file, with_segments=False, options=None):
+        """使用本地Whisper模型轉錄預處理後的 float32 數組"""
+        logging.info(f"使用本地Whisper模型轉錄: {describe_audio(audio_file)}")
+        quantized = self.mode == "local_quantized"
+        if (STT_BATCHING_ENABLED and not with_segments
+                and len(audio_file) <= WHISPER_WINDOW_SECONDS * STT_SAMPLE_RATE):
+            # 30 秒內的內存音頻交給批量調度器，與同時到達的其他請求合併推理
+            return get_batch_scheduler(self.local_model_size, quantized).transcribe(audio_file, options or {})
+
+        with model_registry.use(self.local_model_size, quantized=quantized) as model:
+            # CPU 不支持 fp16，明確關閉以免每次轉錄都打印警告
+            fp16 = getattr(getattr(model, "device", None), "type", "cpu") == "cuda"
+            result = model.transcribe(audio_file, fp16=fp16, **(options or {}))
+        if with_segments:
+            return segment_dicts(result.get("segments"), len(audio_file) / STT_SAMPLE_RATE)
         return result.get("text", "")
         
-    def _transcribe_azure(self, audio_file):
+    def _transcribe_azure(self, audio_file, with_segments=False, options=None):
         """使用Azure Whisper模型轉錄"""
-        logging.info(f"使用Azure Whisper模型轉錄文件: {audio_file}")
+        logging.info(f"使用Azure Whisper模型轉錄: {describe_audio(audio_file)}")
         
-        with open(audio_file, "rb") as audio:
-            result = self.azure_client.audio.transcriptions.create(
-                file=audio,
-                model=self.azure_model
-            )
+        options = dict(options or {})
+        if with_segments:
+            # 需要分段時間戳時請求 verbose_json 格式
+            options["response_format"] = "verbose_json"
+        result = self._upload_to_azure(audio_file, options)
+
+        if with_segments:
+            duration = len(audio_file) / STT_SAMPLE_RATE
+            segments = getattr(result, "segments", None)
+            if segments:
+                return segment_dicts(segments, duration)
+            # 沒有分段信息時把整段文本視為一個分段
+            text = getattr(result, "text", "")
+            return [{"start": 0.0, "end": duration, "text": text.strip()}] if text else []
             
         return result.text if hasattr(result, 'text') else str(result)
         
+    def _upload_to_azure(self, samples, options):
+        """在內存中編碼音頻並上傳 Azure 轉錄，較長的音頻使用壓縮格式減少上傳字節"""
+        duration = len(samples) / STT_SAMPLE_RATE
+        audio_format = self.upload_format if duration >= STT_UPLOAD_COMPRESS_MIN_SECONDS else "wav"
+        wav_bytes = len(samples) * 2 + 44
+
+        if audio_format != "wav":
+            try:
+                data = encode_upload_audio(samples, audio_format)
+            except Exception as e:
+                logging.warning(f"編碼 {audio_format} 失敗，改為上傳 WAV: {e}")
+                audio_format = "wav"
+        if audio_format == "wav":
+            data = pcm_to_wav_bytes(samples)
+
+        try:
+            result = self.azure_client.audio.transcriptions.create(
+                file=(f"audio.{audio_format}", data, UPLOAD_MIMETYPES[audio_format]),
+                model=self.azure_model,
+                **options
+            )
+        except Exception as e:
+            if audio_format == "wav" or getattr(e, "status_code", None) != 400:
+                raise
+            # 部署不接受該壓縮格式：以後都上傳 WAV，並重試本次請求
+            logging.warning(f"Azure 拒絕 {audio_format} 格式，之後改為上傳 WAV: {e}")
+            self.upload_format = "wav"
+            return self._upload_to_azure(samples, options)
+
+        self.upload_stats["requests"] += 1
+        self.upload_stats["compressed"] += audio_format != "wav"
+        self.upload_stats["bytes_sent"] += len(data)
+        self.upload_stats["wav_bytes"] += wav_bytes
+        logging.info(f"已上傳 {audio_format} 音頻 {len(data)} 字節（WAV 為 {wav_bytes} 字節），時長 {duration:.1f} 秒")
+        return result
+
+    def _save_debug_audio(self, samples):
+        """把待轉錄的內存音頻另存到產物存儲（僅調試用）"""
+        try:
+            from artifact_store import artifact_store
+            artifact = artifact_store.save(pcm_to_wav_bytes(samples), "stt_input", "wav")
+            logging.info(f"已保存待轉錄音頻: {artifact.path}")
+        except Exception as e:
+            logging.warning(f"保存待轉錄音頻失敗: {e}")
+
     def get_status(self):
-        """獲取當前狀態信息"""
+        """獲取當前狀態信息，包括各後端的就緒狀態和加載耗時"""
         return {
             "mode": self.mode,
-            "local_model": self.local_model_size if self.mode == "local" else None,
+            "local_model": self.local_model_size if self.mode in LOCAL_MODES else None,
             "azure_model": self.azure_model if self.mode == "azure" else None,
-            "initialized": self.initialized
-        }
\ No newline at end of file
+            "initialized": self.initialized,
+            "ready": self.initialized,
+            "pending_mode": self.pending_mode,
+            "pending_model": self.pending_model_size,
+            "backends": {mode: self._backend_state(mode) for mode in self.backend_status},
+            "models": model_registry.stats(),
+            "batching": batching_stats(),
+            "upload": dict(self.upload_stats, format=self.upload_format),
+            "decoding_profile": self.decoding_profile,
+            "decoding_profiles": {
+                name: {
+                    "description": DECODING_PROFILES[name]["description"],
+                    "count": stats["count"],
+                    "avg_seconds": round(stats["seconds"] / stats["count"], 3) if stats["count"] else None,
+                    "rtf": round(stats["seconds"] / stats["audio_seconds"], 3) if stats["audio_seconds"] else None
+                }
+                for name, stats in self.profile_stats.items()
+            }
+        }
+
+    def _backend_state(self, mode):
+        """後端狀態，已被註冊表卸載的本地模型報告為 unloaded"""
+        status = dict(self.backend_status[mode])
+        if status["state"] == "ready" and not self._is_ready(mode):
+            status["state"] = "unloaded"
+        return status
\ No newline at end of file